@@ -24,11 +24,42 @@ const RECORD_HEADERS = [
   'teknisi_2',
   'workzone',
   'keterangan',
+  'tanggal_open_epoch',
+  'tanggal_close_epoch',
+  'record_id',
 ];
 
+// Field lain (service_number, wo_number, ticket_id, workzone) boleh kosong:
+// wajib/tidaknya ditentukan skema jenis order di bot.
+const RECORD_REQUIRED_FIELDS = [
+  'segment',
+  'jenis_order',
+  'bobot',
+  'tanggal_close',
+  'teknisi_1',
+];
+
+const USER_MAPPING_HEADERS = ['user_id', 'username', 'teknisi_name', 'updated_at'];
+
 const RECORD_SHEET_NAME = 'Records';
 const USER_MAPPING_SHEET_NAME = 'UserMapping';
 
+// Record ID yang sudah ditulis juga disimpan di cache (maks 6 jam) sebagai jalan pintas.
+// Id yang tidak ada di cache dicek ke RECORD_ID_SCAN_ROWS baris terakhir kolom record_id:
+// kiriman ulang datang dari antrean bot beberapa menit setelah kiriman pertama, jadi baris
+// aslinya pasti masih di ekor sheet, dan biaya cek tidak ikut membesar dengan riwayat sheet.
+const RECORD_ID_CACHE_TTL = 21600;
+const RECORD_ID_SCAN_ROWS = 5000;
+const LOCK_TIMEOUT_MS = 30000;
+// Header yang sudah dicek dan nomor baris user_id di UserMapping juga disimpan di cache.
+// Kalau header diubah manual, cek ulang terjadi paling lambat setelah HEADER_CACHE_TTL.
+const HEADER_CACHE_TTL = 21600;
+const MAPPING_ROW_CACHE_TTL = 21600;
+
+// Handle spreadsheet dan sheet hanya berlaku selama satu eksekusi (satu doPost).
+let spreadsheet_ = null;
+const sheets_ = {};
+
 function doGet() {
   return jsonOutput({ ok: true, message: 'PBS Telegram Bot Apps Script is running.' });
 }
@@ -44,9 +75,10 @@ function doPost(e) {
     const data = payload.data || {};
 
     switch (action) {
-      case 'append_record':
-        appendRecord_(data);
-        return jsonOutput({ ok: true });
+      case 'append_records': {
+        const result = appendRecords_(data.records || []);
+        return jsonOutput({ ok: true, data: result });
+      }
 
       case 'set_user_mapping':
         setUserMapping_(data);
@@ -57,11 +89,29 @@ function doPost(e) {
         return jsonOutput({ ok: true, data: result });
       }
 
+      case 'get_all_user_mappings': {
+        const mappings = getAllUserMappings_();
+        return jsonOutput({ ok: true, data: mappings });
+      }
+
       case 'get_all_records': {
+        if (data.limit) {
+          const page = getRecordsPage_(Number(data.cursor) || 1, Number(data.limit), Boolean(data.gzip));
+          return jsonOutput({ ok: true, data: page });
+        }
         const records = getAllRecords_();
         return jsonOutput({ ok: true, data: records });
       }
 
+      case 'get_stats': {
+        const result = getStats_(data.teknisi || [], data.ranges || []);
+        return jsonOutput({ ok: true, data: result });
+      }
+
+      // Dipanggil berkala oleh bot supaya script tetap "hangat"; tidak membuka sheet.
+      case 'ping':
+        return jsonOutput({ ok: true, data: { time: Date.now() } });
+
       default:
         return jsonOutput({ ok: false, error: `Unknown action: ${action}` });
     }
@@ -70,23 +120,101 @@ function doPost(e) {
   }
 }
 
-function appendRecord_(record) {
-  validateRequired_(record, [
-    'segment',
-    'jenis_order',
-    'bobot',
-    'service_number',
-    'wo_number',
-    'ticket_id',
-    'tanggal_open',
-    'tanggal_close',
-    'teknisi_1',
-    'workzone',
-  ]);
+// Tiap record divalidasi sendiri: record yang tidak valid masuk `rejected` beserta error-nya
+// dan tidak menggagalkan record lain. `accepted` berisi id yang sudah ada di sheet, baik yang
+// baru ditulis maupun yang ternyata sudah ditulis sebelumnya.
+function appendRecords_(records) {
+  const rejected = [];
+  const valid = records.filter((record) => {
+    try {
+      validateRequired_(record, RECORD_REQUIRED_FIELDS);
+      return true;
+    } catch (err) {
+      rejected.push({ record_id: String(record.record_id || ''), error: String(err.message || err) });
+      return false;
+    }
+  });
+  if (valid.length === 0) {
+    return { written: 0, accepted: [], rejected };
+  }
 
-  const sheet = ensureSheet_(RECORD_SHEET_NAME, RECORD_HEADERS);
-  const row = RECORD_HEADERS.map((key) => normalizeCell_(record[key]));
-  sheet.appendRow(row);
+  const lock = LockService.getScriptLock();
+  lock.waitLock(LOCK_TIMEOUT_MS);
+  try {
+    const cache = CacheService.getScriptCache();
+    const sheet = ensureSheet_(RECORD_SHEET_NAME, RECORD_HEADERS);
+    const ids = valid.map((record) => String(record.record_id || '')).filter((id) => id);
+    const seen = writtenRecordIds_(sheet, cache, ids);
+
+    const fresh = [];
+    valid.forEach((record) => {
+      const id = String(record.record_id || '');
+      if (id && seen[id]) {
+        return;
+      }
+      if (id) {
+        seen[id] = true;
+      }
+      fresh.push(record);
+    });
+
+    if (fresh.length === 0) {
+      return { written: 0, accepted: ids, rejected };
+    }
+
+    const rows = fresh.map((record) => RECORD_HEADERS.map((key) => normalizeCell_(record[key])));
+    sheet.getRange(sheet.getLastRow() + 1, 1, rows.length, RECORD_HEADERS.length).setValues(rows);
+    SpreadsheetApp.flush();
+
+    const written = {};
+    fresh.forEach((record) => {
+      if (record.record_id) {
+        written[`rec:${record.record_id}`] = '1';
+      }
+    });
+    if (Object.keys(written).length) {
+      cache.putAll(written, RECORD_ID_CACHE_TTL);
+    }
+    return { written: fresh.length, accepted: ids, rejected };
+  } finally {
+    lock.releaseLock();
+  }
+}
+
+// Dipanggil di dalam lock. Cache bisa hilang kapan saja, jadi id yang tidak ada di cache
+// dicek ke ekor kolom record_id di sheet; retry setelah cache hilang tetap tidak menulis dobel.
+function writtenRecordIds_(sheet, cache, ids) {
+  const seen = {};
+  if (ids.length === 0) {
+    return seen;
+  }
+  const cached = cache.getAll(ids.map((id) => `rec:${id}`));
+  const unknown = [];
+  ids.forEach((id) => {
+    if (cached[`rec:${id}`]) {
+      seen[id] = true;
+    } else {
+      unknown.push(id);
+    }
+  });
+
+  const lastRow = sheet.getLastRow();
+  if (unknown.length === 0 || lastRow <= 1) {
+    return seen;
+  }
+  const wanted = new Set(unknown);
+  const column = RECORD_HEADERS.indexOf('record_id') + 1;
+  const firstRow = Math.max(2, lastRow - RECORD_ID_SCAN_ROWS + 1);
+  sheet
+    .getRange(firstRow, column, lastRow - firstRow + 1, 1)
+    .getValues()
+    .forEach((row) => {
+      const id = String(row[0]);
+      if (wanted.has(id)) {
+        seen[id] = true;
+      }
+    });
+  return seen;
 }
 
 function setUserMapping_(mapping) {
@@ -99,24 +227,21 @@ function setUserMapping_(mapping) {
     throw new Error('user_id and teknisi_name are required');
   }
 
-  const sheet = ensureSheet_(USER_MAPPING_SHEET_NAME, [
-    'user_id',
-    'username',
-    'teknisi_name',
-    'updated_at',
-  ]);
-
-  const values = sheet.getDataRange().getValues();
-
-  // Mulai dari index 1 karena baris 1 adalah header
-  for (let r = 1; r < values.length; r += 1) {
-    if (String(values[r][0]) === userId) {
-      sheet.getRange(r + 1, 1, 1, 4).setValues([[userId, username, teknisiName, updatedAt]]);
-      return;
+  const lock = LockService.getScriptLock();
+  lock.waitLock(LOCK_TIMEOUT_MS);
+  try {
+    const sheet = ensureSheet_(USER_MAPPING_SHEET_NAME, USER_MAPPING_HEADERS);
+    const found = findMappingRow_(sheet, userId);
+    const rowNumber = found ? found.row : sheet.getLastRow() + 1;
+    sheet
+      .getRange(rowNumber, 1, 1, USER_MAPPING_HEADERS.length)
+      .setValues([[userId, username, teknisiName, updatedAt]]);
+    if (!found) {
+      CacheService.getScriptCache().put(`map:${userId}`, String(rowNumber), MAPPING_ROW_CACHE_TTL);
     }
+  } finally {
+    lock.releaseLock();
   }
-
-  sheet.appendRow([userId, username, teknisiName, updatedAt]);
 }
 
 function getUserMapping_(userId) {
@@ -124,26 +249,63 @@ function getUserMapping_(userId) {
     return null;
   }
 
-  const sheet = ensureSheet_(USER_MAPPING_SHEET_NAME, [
-    'user_id',
-    'username',
-    'teknisi_name',
-    'updated_at',
-  ]);
+  const sheet = ensureSheet_(USER_MAPPING_SHEET_NAME, USER_MAPPING_HEADERS);
+  const found = findMappingRow_(sheet, userId);
+  return found ? mappingFromRow_(found.values) : null;
+}
 
-  const values = sheet.getDataRange().getValues();
-  for (let r = 1; r < values.length; r += 1) {
-    if (String(values[r][0]) === userId) {
-      return {
-        user_id: String(values[r][0] || ''),
-        username: String(values[r][1] || ''),
-        teknisi_name: String(values[r][2] || ''),
-        updated_at: String(values[r][3] || ''),
-      };
+// Cari baris user_id: coba nomor baris dari cache dulu (dicek ulang isinya, karena baris
+// bisa bergeser kalau sheet diedit manual), lalu TextFinder di kolom user_id.
+function findMappingRow_(sheet, userId) {
+  const cache = CacheService.getScriptCache();
+  const cacheKey = `map:${userId}`;
+  const cachedRow = Number(cache.get(cacheKey));
+  if (cachedRow > 1) {
+    try {
+      const values = sheet.getRange(cachedRow, 1, 1, USER_MAPPING_HEADERS.length).getValues()[0];
+      if (String(values[0]) === userId) {
+        return { row: cachedRow, values };
+      }
+    } catch (err) {
+      // Baris di cache sudah tidak ada di sheet; lanjut cari ulang.
     }
   }
 
-  return null;
+  const lastRow = sheet.getLastRow();
+  if (lastRow <= 1) {
+    return null;
+  }
+  const cell = sheet
+    .getRange(2, 1, lastRow - 1, 1)
+    .createTextFinder(userId)
+    .matchEntireCell(true)
+    .findNext();
+  if (!cell) {
+    return null;
+  }
+
+  const row = cell.getRow();
+  const values = sheet.getRange(row, 1, 1, USER_MAPPING_HEADERS.length).getValues()[0];
+  cache.put(cacheKey, String(row), MAPPING_ROW_CACHE_TTL);
+  return { row, values };
+}
+
+function getAllUserMappings_() {
+  const sheet = ensureSheet_(USER_MAPPING_SHEET_NAME, USER_MAPPING_HEADERS);
+  const values = sheet.getDataRange().getValues();
+  return values
+    .slice(1)
+    .filter((row) => String(row[0] || '') !== '')
+    .map(mappingFromRow_);
+}
+
+function mappingFromRow_(row) {
+  return {
+    user_id: String(row[0] || ''),
+    username: String(row[1] || ''),
+    teknisi_name: String(row[2] || ''),
+    updated_at: String(row[3] || ''),
+  };
 }
 
 function getAllRecords_() {
@@ -166,7 +328,87 @@ function getAllRecords_() {
   });
 }
 
+// Format kolumnar untuk baca massal: header dikirim sekali, tiap baris berupa array.
+// `cursor` adalah nomor baris terakhir yang sudah diterima (1 = header); `next_cursor` null
+// berarti sudah sampai baris terakhir. Dengan gzip, halaman dikompres dan dikirim sebagai base64.
+function getRecordsPage_(cursor, limit, gzip) {
+  const sheet = ensureSheet_(RECORD_SHEET_NAME, RECORD_HEADERS);
+  const lastRow = sheet.getLastRow();
+  const startRow = Math.max(cursor, 1) + 1;
+  const count = Math.max(Math.min(lastRow - startRow + 1, limit), 0);
+  const rows = count ? sheet.getRange(startRow, 1, count, RECORD_HEADERS.length).getValues() : [];
+  const endRow = startRow + count - 1;
+
+  const page = {
+    headers: RECORD_HEADERS,
+    first_row: startRow,
+    rows,
+    next_cursor: endRow < lastRow ? endRow : null,
+    last_row: lastRow,
+  };
+  if (!gzip) {
+    return page;
+  }
+  const blob = Utilities.gzip(Utilities.newBlob(JSON.stringify(page), 'application/json'));
+  return { encoding: 'gzip+base64', body: Utilities.base64Encode(blob.getBytes()) };
+}
+
+// Total pekerjaan dan bobot per teknisi untuk setiap rentang [start, end) (detik Unix),
+// dihitung di server supaya bot tidak perlu mengunduh seluruh sheet Records.
+// Daftar teknisi kosong berarti semua teknisi. Hasil: totals[i][nama] = [jumlah, bobot].
+function getStats_(teknisi, ranges) {
+  const bounds = ranges.map((range) => [Number(range[0]), Number(range[1])]);
+  const totals = bounds.map(() => ({}));
+  const sheet = ensureSheet_(RECORD_SHEET_NAME, RECORD_HEADERS);
+  const lastRow = sheet.getLastRow();
+  if (lastRow <= 1 || bounds.length === 0) {
+    return { totals, rows: 0 };
+  }
+
+  const wanted = new Set(teknisi.map((name) => String(name).trim()).filter((name) => name));
+  const columns = ['bobot', 'tanggal_close', 'teknisi_1', 'teknisi_2', 'tanggal_close_epoch'].map(
+    (header) => RECORD_HEADERS.indexOf(header)
+  );
+  // Ambil hanya blok kolom bobot..tanggal_close_epoch, bukan seluruh baris.
+  const first = Math.min(...columns);
+  const [bobotIdx, closeIdx, tech1Idx, tech2Idx, closeEpochIdx] = columns.map((i) => i - first);
+  const values = sheet
+    .getRange(2, first + 1, lastRow - 1, Math.max(...columns) - first + 1)
+    .getValues();
+  const timeZone = Session.getScriptTimeZone();
+
+  values.forEach((row) => {
+    const names = [String(row[tech1Idx]).trim(), String(row[tech2Idx]).trim()].filter(
+      (name, i, all) => name && all.indexOf(name) === i && (wanted.size === 0 || wanted.has(name))
+    );
+    if (names.length === 0) {
+      return;
+    }
+    const epoch = row[closeEpochIdx] !== '' ? Number(row[closeEpochIdx]) : toEpoch_(row[closeIdx], timeZone);
+    if (epoch === '' || isNaN(epoch)) {
+      return;
+    }
+    const bobot = Number(row[bobotIdx]) || 0;
+    bounds.forEach(([start, end], i) => {
+      if (epoch < start || epoch >= end) {
+        return;
+      }
+      names.forEach((name) => {
+        const total = totals[i][name] || (totals[i][name] = [0, 0]);
+        total[0] += 1;
+        total[1] += bobot;
+      });
+    });
+  });
+
+  return { totals, rows: values.length };
+}
+
 function ensureSheet_(sheetName, headers) {
+  if (sheets_[sheetName]) {
+    return sheets_[sheetName];
+  }
+
   const spreadsheet = getSpreadsheet_();
   let sheet = spreadsheet.getSheetByName(sheetName);
 
@@ -174,6 +416,21 @@ function ensureSheet_(sheetName, headers) {
     sheet = spreadsheet.insertSheet(sheetName);
   }
 
+  // Sheet yang dihapus lalu dibuat ulang (atau dikosongkan) tidak punya header lagi,
+  // padahal signature di cache masih ada; baris kosong selalu dicek ulang.
+  const cache = CacheService.getScriptCache();
+  const cacheKey = `hdr:${sheetName}`;
+  const signature = headers.join('\t');
+  if (sheet.getLastRow() === 0 || cache.get(cacheKey) !== signature) {
+    validateHeaders_(sheet, sheetName, headers);
+    cache.put(cacheKey, signature, HEADER_CACHE_TTL);
+  }
+
+  sheets_[sheetName] = sheet;
+  return sheet;
+}
+
+function validateHeaders_(sheet, sheetName, headers) {
   if (sheet.getLastRow() === 0) {
     sheet.appendRow(headers);
   } else {
@@ -182,24 +439,90 @@ function ensureSheet_(sheetName, headers) {
       .getValues()[0]
       .map(String);
 
-    const headerMismatch = headers.some((header, i) => currentHeaders[i] !== header);
-    if (headerMismatch) {
-      throw new Error(
-        `Header mismatch on sheet "${sheetName}". Expected: ${headers.join(', ')}`
-      );
+    const firstMismatch = headers.findIndex((header, i) => currentHeaders[i] !== header);
+    if (firstMismatch !== -1) {
+      // Sheet lama yang header-nya awalan dari header baru cukup ditambah kolom di kanan.
+      const isPrefix = currentHeaders.slice(firstMismatch).every((header) => header === '');
+      if (!isPrefix) {
+        throw new Error(
+          `Header mismatch on sheet "${sheetName}". Expected: ${headers.join(', ')}`
+        );
+      }
+      sheet
+        .getRange(1, firstMismatch + 1, 1, headers.length - firstMismatch)
+        .setValues([headers.slice(firstMismatch)]);
     }
   }
+}
 
-  return sheet;
+// Jalankan sekali dari editor Apps Script setelah deploy versi ini untuk mengisi
+// tanggal_open_epoch / tanggal_close_epoch pada baris lama. Zona waktu script harus sama
+// dengan TZ bot (Asia/Jakarta). Aman dijalankan ulang: epoch yang sudah ada tidak diubah.
+function migrateRecordEpochs() {
+  const lock = LockService.getScriptLock();
+  lock.waitLock(LOCK_TIMEOUT_MS);
+  try {
+    const sheet = ensureSheet_(RECORD_SHEET_NAME, RECORD_HEADERS);
+    const lastRow = sheet.getLastRow();
+    if (lastRow <= 1) {
+      return 0;
+    }
+
+    const timeZone = Session.getScriptTimeZone();
+    const openIdx = RECORD_HEADERS.indexOf('tanggal_open');
+    const closeIdx = RECORD_HEADERS.indexOf('tanggal_close');
+    const openEpochIdx = RECORD_HEADERS.indexOf('tanggal_open_epoch');
+    const closeEpochIdx = RECORD_HEADERS.indexOf('tanggal_close_epoch');
+    const values = sheet.getRange(2, 1, lastRow - 1, RECORD_HEADERS.length).getValues();
+
+    let updated = 0;
+    const epochs = values.map((row) => {
+      const openEpoch = row[openEpochIdx] !== '' ? row[openEpochIdx] : toEpoch_(row[openIdx], timeZone);
+      const closeEpoch = row[closeEpochIdx] !== '' ? row[closeEpochIdx] : toEpoch_(row[closeIdx], timeZone);
+      if (openEpoch !== row[openEpochIdx] || closeEpoch !== row[closeEpochIdx]) {
+        updated += 1;
+      }
+      return [openEpoch, closeEpoch];
+    });
+
+    if (updated) {
+      sheet.getRange(2, openEpochIdx + 1, epochs.length, 2).setValues(epochs);
+      SpreadsheetApp.flush();
+    }
+    return updated;
+  } finally {
+    lock.releaseLock();
+  }
+}
+
+function toEpoch_(value, timeZone) {
+  if (value instanceof Date) {
+    return Math.floor(value.getTime() / 1000);
+  }
+  const text = String(value || '').trim();
+  if (!text) {
+    return '';
+  }
+  const format = /^\d{4}-/.test(text) ? 'yyyy-MM-dd HH:mm:ss' : 'dd-MM-yyyy HH:mm:ss';
+  try {
+    return Math.floor(Utilities.parseDate(text, timeZone, format).getTime() / 1000);
+  } catch (err) {
+    return '';
+  }
 }
 
 function getSpreadsheet_() {
+  if (spreadsheet_) {
+    return spreadsheet_;
+  }
+
   const spreadsheetId = PropertiesService.getScriptProperties().getProperty('SPREADSHEET_ID');
   if (!spreadsheetId) {
     throw new Error('Script property SPREADSHEET_ID belum di-set');
   }
 
-  return SpreadsheetApp.openById(spreadsheetId);
+  spreadsheet_ = SpreadsheetApp.openById(spreadsheetId);
+  return spreadsheet_;
 }
 
 function validateRequired_(obj, keys) {
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .stats import record_epoch
+
+NO_CODE = -1
+NO_EPOCH = np.iinfo(np.int64).min
+
+PERIODS = ("hari", "bulan", "semua")
+
+
+@dataclass(frozen=True)
+class GroupTotal:
+    name: str
+    count: int
+    points: float
+
+
+class Codebook:
+    def __init__(self) -> None:
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def code(self, name: str) -> int:
+        if not name:
+            return NO_CODE
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+def period_bounds(now: datetime, period: str) -> Tuple[int, int]:
+    if period == "semua":
+        return NO_EPOCH + 1, np.iinfo(np.int64).max
+    tz = now.tzinfo or timezone.utc
+    if period == "hari":
+        start = datetime(now.year, now.month, now.day, tzinfo=tz)
+        end = start + timedelta(days=1)
+        end = datetime(end.year, end.month, end.day, tzinfo=tz)
+    else:
+        start = datetime(now.year, now.month, 1, tzinfo=tz)
+        end = datetime(now.year + now.month // 12, now.month % 12 + 1, 1, tzinfo=tz)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _totals(codes: np.ndarray, weights: np.ndarray, names: List[str], limit: Optional[int]) -> List[GroupTotal]:
+    counts = np.bincount(codes, minlength=len(names))
+    points = np.bincount(codes, weights=weights, minlength=len(names))
+    order = np.lexsort((-counts, -points))
+    order = order[counts[order] > 0]
+    if limit is not None:
+        order = order[:limit]
+    return [GroupTotal(names[i], int(counts[i]), float(points[i])) for i in order]
+
+
+class RecordColumns:
+    def __init__(self, tz: tzinfo = timezone.utc, capacity: int = 1024) -> None:
+        self.tz = tz
+        self.techs = Codebook()
+        self.segments = Codebook()
+        self.workzones = Codebook()
+        self.size = 0
+        self._tech_1 = np.empty(capacity, dtype=np.int32)
+        self._tech_2 = np.empty(capacity, dtype=np.int32)
+        self._close = np.empty(capacity, dtype=np.int64)
+        self._bobot = np.empty(capacity, dtype=np.float64)
+        self._segment = np.empty(capacity, dtype=np.int32)
+        self._workzone = np.empty(capacity, dtype=np.int32)
+
+    @classmethod
+    def build(cls, records: Iterable[Mapping], tz: tzinfo = timezone.utc) -> "RecordColumns":
+        columns = cls(tz)
+        columns.extend(records)
+        return columns
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self._close):
+            return
+        capacity = max(needed, 2 * len(self._close))
+        for name in ("_tech_1", "_tech_2", "_close", "_bobot", "_segment", "_workzone"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def _row(self, record: Mapping) -> Tuple[int, int, int, float, int, int]:
+        tech_1 = self.techs.code((record.get("teknisi_1") or "").strip())
+        tech_2 = self.techs.code((record.get("teknisi_2") or "").strip())
+        epoch = record_epoch(record, "tanggal_close", self.tz)
+        try:
+            bobot = float(record.get("bobot") or 0)
+        except (TypeError, ValueError):
+            bobot = 0.0
+        return (
+            tech_1,
+            NO_CODE if tech_2 == tech_1 else tech_2,
+            NO_EPOCH if epoch is None else epoch,
+            bobot,
+            self.segments.code((record.get("segment") or "").strip()),
+            self.workzones.code((record.get("workzone") or "").strip()),
+        )
+
+    def extend(self, records: Iterable[Mapping]) -> None:
+        rows = [self._row(record) for record in records]
+        if not rows:
+            return
+        self._reserve(len(rows))
+        start, end = self.size, self.size + len(rows)
+        tech_1, tech_2, close, bobot, segment, workzone = zip(*rows)
+        self._tech_1[start:end] = tech_1
+        self._tech_2[start:end] = tech_2
+        self._close[start:end] = close
+        self._bobot[start:end] = bobot
+        self._segment[start:end] = segment
+        self._workzone[start:end] = workzone
+        self.size = end
+
+    def add(self, record: Mapping) -> None:
+        self.extend([record])
+
+    def _window(self, start: int, end: int) -> np.ndarray:
+        close = self._close[: self.size]
+        return (close >= start) & (close < end)
+
+    def leaderboard(self, start: int, end: int, limit: Optional[int] = 10) -> List[GroupTotal]:
+        mask = self._window(start, end)
+        tech_1 = self._tech_1[: self.size]
+        tech_2 = self._tech_2[: self.size]
+        bobot = self._bobot[: self.size]
+        first = mask & (tech_1 != NO_CODE)
+        second = mask & (tech_2 != NO_CODE)
+        codes = np.concatenate((tech_1[first], tech_2[second]))
+        weights = np.concatenate((bobot[first], bobot[second]))
+        return _totals(codes, weights, self.techs.names, limit)
+
+    def by_unit(self, start: int, end: int, tech_units: Mapping[str, str]) -> List[GroupTotal]:
+        units = Codebook()
+        unit_of_tech = np.array([units.code(tech_units.get(name, "")) for name in self.techs.names] + [NO_CODE], dtype=np.int32)
+        mask = self._window(start, end)
+        # NO_CODE (-1) indexes the trailing NO_CODE entry, so technicians without a unit drop out.
+        unit_1 = unit_of_tech[self._tech_1[: self.size]]
+        unit_2 = unit_of_tech[self._tech_2[: self.size]]
+        bobot = self._bobot[: self.size]
+        first = mask & (unit_1 != NO_CODE)
+        second = mask & (unit_2 != NO_CODE) & (unit_2 != unit_1)
+        codes = np.concatenate((unit_1[first], unit_2[second]))
+        weights = np.concatenate((bobot[first], bobot[second]))
+        return _totals(codes, weights, units.names, None)
+
+    def _by_column(self, column: np.ndarray, names: List[str], start: int, end: int, limit: Optional[int]) -> List[GroupTotal]:
+        values = column[: self.size]
+        mask = self._window(start, end) & (values != NO_CODE)
+        return _totals(values[mask], self._bobot[: self.size][mask], names, limit)
+
+    def by_segment(self, start: int, end: int) -> List[GroupTotal]:
+        return self._by_column(self._segment, self.segments.names, start, end, None)
+
+    def by_workzone(self, start: int, end: int, limit: Optional[int] = 10) -> List[GroupTotal]:
+        return self._by_column(self._workzone, self.workzones.names, start, end, limit)
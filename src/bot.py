@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import re
+import time
+from dataclasses import asdict
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 
+import httpx
 from zoneinfo import ZoneInfo
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+    Update,
+)
 from telegram.constants import ParseMode
 from telegram.ext import (
     Application,
@@ -16,10 +29,25 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
-
-from .config import load_config
-from .data_loader import load_orders, load_technicians, OrderItem
-from .sheets import Record, append_record, get_all_records, get_user_mapping, set_user_mapping
+from telegram.request import BaseRequest
+
+from .analytics import PERIODS, GroupTotal, RecordColumns, period_bounds
+from .bulk_import import FILE_TYPES, IMPORT_COLUMNS, Row, RowValidator, error_report, file_rows, import_rows, pasted_rows
+from .catalog_watcher import CatalogWatcher
+from .config import Config, load_config
+from .dedup import KEY_FIELDS, DuplicateIndex
+from .data_loader import UNAVAILABLE, UNREQUIRED, Catalog, OrderItem, Technician
+from .persistence import SQLitePersistence
+from .replica import RecordReplica, ReplicaSyncer
+from .export import SheetsExporter
+from .metrics import HANDLER_ERRORS, HANDLER_SECONDS, REGISTRY, STATE_SECONDS, MetricsServer, timed
+from .sheets import SheetsClient, SheetsWarmer, Record
+from .snapshot import load_catalog_cached
+from .spool import DirectWriter, RecordSpool, WriteBehindQueue
+from .stats import StatsIndex, parse_date, to_epoch
+from .storage import SQLiteBackend, open_storage
+from .update_processor import PerUserUpdateProcessor
+from .user_mapping import UserMappingCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -45,28 +73,35 @@ logger = logging.getLogger(__name__)
     SETME_NAME,
 ) = range(18)
 
+STATE_NAMES = dict(enumerate((
+    "SEGMENT", "ORDER_QUERY", "ORDER_PICK", "SERVICE_NUMBER", "WO_NUMBER", "TICKET_ID", "DATE_OPEN",
+    "DATE_CLOSE", "TECH1_UNIT", "TECH1_NAME", "TECH2_DECIDE", "TECH2_UNIT", "TECH2_NAME", "WORKZONE",
+    "KETERANGAN", "CONFIRM", "SETME_UNIT", "SETME_NAME",
+)))
+TELEGRAM_TEXT_LIMIT = 4000
+
 PAGE_SIZE = 10
-DATE_FMT = "%d-%m-%Y %H:%M:%S"
-LEGACY_DATE_FMT = "%Y-%m-%d %H:%M:%S"
 DATE_INPUT_HINT = "DD-MM-YYYY HH:MM:SS"
 BTN_BACK = "⬅️ Back"
 BTN_CANCEL = "❌ Cancel"
 BTN_SKIP = "⏭️ Skip"
 
+FIELD_PROMPTS = {
+    SERVICE_NUMBER: ("service_number", "Service Number (No Inet/Voice/Site/dll)"),
+    WO_NUMBER: ("wo_number", "WO Number (SC/WO)"),
+    TICKET_ID: ("ticket_id", "Ticket ID (No Tiket)"),
+    DATE_OPEN: ("tanggal_open", f"Tanggal Open ({DATE_INPUT_HINT})"),
+    DATE_CLOSE: ("tanggal_close", f"Tanggal Close ({DATE_INPUT_HINT})"),
+    WORKZONE: ("workzone", "Workzone"),
+}
+FIELD_STEPS = [SERVICE_NUMBER, WO_NUMBER, TICKET_ID, DATE_OPEN, DATE_CLOSE]
+DATE_STEPS = {DATE_OPEN, DATE_CLOSE}
+
 
 def _tz_now(tz_name: str) -> datetime:
     return datetime.now(ZoneInfo(tz_name))
 
 
-def _parse_date(value: str) -> datetime | None:
-    text = value.strip()
-    for fmt in (DATE_FMT, LEGACY_DATE_FMT):
-        try:
-            return datetime.strptime(text, fmt)
-        except ValueError:
-            continue
-    return None
-
 def _fmt_order_item(item: OrderItem) -> str:
     return f"{item.name} (bobot {item.weight})"
 
@@ -124,35 +159,46 @@ def _unit_keyboard(units: List[str], page: int, key: str) -> InlineKeyboardMarku
     return InlineKeyboardMarkup(buttons)
 
 
-def _tech_keyboard(tech_indices: List[int], techs, page: int, key: str) -> InlineKeyboardMarkup:
+def _tech_keyboard(techs: List[Technician], page: int, key: str) -> InlineKeyboardMarkup:
     start = page * PAGE_SIZE
     end = start + PAGE_SIZE
-    page_items = tech_indices[start:end]
+    page_items = techs[start:end]
     buttons = []
-    for idx in page_items:
-        t = techs[idx]
+    for t in page_items:
         buttons.append([
-            InlineKeyboardButton(text=t.name, callback_data=f"TECHSEL|{key}|{idx}")
+            InlineKeyboardButton(text=t.name, callback_data=f"TECHSEL|{key}|{t.id}")
         ])
     nav = []
     if start > 0:
         nav.append(InlineKeyboardButton("Prev", callback_data=f"TECHPAGE|{key}|{page-1}"))
-    if end < len(tech_indices):
+    if end < len(techs):
         nav.append(InlineKeyboardButton("Next", callback_data=f"TECHPAGE|{key}|{page+1}"))
     if nav:
         buttons.append(nav)
     return InlineKeyboardMarkup(buttons)
 
 
-def _get_order_by_id(orders_by_segment: Dict[str, List[OrderItem]], segment: str, item_id: str) -> OrderItem | None:
-    for item in orders_by_segment.get(segment, []):
-        if item.id == item_id:
-            return item
-    return None
+def _pin_catalog(context: ContextTypes.DEFAULT_TYPE) -> Catalog:
+    catalog: Catalog = context.bot_data["catalog"]
+    context.user_data["catalog_version"] = catalog.version
+    return catalog
+
+
+def _catalog(context: ContextTypes.DEFAULT_TYPE) -> Catalog:
+    version = context.user_data.get("catalog_version")
+    catalog = context.bot_data.get("catalogs", {}).get(version)
+    return catalog or context.bot_data["catalog"]
+
+
+def _get_order_by_id(catalog: Catalog, segment: str, item_id: str) -> OrderItem | None:
+    item = catalog.orders_by_id.get(item_id)
+    if item is None or item.segment != segment:
+        return None
+    return item
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    segments = sorted(context.bot_data["orders"].keys())
+    segments = _pin_catalog(context).segments
     await update.message.reply_text(
         "Pilih segment pekerjaan:",
         reply_markup=_segment_keyboard(segments),
@@ -169,7 +215,7 @@ async def segment_chosen(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "Ketik kata kunci jenis order (contoh: *Corrective*), atau pilih dari daftar di bawah:",
         parse_mode=ParseMode.MARKDOWN,
     )
-    items = context.bot_data["orders"][segment]
+    items = _catalog(context).orders[segment]
     await query.message.reply_text(
         f"Total jenis order: {len(items)}. Halaman 1:",
         reply_markup=_order_page_keyboard(segment, items, page=0),
@@ -181,7 +227,7 @@ async def order_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     _, segment, page_str = query.data.split("|", 2)
-    items = context.bot_data["orders"][segment]
+    items = _catalog(context).orders[segment]
     page = int(page_str)
     await query.edit_message_reply_markup(reply_markup=_order_page_keyboard(segment, items, page))
     return ORDER_QUERY
@@ -191,159 +237,154 @@ async def order_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     _, segment, item_id = query.data.split("|", 2)
-    item = _get_order_by_id(context.bot_data["orders"], segment, item_id)
+    item = _get_order_by_id(_catalog(context), segment, item_id)
     if not item:
         await query.edit_message_text("Jenis order tidak ditemukan. Coba lagi.")
         return ORDER_QUERY
     context.user_data["order"] = item
     await query.edit_message_text(f"Terpilih: {_fmt_order_item(item)}")
-    await query.message.reply_text(
-        "Masukkan Service Number (No Inet/Voice/Site/dll):",
-        reply_markup=_field_nav_keyboard(),
-    )
-    return SERVICE_NUMBER
+    return await _ask_field(query.message, context, 0)
 
 
 async def order_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text.strip().lower()
+    text = update.message.text.strip()
     segment = context.user_data.get("segment")
-    items = context.bot_data["orders"].get(segment, [])
-    matches = [item for item in items if text in item.name.lower()]
+    index = _catalog(context).search.get(segment)
+    matches, total = index.search(text, limit=PAGE_SIZE) if index else ([], 0)
     if not matches:
         await update.message.reply_text("Tidak ditemukan. Coba kata kunci lain atau pilih dari daftar.")
         return ORDER_QUERY
-    if len(matches) == 1:
+    # Only a direct hit is picked without asking; a lone typo-tolerant match may be a guess.
+    if total == 1 and index.contains(text, matches[0]):
         item = matches[0]
         context.user_data["order"] = item
         await update.message.reply_text(f"Terpilih: {_fmt_order_item(item)}")
-        await update.message.reply_text(
-            "Masukkan Service Number (No Inet/Voice/Site/dll):",
-            reply_markup=_field_nav_keyboard(),
-        )
-        return SERVICE_NUMBER
-
-    if len(matches) > PAGE_SIZE:
-        await update.message.reply_text("Hasil terlalu banyak. Persempit kata kunci.")
-        return ORDER_QUERY
+        return await _ask_field(update.message, context, 0)
 
     buttons = [
         [InlineKeyboardButton(text=m.name[:45], callback_data=f"ORDSEL|{segment}|{m.id}")]
         for m in matches
     ]
-    await update.message.reply_text("Pilih salah satu:", reply_markup=InlineKeyboardMarkup(buttons))
+    prompt = "Pilih salah satu:"
+    if total > len(matches):
+        prompt = f"Menampilkan {len(matches)} teratas dari {total} hasil. Pilih salah satu atau persempit kata kunci:"
+    await update.message.reply_text(prompt, reply_markup=InlineKeyboardMarkup(buttons))
     return ORDER_QUERY
 
 
-async def service_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text.strip()
-    if _is_cancel(text):
-        await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
+async def _prompt_field(message: Message, context: ContextTypes.DEFAULT_TYPE, state: int) -> bool:
+    field, label = FIELD_PROMPTS[state]
+    requirement = context.user_data["order"].requirement(field)
+    if requirement == UNAVAILABLE:
+        context.user_data[field] = ""
+        context.user_data.pop(f"{field}_epoch", None)
+        return False
+    optional = requirement == UNREQUIRED
+    await message.reply_text(
+        f"Masukkan {label}{' (opsional)' if optional else ''}:",
+        reply_markup=_field_nav_keyboard(include_skip=optional),
+    )
+    return True
+
+
+async def _ask_field(message: Message, context: ContextTypes.DEFAULT_TYPE, step: int) -> int:
+    for state in FIELD_STEPS[step:]:
+        if await _prompt_field(message, context, state):
+            return state
+    units = _catalog(context).units
+    await message.reply_text("Lanjut pilih teknisi via tombol di bawah.", reply_markup=ReplyKeyboardRemove())
+    await message.reply_text("Pilih unit Teknisi 1:", reply_markup=_unit_keyboard(units, 0, "t1"))
+    return TECH1_UNIT
+
+
+async def _ask_previous_field(message: Message, context: ContextTypes.DEFAULT_TYPE, step: int) -> int:
+    for state in reversed(FIELD_STEPS[:step]):
+        if await _prompt_field(message, context, state):
+            return state
+    segment = context.user_data.get("segment")
+    if not segment:
+        await message.reply_text("Segment belum dipilih. Jalankan /start lagi.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
-    if _is_back(text):
-        segment = context.user_data.get("segment")
-        if not segment:
-            await update.message.reply_text("Segment belum dipilih. Jalankan /start lagi.", reply_markup=ReplyKeyboardRemove())
-            return ConversationHandler.END
-        items = context.bot_data["orders"][segment]
-        await update.message.reply_text(
-            "Kembali ke pemilihan jenis order. Pilih dari daftar:",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        await update.message.reply_text(
-            f"Total jenis order: {len(items)}. Halaman 1:",
-            reply_markup=_order_page_keyboard(segment, items, page=0),
-        )
-        return ORDER_QUERY
-    context.user_data["service_number"] = text
-    await update.message.reply_text("Masukkan WO Number (SC/WO):", reply_markup=_field_nav_keyboard())
-    return WO_NUMBER
+    items = _catalog(context).orders[segment]
+    await message.reply_text(
+        "Kembali ke pemilihan jenis order. Pilih dari daftar:",
+        reply_markup=ReplyKeyboardRemove(),
+    )
+    await message.reply_text(
+        f"Total jenis order: {len(items)}. Halaman 1:",
+        reply_markup=_order_page_keyboard(segment, items, page=0),
+    )
+    return ORDER_QUERY
 
 
-async def wo_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def _field_input(update: Update, context: ContextTypes.DEFAULT_TYPE, state: int) -> int:
     text = update.message.text.strip()
+    step = FIELD_STEPS.index(state)
     if _is_cancel(text):
         await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
     if _is_back(text):
+        return await _ask_previous_field(update.message, context, step)
+    field, label = FIELD_PROMPTS[state]
+    optional = context.user_data["order"].requirement(field) == UNREQUIRED
+    if text == BTN_SKIP:
+        if not optional:
+            await update.message.reply_text(f"{label} wajib diisi.", reply_markup=_field_nav_keyboard())
+            return state
+        text = ""
+    elif state in DATE_STEPS and not parse_date(text):
         await update.message.reply_text(
-            "Masukkan Service Number (No Inet/Voice/Site/dll):",
-            reply_markup=_field_nav_keyboard(),
+            f"Format salah. Gunakan {DATE_INPUT_HINT}",
+            reply_markup=_field_nav_keyboard(include_skip=optional),
         )
-        return SERVICE_NUMBER
-    context.user_data["wo_number"] = text
-    await update.message.reply_text("Masukkan Ticket ID (No Tiket):", reply_markup=_field_nav_keyboard())
-    return TICKET_ID
+        return state
+    context.user_data[field] = text
+    if state in DATE_STEPS:
+        tz = ZoneInfo(context.bot_data["config"].tz)
+        context.user_data[f"{field}_epoch"] = to_epoch(text, tz) if text else None
+    return await _ask_field(update.message, context, step + 1)
+
+
+async def service_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await _field_input(update, context, SERVICE_NUMBER)
+
+
+async def wo_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await _field_input(update, context, WO_NUMBER)
 
 
 async def ticket_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text.strip()
-    if _is_cancel(text):
-        await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
-        return ConversationHandler.END
-    if _is_back(text):
-        await update.message.reply_text("Masukkan WO Number (SC/WO):", reply_markup=_field_nav_keyboard())
-        return WO_NUMBER
-    context.user_data["ticket_id"] = text
-    await update.message.reply_text(f"Masukkan Tanggal Open ({DATE_INPUT_HINT}):", reply_markup=_field_nav_keyboard())
-    return DATE_OPEN
+    return await _field_input(update, context, TICKET_ID)
 
 
 async def date_open(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text.strip()
-    if _is_cancel(text):
-        await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
-        return ConversationHandler.END
-    if _is_back(text):
-        await update.message.reply_text("Masukkan Ticket ID (No Tiket):", reply_markup=_field_nav_keyboard())
-        return TICKET_ID
-    if not _parse_date(text):
-        await update.message.reply_text(f"Format salah. Gunakan {DATE_INPUT_HINT}", reply_markup=_field_nav_keyboard())
-        return DATE_OPEN
-    context.user_data["tanggal_open"] = text
-    await update.message.reply_text(f"Masukkan Tanggal Close ({DATE_INPUT_HINT}):", reply_markup=_field_nav_keyboard())
-    return DATE_CLOSE
+    return await _field_input(update, context, DATE_OPEN)
 
 
 async def date_close(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text.strip()
-    if _is_cancel(text):
-        await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
-        return ConversationHandler.END
-    if _is_back(text):
-        await update.message.reply_text(f"Masukkan Tanggal Open ({DATE_INPUT_HINT}):", reply_markup=_field_nav_keyboard())
-        return DATE_OPEN
-    if not _parse_date(text):
-        await update.message.reply_text(f"Format salah. Gunakan {DATE_INPUT_HINT}", reply_markup=_field_nav_keyboard())
-        return DATE_CLOSE
-    context.user_data["tanggal_close"] = text
-    units = context.bot_data["units"]
-    await update.message.reply_text("Lanjut pilih teknisi via tombol di bawah.", reply_markup=ReplyKeyboardRemove())
-    await update.message.reply_text("Pilih unit Teknisi 1:", reply_markup=_unit_keyboard(units, 0, "t1"))
-    return TECH1_UNIT
+    return await _field_input(update, context, DATE_CLOSE)
 
 
 async def unit_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     _, key, page_str = query.data.split("|", 2)
-    units = context.bot_data["units"]
+    units = _catalog(context).units
     page = int(page_str)
     await query.edit_message_reply_markup(reply_markup=_unit_keyboard(units, page, key))
-    return TECH1_UNIT if key == "t1" else TECH2_UNIT
+    return {"t1": TECH1_UNIT, "t2": TECH2_UNIT}.get(key, SETME_UNIT)
 
 
 async def unit_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     _, key, unit = query.data.split("|", 2)
-    techs = context.bot_data["techs"]
-    indices = [i for i, t in enumerate(techs) if t.unit == unit]
+    techs = _catalog(context).unit_techs.get(unit, [])
     context.user_data[f"{key}_unit"] = unit
-    context.user_data[f"{key}_tech_indices"] = indices
     await query.edit_message_text(f"Unit terpilih: {unit}")
     await query.message.reply_text(
         f"Pilih teknisi ({unit}):",
-        reply_markup=_tech_keyboard(indices, techs, 0, key),
+        reply_markup=_tech_keyboard(techs, 0, key),
     )
     return TECH1_NAME if key == "t1" else TECH2_NAME
 
@@ -352,19 +393,21 @@ async def tech_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     _, key, page_str = query.data.split("|", 2)
-    indices = context.user_data.get(f"{key}_tech_indices", [])
-    techs = context.bot_data["techs"]
+    unit = context.user_data.get(f"{key}_unit", "")
+    techs = _catalog(context).unit_techs.get(unit, [])
     page = int(page_str)
-    await query.edit_message_reply_markup(reply_markup=_tech_keyboard(indices, techs, page, key))
-    return TECH1_NAME if key == "t1" else TECH2_NAME
+    await query.edit_message_reply_markup(reply_markup=_tech_keyboard(techs, page, key))
+    return {"t1": TECH1_NAME, "t2": TECH2_NAME}.get(key, SETME_NAME)
 
 
 async def tech_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    _, key, idx_str = query.data.split("|", 2)
-    techs = context.bot_data["techs"]
-    tech = techs[int(idx_str)]
+    _, key, tech_id = query.data.split("|", 2)
+    tech = _catalog(context).techs_by_id.get(tech_id)
+    if not tech:
+        await query.edit_message_text("Teknisi tidak ditemukan. Pilih ulang unit.")
+        return TECH1_NAME if key == "t1" else TECH2_NAME
     context.user_data[f"{key}_name"] = tech.name
     await query.edit_message_text(f"Teknisi dipilih: {tech.name}")
 
@@ -376,8 +419,7 @@ async def tech_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await query.message.reply_text("Apakah ada Teknisi 2?", reply_markup=InlineKeyboardMarkup(buttons))
         return TECH2_DECIDE
 
-    await query.message.reply_text("Masukkan Workzone:", reply_markup=_field_nav_keyboard())
-    return WORKZONE
+    return await _ask_workzone(query.message, context)
 
 
 async def tech2_decide(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -386,32 +428,47 @@ async def tech2_decide(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     if query.data == "T2NONE":
         context.user_data["t2_name"] = ""
         await query.edit_message_text("Teknisi 2: -")
-        await query.message.reply_text("Masukkan Workzone:", reply_markup=_field_nav_keyboard())
-        return WORKZONE
+        return await _ask_workzone(query.message, context)
 
-    units = context.bot_data["units"]
+    units = _catalog(context).units
     await query.edit_message_text("Pilih unit Teknisi 2:")
     await query.message.reply_text("Pilih salah satu unit Teknisi 2:", reply_markup=_unit_keyboard(units, 0, "t2"))
     return TECH2_UNIT
 
 
+async def _ask_workzone(message: Message, context: ContextTypes.DEFAULT_TYPE) -> int:
+    if await _prompt_field(message, context, WORKZONE):
+        return WORKZONE
+    await message.reply_text("Masukkan Keterangan:", reply_markup=_field_nav_keyboard(include_skip=True))
+    return KETERANGAN
+
+
+async def _back_to_tech2(message: Message, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await message.reply_text("Kembali ke langkah Teknisi 2.", reply_markup=ReplyKeyboardRemove())
+    if context.user_data.get("t2_name", None) == "":
+        buttons = [
+            [InlineKeyboardButton("Tidak ada Teknisi 2", callback_data="T2NONE")],
+            [InlineKeyboardButton("Pilih Teknisi 2", callback_data="T2PICK")],
+        ]
+        await message.reply_text("Apakah ada Teknisi 2?", reply_markup=InlineKeyboardMarkup(buttons))
+        return TECH2_DECIDE
+    units = _catalog(context).units
+    await message.reply_text("Pilih unit Teknisi 2:", reply_markup=_unit_keyboard(units, 0, "t2"))
+    return TECH2_UNIT
+
+
 async def workzone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     text = update.message.text.strip()
     if _is_cancel(text):
         await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
     if _is_back(text):
-        await update.message.reply_text("Kembali ke langkah Teknisi 2.", reply_markup=ReplyKeyboardRemove())
-        if context.user_data.get("t2_name", None) == "":
-            buttons = [
-                [InlineKeyboardButton("Tidak ada Teknisi 2", callback_data="T2NONE")],
-                [InlineKeyboardButton("Pilih Teknisi 2", callback_data="T2PICK")],
-            ]
-            await update.message.reply_text("Apakah ada Teknisi 2?", reply_markup=InlineKeyboardMarkup(buttons))
-            return TECH2_DECIDE
-        units = context.bot_data["units"]
-        await update.message.reply_text("Pilih unit Teknisi 2:", reply_markup=_unit_keyboard(units, 0, "t2"))
-        return TECH2_UNIT
+        return await _back_to_tech2(update.message, context)
+    if text == BTN_SKIP:
+        if context.user_data["order"].requirement("workzone") != UNREQUIRED:
+            await update.message.reply_text("Workzone wajib diisi.", reply_markup=_field_nav_keyboard())
+            return WORKZONE
+        text = ""
     context.user_data["workzone"] = text
     await update.message.reply_text("Masukkan Keterangan:", reply_markup=_field_nav_keyboard(include_skip=True))
     return KETERANGAN
@@ -423,8 +480,9 @@ async def keterangan(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Dibatalkan.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
     if _is_back(text):
-        await update.message.reply_text("Masukkan Workzone:", reply_markup=_field_nav_keyboard())
-        return WORKZONE
+        if await _prompt_field(update.message, context, WORKZONE):
+            return WORKZONE
+        return await _back_to_tech2(update.message, context)
     if text == BTN_SKIP:
         context.user_data["keterangan"] = ""
         await update.message.reply_text("Keterangan dilewati.", reply_markup=ReplyKeyboardRemove())
@@ -440,6 +498,16 @@ async def skip_keterangan(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     return await _confirm(update, context)
 
 
+DUPLICATE_WARNING = (
+    "⚠️ Data dengan segment, Ticket ID, WO Number dan Service Number yang sama sudah pernah disimpan. "
+    "Simpan lagi hanya jika ini memang pekerjaan yang berbeda."
+)
+
+
+def _duplicate_candidate(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    return {name: context.user_data.get(name, "") for name in KEY_FIELDS}
+
+
 async def _confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     item: OrderItem = context.user_data["order"]
     summary = (
@@ -447,16 +515,21 @@ async def _confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         f"Segment: {context.user_data['segment']}\n"
         f"Jenis Order: {item.name}\n"
         f"Bobot: {item.weight}\n"
-        f"Service Number: {context.user_data['service_number']}\n"
-        f"WO Number: {context.user_data['wo_number']}\n"
-        f"Ticket ID: {context.user_data['ticket_id']}\n"
-        f"Tanggal Open: {context.user_data['tanggal_open']}\n"
+        f"Service Number: {context.user_data.get('service_number', '') or '-'}\n"
+        f"WO Number: {context.user_data.get('wo_number', '') or '-'}\n"
+        f"Ticket ID: {context.user_data.get('ticket_id', '') or '-'}\n"
+        f"Tanggal Open: {context.user_data.get('tanggal_open', '') or '-'}\n"
         f"Tanggal Close: {context.user_data['tanggal_close']}\n"
         f"Teknisi 1: {context.user_data['t1_name']}\n"
         f"Teknisi 2: {context.user_data.get('t2_name', '') or '-'}\n"
-        f"Workzone: {context.user_data['workzone']}\n"
+        f"Workzone: {context.user_data.get('workzone', '') or '-'}\n"
         f"Keterangan: {context.user_data.get('keterangan', '') or '-'}"
     )
+    candidate = _duplicate_candidate(context)
+    context.user_data.pop("duplicate_warned", None)
+    if context.bot_data["duplicates"].seen(candidate):
+        context.user_data["duplicate_warned"] = candidate
+        summary += f"\n\n{DUPLICATE_WARNING}"
     buttons = [
         [InlineKeyboardButton("Simpan", callback_data="SAVE")],
         [InlineKeyboardButton("Batal", callback_data="CANCEL")],
@@ -472,6 +545,18 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await query.edit_message_text("Dibatalkan.")
         return ConversationHandler.END
 
+    candidate = _duplicate_candidate(context)
+    duplicates: DuplicateIndex = context.bot_data["duplicates"]
+    if duplicates.seen(candidate) and context.user_data.get("duplicate_warned") != candidate:
+        # Saved by someone else after the confirmation was shown: ask once more.
+        context.user_data["duplicate_warned"] = candidate
+        buttons = [
+            [InlineKeyboardButton("Tetap simpan", callback_data="SAVE")],
+            [InlineKeyboardButton("Batal", callback_data="CANCEL")],
+        ]
+        await query.edit_message_text(DUPLICATE_WARNING, reply_markup=InlineKeyboardMarkup(buttons))
+        return CONFIRM
+
     config = context.bot_data["config"]
     item: OrderItem = context.user_data["order"]
     user = query.from_user
@@ -482,17 +567,21 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         segment=context.user_data["segment"],
         jenis_order=item.name,
         bobot=item.weight,
-        service_number=context.user_data["service_number"],
-        wo_number=context.user_data["wo_number"],
-        ticket_id=context.user_data["ticket_id"],
-        tanggal_open=context.user_data["tanggal_open"],
+        service_number=context.user_data.get("service_number", ""),
+        wo_number=context.user_data.get("wo_number", ""),
+        ticket_id=context.user_data.get("ticket_id", ""),
+        tanggal_open=context.user_data.get("tanggal_open", ""),
         tanggal_close=context.user_data["tanggal_close"],
         teknisi_1=context.user_data["t1_name"],
         teknisi_2=context.user_data.get("t2_name", ""),
-        workzone=context.user_data["workzone"],
+        workzone=context.user_data.get("workzone", ""),
         keterangan=context.user_data.get("keterangan", ""),
+        tanggal_open_epoch=context.user_data.get("tanggal_open_epoch"),
+        tanggal_close_epoch=context.user_data.get("tanggal_close_epoch"),
     )
-    append_record(config, record)
+    await context.bot_data["record_queue"].submit(record)
+    duplicates.add(candidate)
+    context.user_data.pop("duplicate_warned", None)
     await query.edit_message_text("Tersimpan. Terima kasih.")
     return ConversationHandler.END
 
@@ -503,7 +592,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 async def setme(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    units = context.bot_data["units"]
+    units = _pin_catalog(context).units
     await update.message.reply_text("Pilih unit kamu:", reply_markup=_unit_keyboard(units, 0, "me"))
     return SETME_UNIT
 
@@ -512,69 +601,62 @@ async def setme_unit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     _, key, unit = query.data.split("|", 2)
-    techs = context.bot_data["techs"]
-    indices = [i for i, t in enumerate(techs) if t.unit == unit]
+    techs = _catalog(context).unit_techs.get(unit, [])
     context.user_data["me_unit"] = unit
-    context.user_data["me_indices"] = indices
     await query.edit_message_text(f"Unit terpilih: {unit}")
-    await query.message.reply_text("Pilih nama kamu:", reply_markup=_tech_keyboard(indices, techs, 0, "me"))
+    await query.message.reply_text("Pilih nama kamu:", reply_markup=_tech_keyboard(techs, 0, "me"))
     return SETME_NAME
 
 
 async def setme_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    _, key, idx_str = query.data.split("|", 2)
-    techs = context.bot_data["techs"]
-    tech = techs[int(idx_str)]
+    _, key, tech_id = query.data.split("|", 2)
+    tech = _catalog(context).techs_by_id.get(tech_id)
+    if not tech:
+        await query.edit_message_text("Teknisi tidak ditemukan. Jalankan /setme lagi.")
+        return ConversationHandler.END
     user = query.from_user
-    config = context.bot_data["config"]
-    set_user_mapping(config, str(user.id), user.username or "", tech.name)
+    try:
+        await context.bot_data["user_mappings"].set(str(user.id), user.username or "", tech.name)
+    except Exception:
+        logger.warning("Saving the user mapping failed", exc_info=True)
+        await query.edit_message_text("Gagal menyimpan nama. Coba /setme lagi beberapa saat lagi.")
+        return ConversationHandler.END
     await query.edit_message_text(f"Nama kamu tersimpan sebagai: {tech.name}")
     return ConversationHandler.END
 
 
-def _compute_stats(records: List[dict], tech_name: str, now: datetime) -> Tuple[int, float, int, float]:
-    today = now.date()
-    month = now.month
-    year = now.year
-
-    today_count = 0
-    today_points = 0.0
-    month_count = 0
-    month_points = 0.0
-
-    for r in records:
-        tech1 = (r.get("teknisi_1") or "").strip()
-        tech2 = (r.get("teknisi_2") or "").strip()
-        if tech_name not in (tech1, tech2):
-            continue
-        date_str = (r.get("tanggal_close") or "").strip()
-        dt = _parse_date(date_str)
-        if not dt:
-            continue
-        weight = float(r.get("bobot") or 0)
-        if dt.date() == today:
-            today_count += 1
-            today_points += weight
-        if dt.year == year and dt.month == month:
-            month_count += 1
-            month_points += weight
-
-    return today_count, today_points, month_count, month_points
+async def _tech_stats(context: ContextTypes.DEFAULT_TYPE, tech_name: str, now: datetime) -> Tuple[int, float, int, float]:
+    config = context.bot_data["config"]
+    syncer: Optional[ReplicaSyncer] = context.bot_data.get("replica_syncer")
+    if syncer is None:
+        # STORAGE_BACKEND=sqlite: every write goes through the index, so it is always current.
+        return context.bot_data["stats_index"].stats(tech_name, now)
+    if not syncer.caught_up:
+        # Until the replica has caught up with the store (first start, or after a resync),
+        # the totals come from the storage backend instead of waiting for the whole download.
+        try:
+            today, month = await context.bot_data["storage"].get_stats(
+                [tech_name], [period_bounds(now, "hari"), period_bounds(now, "bulan")]
+            )
+            return (*today.get(tech_name, (0, 0.0)), *month.get(tech_name, (0, 0.0)))
+        except Exception:
+            logger.warning("get_stats failed; using the local replica", exc_info=True)
+    await syncer.ensure_fresh(config.replica_max_staleness)
+    return context.bot_data["stats_index"].stats(tech_name, now)
 
 
 async def me(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     config = context.bot_data["config"]
     user_id = str(update.message.from_user.id)
-    tech_name = get_user_mapping(config, user_id)
+    tech_name = await context.bot_data["user_mappings"].get(user_id)
     if not tech_name:
         await update.message.reply_text("Nama kamu belum diset. Jalankan /setme dulu.")
         return
 
-    records = get_all_records(config)
     now = _tz_now(config.tz)
-    tcount, tpoints, mcount, mpoints = _compute_stats(records, tech_name, now)
+    tcount, tpoints, mcount, mpoints = await _tech_stats(context, tech_name, now)
 
     await update.message.reply_text(
         f"Stats untuk {tech_name}\n"
@@ -589,9 +671,8 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
     tech_name = " ".join(context.args).strip()
     config = context.bot_data["config"]
-    records = get_all_records(config)
     now = _tz_now(config.tz)
-    tcount, tpoints, mcount, mpoints = _compute_stats(records, tech_name, now)
+    tcount, tpoints, mcount, mpoints = await _tech_stats(context, tech_name, now)
     await update.message.reply_text(
         f"Stats untuk {tech_name}\n"
         f"Hari ini ({now.strftime('%Y-%m-%d')}): {tcount} pekerjaan, {tpoints:.2f} poin\n"
@@ -599,6 +680,56 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
+PERIOD_LABELS = {"hari": "hari ini", "bulan": "bulan ini", "semua": "semua waktu"}
+
+
+def _period_arg(context: ContextTypes.DEFAULT_TYPE) -> str:
+    period = (context.args[0].lower() if context.args else "bulan").strip()
+    return period if period in PERIODS else "bulan"
+
+
+def _format_totals(title: str, totals: List[GroupTotal]) -> str:
+    if not totals:
+        return f"{title}\nBelum ada data."
+    lines = [title]
+    for rank, total in enumerate(totals, start=1):
+        lines.append(f"{rank}. {total.name}: {total.count} pekerjaan, {total.points:.2f} poin")
+    return "\n".join(lines)
+
+
+async def _analytics(context: ContextTypes.DEFAULT_TYPE) -> RecordColumns:
+    config = context.bot_data["config"]
+    if context.bot_data.get("replica_syncer") is not None:
+        await context.bot_data["replica_syncer"].ensure_fresh(config.replica_max_staleness)
+    return context.bot_data["analytics"]
+
+
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    period = _period_arg(context)
+    columns = await _analytics(context)
+    start, end = period_bounds(_tz_now(context.bot_data["config"].tz), period)
+    totals = columns.leaderboard(start, end, limit=PAGE_SIZE)
+    await update.message.reply_text(_format_totals(f"Leaderboard {PERIOD_LABELS[period]}:", totals))
+
+
+async def unitstats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    period = _period_arg(context)
+    columns = await _analytics(context)
+    start, end = period_bounds(_tz_now(context.bot_data["config"].tz), period)
+    tech_units = {tech.name: tech.unit for tech in context.bot_data["catalog"].techs}
+    totals = columns.by_unit(start, end, tech_units)
+    await update.message.reply_text(_format_totals(f"Total per unit {PERIOD_LABELS[period]}:", totals))
+
+
+async def segmentstats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    period = _period_arg(context)
+    columns = await _analytics(context)
+    start, end = period_bounds(_tz_now(context.bot_data["config"].tz), period)
+    segments = _format_totals(f"Total per segment {PERIOD_LABELS[period]}:", columns.by_segment(start, end))
+    workzones = _format_totals("Workzone teratas:", columns.by_workzone(start, end, limit=PAGE_SIZE))
+    await update.message.reply_text(f"{segments}\n\n{workzones}")
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = (
         "Panduan singkat:\n"
@@ -606,22 +737,299 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "- /setme: set nama teknisi kamu (sekali saja)\n"
         "- /me: lihat stats kamu hari ini & bulan ini\n"
         "- /stats Nama Teknisi: lihat stats teknisi tertentu\n"
+        "- /leaderboard [hari|bulan|semua]: peringkat teknisi berdasarkan poin\n"
+        "- /unitstats [hari|bulan|semua]: total per unit teknisi\n"
+        "- /segmentstats [hari|bulan|semua]: total per segment dan workzone\n"
+        "- /import: input banyak pekerjaan sekaligus dari CSV/XLSX atau teks (admin)\n"
         "- /cancel: batalkan proses input\n"
         "- /skip: lewati keterangan\n"
     )
     await update.message.reply_text(message)
 
 
-def build_app() -> Application:
-    config = load_config()
-    orders = load_orders(config.data_dir)
-    techs, units = load_technicians(config.data_dir)
+async def _require_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    if update.message.from_user.id in context.bot_data["config"].admin_user_ids:
+        return True
+    await update.message.reply_text("Perintah ini hanya untuk admin.")
+    return False
+
+
+async def _reply_lines(message: Message, lines: List[str]) -> None:
+    chunk = ""
+    for line in lines:
+        if chunk and len(chunk) + len(line) + 1 > TELEGRAM_TEXT_LIMIT:
+            await message.reply_text(chunk)
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line
+    await message.reply_text(chunk)
+
+
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await _require_admin(update, context):
+        return
+    needle = " ".join(context.args or []).strip()
+    lines = [line for line in REGISTRY.summary() if needle in line] or ["Belum ada data."]
+    await _reply_lines(update.message, lines)
+
+
+IMPORT_COMMAND = re.compile(r"^/import(?:@\w+)?")
+# getFile only serves files up to 20 MB to bots.
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+IMPORT_ERROR_LINES = 30
+IMPORT_USAGE = (
+    "Cara import banyak pekerjaan sekaligus:\n"
+    "- kirim file CSV/XLSX dengan caption /import, atau balas file tersebut dengan /import\n"
+    "- atau kirim /import diikuti baris data (satu pekerjaan per baris, kolom dipisah | atau tab):\n"
+    f"{' | '.join(IMPORT_COLUMNS)}\n\n"
+    "Baris pertama boleh berisi nama kolom; kolom yang tidak dipakai jenis order boleh dikosongkan. "
+    f"Format tanggal {DATE_INPUT_HINT}. Teknisi dan jenis order harus sama dengan daftar di bot."
+)
+
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await _require_admin(update, context):
+        return
+    message = update.message
+    reply_to = message.reply_to_message
+    document = message.document or (reply_to.document if reply_to else None)
+    if document is not None:
+        name = document.file_name or ""
+        if not name.lower().endswith(FILE_TYPES):
+            await message.reply_text(f"Format file tidak didukung. Gunakan {' atau '.join(FILE_TYPES)}.")
+            return
+        if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+            await message.reply_text("File terlalu besar (maksimal 20 MB). Pecah menjadi beberapa file.")
+            return
+        file = await document.get_file()
+        data = bytes(await file.download_as_bytearray())
+        await _run_import(message, context, lambda: file_rows(name, data))
+        return
+    body = IMPORT_COMMAND.sub("", message.text or "", count=1).lstrip(" ")
+    body = body[1:] if body.startswith("\n") else body
+    if not body.strip():
+        await message.reply_text(IMPORT_USAGE)
+        return
+    await _run_import(message, context, lambda: pasted_rows(body))
+
+
+async def _run_import(message: Message, context: ContextTypes.DEFAULT_TYPE, rows: Callable[[], Iterator[Row]]) -> None:
+    config: Config = context.bot_data["config"]
+    duplicates: DuplicateIndex = context.bot_data["duplicates"]
+    validator = RowValidator(context.bot_data["catalog"], ZoneInfo(config.tz))
+    user = message.from_user
+    start = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(
+            lambda: import_rows(
+                rows(), validator, duplicates, _tz_now(config.tz).isoformat(),
+                str(user.id), user.username or "", config.import_max_rows,
+            )
+        )
+    except ValueError as exc:
+        await message.reply_text(str(exc))
+        return
+    except Exception:
+        logger.exception("Reading import from %s failed", user.id)
+        await message.reply_text("File tidak bisa dibaca. Pastikan file CSV (UTF-8) atau XLSX yang valid.")
+        return
+    if result.records:
+        await context.bot_data["record_queue"].submit_many(result.records)
+        for record in result.records:
+            duplicates.add(asdict(record))
+    logger.info(
+        "Import by %s: %d row(s), %d queued, %d rejected in %.2fs",
+        user.id, result.rows, len(result.records), len(result.errors), time.perf_counter() - start,
+    )
+
+    summary = f"Import selesai: {len(result.records)} dari {result.rows} baris disimpan, {len(result.errors)} ditolak."
+    if result.records:
+        summary += "\nData dikirim bertahap di latar belakang."
+    errors = [f"Baris {error.line}: {error.message}" for error in result.errors]
+    if len(errors) > IMPORT_ERROR_LINES:
+        await message.reply_document(
+            error_report(result.errors),
+            filename="import_errors.csv",
+            caption=f"{summary}\nDaftar baris yang ditolak ada di file terlampir.",
+        )
+        return
+    await _reply_lines(message, [summary, *([""] + errors if errors else [])])
+
+
+def _instrument(app: Application) -> None:
+    def wrap(handler, conversation: str = "", state: str = "") -> None:
+        name = getattr(handler.callback, "__name__", type(handler).__name__)
+        handler.callback = timed(
+            handler.callback,
+            HANDLER_SECONDS.labels(name),
+            HANDLER_ERRORS.labels(name),
+            STATE_SECONDS.labels(conversation, state) if conversation else None,
+        )
 
-    app = Application.builder().token(config.bot_token).build()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            if not isinstance(handler, ConversationHandler):
+                wrap(handler)
+                continue
+            for entry in handler.entry_points:
+                wrap(entry, handler.name, "entry")
+            for state, state_handlers in handler.states.items():
+                for state_handler in state_handlers:
+                    wrap(state_handler, handler.name, STATE_NAMES.get(state, str(state)))
+            for fallback in handler.fallbacks:
+                wrap(fallback, handler.name, "fallback")
+
+
+def _register_gauges(app: Application) -> None:
+    bot_data = app.bot_data
+    gauges = (
+        ("pbs_catalog_segments", "Segments in the loaded catalog.", lambda: len(bot_data["catalog"].orders)),
+        ("pbs_catalog_order_types", "Order types in the loaded catalog.", lambda: len(bot_data["catalog"].orders_by_id)),
+        ("pbs_catalog_technicians", "Technicians in the loaded catalog.", lambda: len(bot_data["catalog"].techs)),
+        ("pbs_catalog_units", "Technician units in the loaded catalog.", lambda: len(bot_data["catalog"].units)),
+        ("pbs_stats_index_records", "Records counted in the stats index.", lambda: bot_data["stats_index"].size),
+        ("pbs_duplicate_index_keys", "Submissions known to the duplicate check.", lambda: len(bot_data["duplicates"])),
+        ("pbs_user_mappings_cached", "User mappings in the local cache.", lambda: len(bot_data["user_mappings"])),
+    )
+    if isinstance(bot_data["record_queue"], WriteBehindQueue):
+        spool = bot_data["record_queue"].spool
+        gauges += (
+            ("pbs_record_queue_pending", "Records waiting in the local spool.", spool.pending),
+            ("pbs_record_queue_dead", "Records refused by storage and set aside in spool_dead.", spool.dead),
+        )
+    for name, help_text, fn in gauges:
+        REGISTRY.gauge(name, help_text, fn=fn)
+
+
+async def _post_init(app: Application) -> None:
+    syncer: Optional[ReplicaSyncer] = app.bot_data.get("replica_syncer")
+    record_queue = app.bot_data["record_queue"]
+    queued: List[dict] = []
+    if syncer is not None:
+        records = await asyncio.to_thread(syncer.replica.records)
+        spool = record_queue.spool
+        queued = await asyncio.to_thread(lambda: [asdict(record) for _, record in spool.peek(spool.pending())])
+    else:
+        # Records an older version spooled before writes went straight to the store.
+        spool = RecordSpool(app.bot_data["config"].db_path)
+        try:
+            await WriteBehindQueue(spool, app.bot_data["storage"]).flush()
+        finally:
+            spool.close()
+        records = await asyncio.to_thread(app.bot_data["storage"].records)
+    tz = ZoneInfo(app.bot_data["config"].tz)
+    app.bot_data["stats_index"] = await asyncio.to_thread(StatsIndex.build, records, tz)
+    app.bot_data["analytics"] = await asyncio.to_thread(RecordColumns.build, records, tz)
+    app.bot_data["duplicates"] = await asyncio.to_thread(DuplicateIndex.build, records + queued)
+    record_queue.start()
+    if syncer is not None:
+        syncer.start()
+    # Best-effort warm-up: until the first load lands, get() falls back to a per-user lookup.
+    app.bot_data["user_mappings"].start()
+    if app.bot_data.get("sheets_exporter") is not None:
+        app.bot_data["sheets_exporter"].start()
+    if app.bot_data["config"].catalog_reload_interval > 0:
+        app.bot_data["catalog_watcher"].start()
+    if app.bot_data.get("metrics_server") is not None:
+        await app.bot_data["metrics_server"].start()
+    if app.bot_data.get("sheets_warmer") is not None:
+        app.bot_data["sheets_warmer"].start()
+
+
+async def _post_shutdown(app: Application) -> None:
+    if app.bot_data.get("metrics_server") is not None:
+        await app.bot_data["metrics_server"].stop()
+    await app.bot_data["catalog_watcher"].stop()
+    await app.bot_data["user_mappings"].stop()
+    if app.bot_data.get("replica_syncer") is not None:
+        await app.bot_data["replica_syncer"].stop()
+        app.bot_data["replica_syncer"].replica.close()
+    await app.bot_data["record_queue"].stop()
+    if isinstance(app.bot_data["record_queue"], WriteBehindQueue):
+        app.bot_data["record_queue"].spool.close()
+    if app.bot_data.get("sheets_exporter") is not None:
+        await app.bot_data["sheets_exporter"].stop()
+    await app.bot_data["storage"].aclose()
+    if app.bot_data.get("sheets_warmer") is not None:
+        await app.bot_data["sheets_warmer"].stop()
+    await app.bot_data["sheets"].aclose()
+
+
+def build_app(
+    config: Optional[Config] = None,
+    request: Optional[BaseRequest] = None,
+    sheets_transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Application:
+    config = config or load_config()
+    catalog = load_catalog_cached(config.data_dir, config.catalog_snapshot)
+
+    builder = (
+        Application.builder()
+        .token(config.bot_token)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .concurrent_updates(PerUserUpdateProcessor(config.update_concurrency))
+        .persistence(SQLitePersistence(config.db_path, update_interval=config.persistence_interval))
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    app = builder.build()
+    sheets = SheetsClient(config, transport=sheets_transport)
     app.bot_data["config"] = config
-    app.bot_data["orders"] = orders
-    app.bot_data["techs"] = techs
-    app.bot_data["units"] = units
+    app.bot_data["sheets"] = sheets
+    if config.sheets_warmup_interval > 0:
+        app.bot_data["sheets_warmer"] = SheetsWarmer(sheets, config.sheets_warmup_interval)
+    storage = open_storage(config, sheets)
+    app.bot_data["storage"] = storage
+    app.bot_data["stats_index"] = StatsIndex(ZoneInfo(config.tz))
+    app.bot_data["analytics"] = RecordColumns(ZoneInfo(config.tz))
+    app.bot_data["duplicates"] = DuplicateIndex()
+    app.bot_data["user_mappings"] = UserMappingCache(storage, ttl=config.user_mapping_ttl)
+
+    async def _index_new_rows(rows: List[dict]) -> None:
+        index: StatsIndex = app.bot_data["stats_index"]
+        duplicates: DuplicateIndex = app.bot_data["duplicates"]
+        for row in rows:
+            index.add(row)
+            duplicates.add(row)
+        app.bot_data["analytics"].extend(rows)
+
+    if isinstance(storage, SQLiteBackend):
+        # The store shares DB_PATH with everything else; no spool or replica copies on top.
+        record_queue = DirectWriter(storage)
+
+        async def _index_written(batch) -> None:
+            await _index_new_rows([asdict(record) for _, record in batch])
+
+        record_queue.listeners.append(_index_written)
+        app.bot_data["sheets_exporter"] = SheetsExporter(
+            storage,
+            sheets,
+            interval=config.sheets_export_interval,
+            batch_size=config.sheets_export_batch_size,
+        )
+    else:
+        record_queue = WriteBehindQueue(
+            RecordSpool(config.db_path),
+            storage,
+            batch_size=config.flush_batch_size,
+            interval=config.flush_interval,
+        )
+        syncer = ReplicaSyncer(RecordReplica(config.db_path), storage, interval=config.replica_sync_interval)
+
+        async def _sync_after_flush(batch) -> None:
+            syncer.request_sync()
+
+        record_queue.listeners.append(_sync_after_flush)
+        syncer.listeners.append(_index_new_rows)
+        app.bot_data["replica_syncer"] = syncer
+    app.bot_data["record_queue"] = record_queue
+    app.bot_data["catalog"] = catalog
+    app.bot_data["catalog_watcher"] = CatalogWatcher(
+        app.bot_data,
+        config.data_dir,
+        snapshot_path=config.catalog_snapshot,
+        interval=config.catalog_reload_interval,
+    )
 
     conv = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -662,6 +1070,8 @@ def build_app() -> Application:
             CONFIRM: [CallbackQueryHandler(confirm, pattern=r"^(SAVE|CANCEL)$")],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="record",
+        persistent=True,
     )
 
     setme_conv = ConversationHandler(
@@ -677,20 +1087,42 @@ def build_app() -> Application:
             ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="setme",
+        persistent=True,
     )
 
     app.add_handler(conv)
     app.add_handler(setme_conv)
     app.add_handler(CommandHandler("me", me))
     app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("leaderboard", leaderboard))
+    app.add_handler(CommandHandler("unitstats", unitstats))
+    app.add_handler(CommandHandler("segmentstats", segmentstats))
     app.add_handler(CommandHandler("help", help_command))
+    app.add_handler(CommandHandler("metrics", metrics_command))
+    app.add_handler(CommandHandler("import", import_command))
+    app.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(IMPORT_COMMAND), import_command))
+    _instrument(app)
+    _register_gauges(app)
+    if config.metrics_port:
+        app.bot_data["metrics_server"] = MetricsServer(REGISTRY, config.metrics_listen, config.metrics_port)
 
     return app
 
 
 def main() -> None:
     app = build_app()
-    app.run_polling()
+    config: Config = app.bot_data["config"]
+    if config.bot_mode == "webhook":
+        app.run_webhook(
+            listen=config.webhook_listen,
+            port=config.webhook_port,
+            url_path=urlparse(config.webhook_url).path.lstrip("/"),
+            webhook_url=config.webhook_url,
+            secret_token=config.webhook_secret,
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
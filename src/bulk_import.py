@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, tzinfo
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .data_loader import REQUIRED, SCHEMA_COLUMNS, UNAVAILABLE, Catalog, OrderItem, normalize_weight
+from .dedup import KEY_FIELDS, DuplicateIndex, DuplicateKey, duplicate_key
+from .sheets import Record
+from .stats import DATE_FMT, parse_date, to_epoch
+
+# Column order for pasted blocks and for files without a header row.
+IMPORT_COLUMNS = (
+    "segment", "jenis_order", "bobot", "service_number", "wo_number", "ticket_id",
+    "tanggal_open", "tanggal_close", "teknisi_1", "teknisi_2", "workzone", "keterangan",
+)
+FIELD_LABELS = {
+    "service_number": "Service Number",
+    "wo_number": "WO Number",
+    "ticket_id": "Ticket ID",
+    "tanggal_open": "Tanggal Open",
+    "tanggal_close": "Tanggal Close",
+    "workzone": "Workzone",
+}
+DATE_FIELDS = ("tanggal_open", "tanggal_close")
+PASTE_DELIMITERS = ("\t", "|")
+CSV_DELIMITERS = ",;\t|"
+FILE_TYPES = (".csv", ".xlsx")
+
+Row = Tuple[int, List[str]]
+
+
+@dataclass(frozen=True)
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass(frozen=True)
+class ImportResult:
+    records: List[Record]
+    errors: List[RowError]
+    rows: int
+
+
+def _column_name(text: str) -> str:
+    return text.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+# Headers of the Records sheet, of the catalog CSVs (WONUM, CLOSED_DATE, ...) and a few
+# spellings people type by hand.
+HEADER_ALIASES: Dict[str, str] = {
+    **{column: column for column in IMPORT_COLUMNS},
+    **{_column_name(column): field for field, column in SCHEMA_COLUMNS.items()},
+    "jenis": "jenis_order",
+    "order": "jenis_order",
+    "teknisi": "teknisi_1",
+    "teknisi1": "teknisi_1",
+    "teknisi2": "teknisi_2",
+    "wo": "wo_number",
+    "ticket": "ticket_id",
+    "tiket": "ticket_id",
+}
+
+
+def _cell(value: object) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FMT)
+    if isinstance(value, date):
+        return value.strftime("%d-%m-%Y 00:00:00")
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store service and ticket numbers typed without quotes as numbers.
+        return str(int(value))
+    return str(value).strip()
+
+
+def pasted_rows(text: str) -> Iterator[Row]:
+    lines = text.splitlines()
+    delimiter = next((d for d in PASTE_DELIMITERS if any(d in line for line in lines)), PASTE_DELIMITERS[-1])
+    for number, line in enumerate(lines, start=1):
+        yield number, [part.strip() for part in line.split(delimiter)]
+
+
+def csv_rows(data: bytes) -> Iterator[Row]:
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    sample = stream.read(8192)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel
+    for number, row in enumerate(csv.reader(stream, dialect), start=1):
+        yield number, [cell.strip() for cell in row]
+
+
+def xlsx_rows(data: bytes) -> Iterator[Row]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ValueError("Import XLSX butuh paket openpyxl (pip install openpyxl).") from exc
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            yield number, [_cell(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def file_rows(filename: str, data: bytes) -> Iterator[Row]:
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == ".xlsx":
+        return xlsx_rows(data)
+    if extension == ".csv":
+        return csv_rows(data)
+    raise ValueError(f"Format file tidak didukung: {extension or filename}. Gunakan {' atau '.join(FILE_TYPES)}.")
+
+
+def _header(cells: Sequence[str]) -> Optional[List[Optional[str]]]:
+    columns = [HEADER_ALIASES.get(_column_name(cell)) for cell in cells]
+    if "segment" in columns and "jenis_order" in columns:
+        return columns
+    return None
+
+
+class RowValidator:
+    def __init__(self, catalog: Catalog, tz: tzinfo) -> None:
+        self.tz = tz
+        self.segments = {segment.casefold(): segment for segment in catalog.orders}
+        self.orders: Dict[Tuple[str, str], List[OrderItem]] = {}
+        for segment, items in catalog.orders.items():
+            for item in items:
+                self.orders.setdefault((segment, item.name.casefold()), []).append(item)
+        self.techs = {tech.name.casefold(): tech.name for tech in catalog.techs}
+
+    def _order(self, segment: str, values: Dict[str, str]) -> OrderItem:
+        name = values.get("jenis_order", "")
+        if not name:
+            raise ValueError("Jenis order wajib diisi.")
+        items = self.orders.get((segment, name.casefold()))
+        if not items:
+            raise ValueError(f"Jenis order '{name}' tidak ada di segment {segment}.")
+        weight_text = values.get("bobot", "")
+        if weight_text:
+            weight = normalize_weight(weight_text)
+            items = [item for item in items if abs(item.weight - weight) < 1e-9]
+            if not items:
+                raise ValueError(f"Bobot {weight_text} tidak cocok dengan jenis order '{name}'.")
+        elif len(items) > 1:
+            weights = ", ".join(f"{item.weight:g}" for item in items)
+            raise ValueError(f"Jenis order '{name}' punya beberapa bobot ({weights}); isi kolom bobot.")
+        return items[0]
+
+    def _tech(self, values: Dict[str, str], field: str, required: bool) -> str:
+        name = values.get(field, "")
+        if not name:
+            if required:
+                raise ValueError("Teknisi 1 wajib diisi.")
+            return ""
+        tech = self.techs.get(name.casefold())
+        if tech is None:
+            raise ValueError(f"Teknisi '{name}' tidak ada di daftar teknisi.")
+        return tech
+
+    def record(self, values: Dict[str, str], timestamp: str, user_id: str, username: str) -> Record:
+        segment = self.segments.get(values.get("segment", "").casefold())
+        if segment is None:
+            raise ValueError(f"Segment '{values.get('segment', '')}' tidak dikenal.")
+        item = self._order(segment, values)
+        fields: Dict[str, str] = {}
+        for field, label in FIELD_LABELS.items():
+            requirement = item.requirement(field)
+            value = values.get(field, "") if requirement != UNAVAILABLE else ""
+            if requirement == REQUIRED and not value:
+                raise ValueError(f"{label} wajib diisi untuk '{item.name}'.")
+            if field in DATE_FIELDS and value and not parse_date(value):
+                raise ValueError(f"{label} '{value}' salah format, gunakan DD-MM-YYYY HH:MM:SS.")
+            fields[field] = value
+        teknisi_1 = self._tech(values, "teknisi_1", required=True)
+        teknisi_2 = self._tech(values, "teknisi_2", required=False)
+        return Record(
+            timestamp=timestamp,
+            submitter_user_id=user_id,
+            submitter_username=username,
+            segment=segment,
+            jenis_order=item.name,
+            bobot=item.weight,
+            teknisi_1=teknisi_1,
+            teknisi_2=teknisi_2,
+            keterangan=values.get("keterangan", ""),
+            tanggal_open_epoch=to_epoch(fields["tanggal_open"], self.tz) if fields["tanggal_open"] else None,
+            tanggal_close_epoch=to_epoch(fields["tanggal_close"], self.tz) if fields["tanggal_close"] else None,
+            **fields,
+        )
+
+
+def import_rows(
+    rows: Iterable[Row],
+    validator: RowValidator,
+    duplicates: DuplicateIndex,
+    timestamp: str,
+    user_id: str,
+    username: str = "",
+    max_rows: int = 5000,
+) -> ImportResult:
+    records: List[Record] = []
+    errors: List[RowError] = []
+    seen: Dict[DuplicateKey, int] = {}
+    columns: Sequence[Optional[str]] = IMPORT_COLUMNS
+    counted = 0
+    first = True
+    for line, cells in rows:
+        if not any(cells):
+            continue
+        if first:
+            first = False
+            header = _header(cells)
+            if header is not None:
+                columns = header
+                continue
+        if counted >= max_rows:
+            errors.append(RowError(line, f"Melebihi batas {max_rows} baris per import; baris ini dan setelahnya diabaikan."))
+            break
+        counted += 1
+        values = {column: cell for column, cell in zip(columns, cells) if column and cell}
+        try:
+            record = validator.record(values, timestamp, user_id, username)
+        except ValueError as exc:
+            errors.append(RowError(line, str(exc)))
+            continue
+        candidate = {name: getattr(record, name) for name in KEY_FIELDS}
+        key = duplicate_key(candidate)
+        if key is not None:
+            if key in seen:
+                errors.append(RowError(line, f"Data ganda dengan baris {seen[key]}."))
+                continue
+            if duplicates.seen(candidate):
+                errors.append(RowError(line, "Data ganda: sudah pernah disimpan."))
+                continue
+            seen[key] = line
+        records.append(record)
+    return ImportResult(records=records, errors=errors, rows=counted)
+
+
+def error_report(errors: List[RowError]) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["baris", "error"])
+    writer.writerows((error.line, error.message) for error in errors)
+    return out.getvalue().encode("utf-8-sig")
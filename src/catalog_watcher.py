@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, MutableMapping, Optional, Tuple
+
+from .data_loader import (
+    Catalog,
+    OrderItem,
+    Technician,
+    build_catalog,
+    is_order_file,
+    is_technician_file,
+    parse_order_file,
+    parse_technician_file,
+)
+from .snapshot import write_snapshot
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[int, int]
+
+
+def _scan(data_dir: str) -> Dict[str, Signature]:
+    signatures = {}
+    for name in os.listdir(data_dir):
+        if not name.lower().endswith(".csv"):
+            continue
+        st = os.stat(os.path.join(data_dir, name))
+        signatures[name] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+
+class CatalogWatcher:
+    def __init__(
+        self,
+        bot_data: MutableMapping,
+        data_dir: str,
+        snapshot_path: Optional[str] = None,
+        interval: float = 10.0,
+        keep: int = 10,
+    ) -> None:
+        self.bot_data = bot_data
+        self.data_dir = data_dir
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.keep = keep
+        catalog: Catalog = bot_data["catalog"]
+        self._orders: Dict[str, List[OrderItem]] = dict(catalog.orders)
+        self._techs: List[Technician] = list(catalog.techs)
+        self._signatures = _scan(data_dir)
+        self._versions: "OrderedDict[str, Catalog]" = OrderedDict([(catalog.version, catalog)])
+        bot_data["catalogs"] = self._versions
+        self._task: Optional[asyncio.Task] = None
+
+    def _reload(self, changed: List[str], removed: List[str]) -> Optional[Catalog]:
+        orders = dict(self._orders)
+        techs = self._techs
+        for name in removed:
+            if is_order_file(name):
+                orders.pop(os.path.splitext(name)[0], None)
+        for name in changed:
+            path = os.path.join(self.data_dir, name)
+            if is_technician_file(name):
+                techs = parse_technician_file(path)
+            elif is_order_file(name):
+                segment, items = parse_order_file(path)
+                if items:
+                    orders[segment] = items
+                else:
+                    orders.pop(segment, None)
+        catalog = build_catalog(orders, techs)
+        self._orders = orders
+        self._techs = techs
+        if catalog.version == self.bot_data["catalog"].version:
+            return None
+        if self.snapshot_path:
+            try:
+                write_snapshot(self.snapshot_path, self.data_dir, catalog)
+            except OSError:
+                logger.warning("Could not refresh catalog snapshot", exc_info=True)
+        return catalog
+
+    async def check(self) -> bool:
+        signatures = await asyncio.to_thread(_scan, self.data_dir)
+        changed = [name for name, sig in signatures.items() if self._signatures.get(name) != sig]
+        removed = [name for name in self._signatures if name not in signatures]
+        if not changed and not removed:
+            return False
+        catalog = await asyncio.to_thread(self._reload, changed, removed)
+        self._signatures = signatures
+        if catalog is None:
+            return False
+        self._versions[catalog.version] = catalog
+        self._versions.move_to_end(catalog.version)
+        while len(self._versions) > self.keep:
+            self._versions.popitem(last=False)
+        self.bot_data["catalog"] = catalog
+        logger.info("Catalog reloaded (version %s) after change in: %s", catalog.version, ", ".join(changed + removed))
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Catalog reload failed; keeping the current catalog")
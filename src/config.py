@@ -2,6 +2,7 @@
 
 import os
 from dataclasses import dataclass
+from typing import Tuple
 
 from dotenv import load_dotenv
 
@@ -14,6 +15,49 @@ class Config:
     gs_webapp_url: str
     tz: str
     data_dir: str
+    sheets_max_connections: int = 10
+    sheets_retries: int = 3
+    sheets_hedge_delay: float = 0.0
+    sheets_breaker_threshold: int = 5
+    sheets_breaker_reset: float = 30.0
+    sheets_warmup_interval: float = 240.0
+    db_path: str = "bot.db"
+    flush_batch_size: int = 50
+    flush_interval: float = 5.0
+    replica_sync_interval: float = 60.0
+    replica_max_staleness: float = 120.0
+    user_mapping_ttl: float = 600.0
+    catalog_snapshot: str = "catalog.snapshot"
+    catalog_reload_interval: float = 10.0
+    bot_mode: str = "polling"
+    webhook_url: str = ""
+    webhook_secret: str = ""
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    update_concurrency: int = 32
+    persistence_interval: float = 5.0
+    storage_backend: str = "sheets"
+    sheets_export_interval: float = 300.0
+    sheets_export_batch_size: int = 500
+    metrics_listen: str = "127.0.0.1"
+    metrics_port: int = 0
+    admin_user_ids: Tuple[int, ...] = ()
+    import_max_rows: int = 5000
+
+
+def _require_volume(db_path: str) -> None:
+    # Railway wipes the container filesystem on every deploy. DB_PATH holds the half-filled
+    # /start and /setme sessions and the spool of records already acknowledged to the user but
+    # not yet in Sheets; with STORAGE_BACKEND=sqlite it is the only copy of every record not yet
+    # exported. It must live on a volume.
+    if not any(os.getenv(name) for name in ("RAILWAY_PROJECT_ID", "RAILWAY_ENVIRONMENT")):
+        return
+    volume = os.getenv("RAILWAY_VOLUME_MOUNT_PATH", "").strip()
+    if not volume:
+        raise RuntimeError("DB_PATH needs a Railway volume to survive redeploys; attach one and point DB_PATH into it")
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    if os.path.commonpath([db_dir, os.path.abspath(volume)]) != os.path.abspath(volume):
+        raise RuntimeError(f"DB_PATH {db_path} is not on the Railway volume mounted at {volume}")
 
 
 def load_config() -> Config:
@@ -21,15 +65,51 @@ def load_config() -> Config:
     gs_webapp_url = os.getenv("GS_WEBAPP_URL", "").strip()
     tz = os.getenv("TZ", "Asia/Jakarta").strip()
     data_dir = os.getenv("DATA_DIR", "data").strip()
+    sheets_max_connections = int(os.getenv("SHEETS_MAX_CONNECTIONS", "10"))
+    sheets_retries = int(os.getenv("SHEETS_RETRIES", "3"))
+    sheets_hedge_delay = float(os.getenv("SHEETS_HEDGE_DELAY", "0"))
+    sheets_breaker_threshold = int(os.getenv("SHEETS_BREAKER_THRESHOLD", "5"))
+    sheets_breaker_reset = float(os.getenv("SHEETS_BREAKER_RESET", "30"))
+    sheets_warmup_interval = float(os.getenv("SHEETS_WARMUP_INTERVAL", "240"))
+    db_path = os.getenv("DB_PATH", "bot.db").strip()
+    flush_batch_size = int(os.getenv("FLUSH_BATCH_SIZE", "50"))
+    flush_interval = float(os.getenv("FLUSH_INTERVAL", "5"))
+    replica_sync_interval = float(os.getenv("REPLICA_SYNC_INTERVAL", "60"))
+    replica_max_staleness = float(os.getenv("REPLICA_MAX_STALENESS", "120"))
+    user_mapping_ttl = float(os.getenv("USER_MAPPING_TTL", "600"))
+    catalog_snapshot = os.getenv("CATALOG_SNAPSHOT", "catalog.snapshot").strip()
+    catalog_reload_interval = float(os.getenv("CATALOG_RELOAD_INTERVAL", "10"))
+    bot_mode = os.getenv("BOT_MODE", "polling").strip().lower()
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip()
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip()
+    webhook_listen = os.getenv("WEBHOOK_LISTEN", "0.0.0.0").strip()
+    webhook_port = int(os.getenv("WEBHOOK_PORT", "8443"))
+    update_concurrency = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+    persistence_interval = float(os.getenv("PERSISTENCE_INTERVAL", "5"))
+    storage_backend = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+    sheets_export_interval = float(os.getenv("SHEETS_EXPORT_INTERVAL", "300"))
+    sheets_export_batch_size = int(os.getenv("SHEETS_EXPORT_BATCH_SIZE", "500"))
+    metrics_listen = os.getenv("METRICS_LISTEN", "127.0.0.1").strip()
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    admin_user_ids = tuple(int(part) for part in os.getenv("ADMIN_USER_IDS", "").replace(" ", "").split(",") if part)
+    import_max_rows = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
 
-    missing = [
-        name
-        for name, value in [
-            ("BOT_TOKEN", bot_token),
-            ("GS_WEBAPP_URL", gs_webapp_url),
-        ]
-        if not value
+    if bot_mode not in ("polling", "webhook"):
+        raise RuntimeError(f"Invalid BOT_MODE: {bot_mode} (use polling or webhook)")
+    if storage_backend not in ("sheets", "sqlite"):
+        raise RuntimeError(f"Invalid STORAGE_BACKEND: {storage_backend} (use sheets or sqlite)")
+    _require_volume(db_path)
+
+    required = [
+        ("BOT_TOKEN", bot_token),
+        ("GS_WEBAPP_URL", gs_webapp_url),
     ]
+    if bot_mode == "webhook":
+        required += [
+            ("WEBHOOK_URL", webhook_url),
+            ("WEBHOOK_SECRET", webhook_secret),
+        ]
+    missing = [name for name, value in required if not value]
     if missing:
         raise RuntimeError(f"Missing env vars: {', '.join(missing)}")
 
@@ -38,4 +118,32 @@ def load_config() -> Config:
         gs_webapp_url=gs_webapp_url,
         tz=tz,
         data_dir=data_dir,
+        sheets_max_connections=sheets_max_connections,
+        sheets_retries=sheets_retries,
+        sheets_hedge_delay=sheets_hedge_delay,
+        sheets_breaker_threshold=sheets_breaker_threshold,
+        sheets_breaker_reset=sheets_breaker_reset,
+        sheets_warmup_interval=sheets_warmup_interval,
+        db_path=db_path,
+        flush_batch_size=flush_batch_size,
+        flush_interval=flush_interval,
+        replica_sync_interval=replica_sync_interval,
+        replica_max_staleness=replica_max_staleness,
+        user_mapping_ttl=user_mapping_ttl,
+        catalog_snapshot=catalog_snapshot,
+        catalog_reload_interval=catalog_reload_interval,
+        bot_mode=bot_mode,
+        webhook_url=webhook_url,
+        webhook_secret=webhook_secret,
+        webhook_listen=webhook_listen,
+        webhook_port=webhook_port,
+        update_concurrency=update_concurrency,
+        persistence_interval=persistence_interval,
+        storage_backend=storage_backend,
+        sheets_export_interval=sheets_export_interval,
+        sheets_export_batch_size=sheets_export_batch_size,
+        metrics_listen=metrics_listen,
+        metrics_port=metrics_port,
+        admin_user_ids=admin_user_ids,
+        import_max_rows=import_max_rows,
     )
@@ -1,10 +1,28 @@
 ﻿from __future__ import annotations
 
 import csv
+import hashlib
 import os
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
+from .search import OrderSearchIndex
+
+REQUIRED = "required"
+UNREQUIRED = "unrequired"
+UNAVAILABLE = "unavailable"
+
+SCHEMA_COLUMNS = {
+    "service_number": "SERVICE_NUMBER",
+    "wo_number": "WONUM",
+    "ticket_id": "TICKET_ID",
+    "tanggal_open": "CREATED/REPORTED_DATE",
+    "tanggal_close": "CLOSED_DATE",
+    "workzone": "WORKZONE",
+}
+
+FieldSchema = Tuple[Tuple[str, str], ...]
+
 
 @dataclass(frozen=True)
 class OrderItem:
@@ -12,10 +30,15 @@ class OrderItem:
     name: str
     weight: float
     segment: str
+    schema: FieldSchema = ()
+
+    def requirement(self, field: str) -> str:
+        return dict(self.schema).get(field, REQUIRED)
 
 
 @dataclass(frozen=True)
 class Technician:
+    id: str
     name: str
     unit: str
     labor: str | None
@@ -27,7 +50,7 @@ def _read_csv(path: str) -> List[dict]:
         return [row for row in reader]
 
 
-def _normalize_weight(value: str) -> float:
+def normalize_weight(value: str) -> float:
     if value is None:
         return 0.0
     s = str(value).strip()
@@ -40,48 +63,125 @@ def _normalize_weight(value: str) -> float:
         return 0.0
 
 
-def load_orders(data_dir: str) -> Dict[str, List[OrderItem]]:
-    orders: Dict[str, List[OrderItem]] = {}
-    for name in os.listdir(data_dir):
-        if not name.lower().endswith(".csv"):
+def _content_id(*parts: str) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:10]
+
+
+def _compile_schema(row: dict) -> FieldSchema:
+    schema = []
+    for field, column in SCHEMA_COLUMNS.items():
+        if column not in row:
+            schema.append((field, UNAVAILABLE))
             continue
-        if "teknisi" in name.lower():
+        value = (row.get(column) or "").strip().lower()
+        schema.append((field, value if value in (UNREQUIRED, UNAVAILABLE) else REQUIRED))
+    return tuple(schema)
+
+
+def _merge_schema(a: FieldSchema, b: FieldSchema) -> FieldSchema:
+    return tuple((field, req if req == dict(b).get(field) else UNREQUIRED) for field, req in a)
+
+
+def is_technician_file(name: str) -> bool:
+    return name.lower().endswith(".csv") and "teknisi" in name.lower()
+
+
+def is_order_file(name: str) -> bool:
+    return name.lower().endswith(".csv") and "teknisi" not in name.lower()
+
+
+def parse_order_file(path: str) -> Tuple[str, List[OrderItem]]:
+    segment = os.path.splitext(os.path.basename(path))[0]
+    items: Dict[str, OrderItem] = {}
+    for row in _read_csv(path):
+        order_name = (row.get("jenis order") or row.get("JENIS_ORDER") or "").strip()
+        if not order_name:
             continue
-        path = os.path.join(data_dir, name)
-        rows = _read_csv(path)
-        segment = os.path.splitext(name)[0]
-        items: List[OrderItem] = []
-        for idx, row in enumerate(rows):
-            order_name = (row.get("jenis order") or row.get("JENIS_ORDER") or "").strip()
-            if not order_name:
-                continue
-            weight = _normalize_weight(row.get("bobot", ""))
-            item_id = f"{segment}:{idx}"
-            items.append(OrderItem(id=item_id, name=order_name, weight=weight, segment=segment))
-        if items:
-            orders[segment] = items
-    return orders
+        weight = normalize_weight(row.get("bobot", ""))
+        item_id = _content_id(segment, order_name, f"{weight:g}")
+        schema = _compile_schema(row)
+        if item_id in items:
+            schema = _merge_schema(items[item_id].schema, schema)
+        items[item_id] = OrderItem(id=item_id, name=order_name, weight=weight, segment=segment, schema=schema)
+    return segment, list(items.values())
 
 
-def load_technicians(data_dir: str) -> Tuple[List[Technician], List[str]]:
-    tech_file = None
-    for name in os.listdir(data_dir):
-        if name.lower().endswith(".csv") and "teknisi" in name.lower():
-            tech_file = os.path.join(data_dir, name)
-            break
-    if not tech_file:
-        raise FileNotFoundError("Technician CSV not found in data directory")
-
-    rows = _read_csv(tech_file)
-    technicians: List[Technician] = []
-    units = set()
-    for row in rows:
+def parse_technician_file(path: str) -> List[Technician]:
+    technicians: Dict[str, Technician] = {}
+    for row in _read_csv(path):
         name = (row.get("NAMA") or row.get("nama") or "").strip()
         if not name:
             continue
         unit = (row.get("UNIT") or row.get("unit") or "").strip()
         labor = (row.get("LABOR") or row.get("labor") or "").strip() or None
-        technicians.append(Technician(name=name, unit=unit, labor=labor))
-        if unit:
-            units.add(unit)
-    return technicians, sorted(units)
+        tech_id = _content_id(name, labor or "")
+        if tech_id not in technicians:
+            technicians[tech_id] = Technician(id=tech_id, name=name, unit=unit, labor=labor)
+    return list(technicians.values())
+
+
+def load_orders(data_dir: str) -> Dict[str, List[OrderItem]]:
+    orders: Dict[str, List[OrderItem]] = {}
+    for name in sorted(os.listdir(data_dir)):
+        if not is_order_file(name):
+            continue
+        segment, items = parse_order_file(os.path.join(data_dir, name))
+        if items:
+            orders[segment] = items
+    return orders
+
+
+def _find_technician_file(data_dir: str) -> str:
+    for name in sorted(os.listdir(data_dir)):
+        if is_technician_file(name):
+            return os.path.join(data_dir, name)
+    raise FileNotFoundError("Technician CSV not found in data directory")
+
+
+def load_technicians(data_dir: str) -> Tuple[List[Technician], List[str]]:
+    technicians = parse_technician_file(_find_technician_file(data_dir))
+    return technicians, sorted({t.unit for t in technicians if t.unit})
+
+
+@dataclass(frozen=True)
+class Catalog:
+    orders: Dict[str, List[OrderItem]]
+    orders_by_id: Dict[str, OrderItem]
+    search: Dict[str, OrderSearchIndex]
+    techs: List[Technician]
+    techs_by_id: Dict[str, Technician]
+    units: List[str]
+    unit_techs: Dict[str, List[Technician]]
+    version: str
+
+    @property
+    def segments(self) -> List[str]:
+        return sorted(self.orders)
+
+
+def build_catalog(orders: Dict[str, List[OrderItem]], techs: List[Technician]) -> Catalog:
+    unit_techs: Dict[str, List[Technician]] = {}
+    for tech in techs:
+        if tech.unit:
+            unit_techs.setdefault(tech.unit, []).append(tech)
+    orders_by_id = {item.id: item for items in orders.values() for item in items}
+    techs_by_id = {tech.id: tech for tech in techs}
+    return Catalog(
+        orders=orders,
+        orders_by_id=orders_by_id,
+        search={segment: OrderSearchIndex(items) for segment, items in orders.items()},
+        techs=techs,
+        techs_by_id=techs_by_id,
+        units=sorted(unit_techs),
+        unit_techs=unit_techs,
+        version=_content_id(
+            *(f"{i}:{orders_by_id[i].schema}" for i in sorted(orders_by_id)),
+            "|",
+            *(f"{t.id}:{t.unit}" for t in techs),
+        ),
+    )
+
+
+def load_catalog(data_dir: str) -> Catalog:
+    techs, _ = load_technicians(data_dir)
+    return build_catalog(load_orders(data_dir), techs)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Iterable, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+KEY_FIELDS = ("segment", "ticket_id", "wo_number", "service_number")
+MERGE_THRESHOLD = 4096
+_MASK = (1 << 64) - 1
+
+DuplicateKey = Tuple[str, str, str, str]
+
+
+def duplicate_key(record: Mapping) -> Optional[DuplicateKey]:
+    key = tuple(str(record.get(name) or "").strip().upper() for name in KEY_FIELDS)
+    # Without a ticket, WO or service number there is nothing to tell two jobs apart.
+    if not any(key[1:]):
+        return None
+    return key
+
+
+class DuplicateIndex:
+    # Keys are kept as 64-bit fingerprints: a sorted uint64 array plus a small set of recent
+    # additions that is merged in once it grows, so a million records take about 8 MB.
+    def __init__(self) -> None:
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._recent: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    @classmethod
+    def build(cls, records: Iterable[Mapping]) -> "DuplicateIndex":
+        index = cls()
+        fingerprints = {_fingerprint(key) for key in map(duplicate_key, records) if key is not None}
+        index._sorted = np.fromiter(sorted(fingerprints), dtype=np.uint64, count=len(fingerprints))
+        return index
+
+    def add(self, record: Mapping) -> None:
+        key = duplicate_key(record)
+        if key is None:
+            return
+        fingerprint = _fingerprint(key)
+        if self._contains(fingerprint):
+            return
+        self._recent.add(fingerprint)
+        if len(self._recent) >= MERGE_THRESHOLD:
+            merged = np.concatenate([self._sorted, np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))])
+            merged.sort()
+            self._sorted = merged
+            self._recent = set()
+
+    def seen(self, record: Mapping) -> bool:
+        key = duplicate_key(record)
+        return key is not None and self._contains(_fingerprint(key))
+
+    def _contains(self, fingerprint: int) -> bool:
+        if fingerprint in self._recent:
+            return True
+        sorted_ = self._sorted
+        i = int(sorted_.searchsorted(np.uint64(fingerprint)))
+        return i < len(sorted_) and int(sorted_[i]) == fingerprint
+
+
+def _fingerprint(key: DuplicateKey) -> int:
+    # hash() is salted per process, which is fine for an index rebuilt at every start.
+    return hash(key) & _MASK
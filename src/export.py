@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from .sheets import (
+    HEADER_ROW,
+    RECORD_FIELDS,
+    Record,
+    SheetsClient,
+    append_records,
+    get_all_user_mappings,
+    get_records_page,
+    set_user_mapping,
+)
+from .storage import SQLiteBackend
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 1800.0
+
+
+class SheetsExporter:
+    def __init__(self, store: SQLiteBackend, client: SheetsClient, interval: float = 300.0, batch_size: int = 500) -> None:
+        self.store = store
+        self.client = client
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def export(self) -> int:
+        async with self._lock:
+            exported = 0
+            while True:
+                batch = await asyncio.to_thread(self.store.unexported_records, self.batch_size)
+                if not batch:
+                    break
+                # record_id lets Code.gs drop rows it already wrote when a batch is retried.
+                result = await append_records(self.client, [(record_id, record) for _, record_id, record in batch])
+                if result.rejected:
+                    # The rows stay in the local store; only their copy in the sheet is missing.
+                    logger.error("Sheets rejected %d exported record(s): %s", len(result.rejected), result.rejected)
+                await asyncio.to_thread(self.store.set_exported_row, batch[-1][0])
+                exported += len(batch)
+            for user_id, username, teknisi_name, updated_at in await asyncio.to_thread(self.store.unexported_mappings):
+                await set_user_mapping(self.client, user_id, username, teknisi_name)
+                await asyncio.to_thread(self.store.mark_mapping_exported, user_id, updated_at)
+            return exported
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.export()
+        except Exception:
+            pending = await asyncio.to_thread(self.store.pending_export)
+            logger.warning("Final export failed; %d record(s) wait for the next run", pending)
+
+    async def _run(self) -> None:
+        delay = self.interval
+        while True:
+            try:
+                exported = await self.export()
+            except Exception:
+                delay = min(delay * 2, MAX_BACKOFF)
+                logger.exception("Exporting to Sheets failed; retrying in %.0fs", delay)
+            else:
+                if exported:
+                    logger.info("Exported %d record(s) to Sheets", exported)
+                delay = self.interval
+            await asyncio.sleep(delay)
+
+
+def _sheet_record(data: dict) -> Record:
+    values = {}
+    for name in RECORD_FIELDS:
+        value = data.get(name)
+        if name.endswith("_epoch"):
+            try:
+                values[name] = int(float(value))
+            except (TypeError, ValueError):
+                values[name] = None
+        elif name == "bobot":
+            try:
+                values[name] = float(value or 0)
+            except (TypeError, ValueError):
+                values[name] = 0.0
+        else:
+            values[name] = "" if value is None else str(value).strip()
+    return Record(**values)
+
+
+async def import_from_sheets(store: SQLiteBackend, client: SheetsClient) -> int:
+    if await asyncio.to_thread(store.last_row) > HEADER_ROW:
+        raise RuntimeError("The local store already has records; import only into an empty store")
+    # Rows already in the sheet count as exported, so the exporter does not write them again.
+    cursor: Optional[int] = HEADER_ROW
+    imported = 0
+    while cursor is not None:
+        page = await get_records_page(client, cursor)
+        records = [(str(data.get("record_id") or "") or f"sheet-{row}", _sheet_record(data)) for row, data in page.rows]
+        imported += await asyncio.to_thread(store.insert, records)
+        cursor = page.next_cursor
+    await asyncio.to_thread(store.set_exported_row, await asyncio.to_thread(store.last_row))
+    for user_id, teknisi_name in (await get_all_user_mappings(client)).items():
+        await asyncio.to_thread(store.put_mapping, user_id, "", teknisi_name, "", True)
+    return imported
+
+
+async def _main(import_sheets: bool) -> None:
+    from .config import load_config
+
+    config = load_config()
+    store = SQLiteBackend(config.db_path, ZoneInfo(config.tz))
+    client = SheetsClient(config)
+    try:
+        if import_sheets:
+            imported = await import_from_sheets(store, client)
+            print(f"imported {imported} record(s) from Sheets into {config.db_path}")
+        else:
+            exporter = SheetsExporter(store, client, batch_size=config.sheets_export_batch_size)
+            exported = await exporter.export()
+            print(f"exported {exported} record(s) to Sheets")
+    finally:
+        await client.aclose()
+        store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export new rows from the local store to the Records sheet.")
+    parser.add_argument(
+        "--import-sheets",
+        action="store_true",
+        help="copy the existing Records and UserMapping sheets into the local store instead (once, when switching to STORAGE_BACKEND=sqlite)",
+    )
+    args = parser.parse_args()
+    asyncio.run(_main(args.import_sheets))
+
+
+if __name__ == "__main__":
+    main()
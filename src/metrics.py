@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: LabelValues, values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class HistogramSeries:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeSeries(CounterSeries):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: LabelValues = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.series: Dict[LabelValues, object] = {}
+
+    @abc.abstractmethod
+    def _new(self) -> object:
+        ...
+
+    def labels(self, *values: str):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = self._new()
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(series.value)}")
+        return lines
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: LabelValues = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+
+    def _new(self) -> HistogramSeries:
+        return HistogramSeries(self.buckets)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                extra = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, extra)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {series.sum!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {series.count}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new(self) -> CounterSeries:
+        return CounterSeries()
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: LabelValues = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.fn: Optional[Callable[[], float]] = None
+
+    def _new(self) -> GaugeSeries:
+        return GaugeSeries()
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                self.labels().set(self.fn())
+            except Exception:
+                logger.exception("Reading gauge %s failed", self.name)
+        return super().render()
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: LabelValues = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labelnames, buckets)
+
+    def counter(self, name: str, help_text: str, labelnames: LabelValues = ()) -> Counter:
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: LabelValues = (), fn: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get(Gauge, name, help_text, labelnames)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> List[str]:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            if isinstance(metric, Gauge) and metric.fn is not None:
+                metric.render()
+            for values, series in sorted(metric.series.items()):
+                label = f"{metric.name}{_labels(metric.labelnames, values)}"
+                if isinstance(series, HistogramSeries):
+                    if series.count:
+                        lines.append(
+                            f"{label} n={series.count} avg={series.sum / series.count * 1e3:.0f}ms "
+                            f"p50={series.quantile(0.5) * 1e3:.0f}ms p95={series.quantile(0.95) * 1e3:.0f}ms "
+                            f"p99={series.quantile(0.99) * 1e3:.0f}ms"
+                        )
+                elif series.value or isinstance(series, GaugeSeries):
+                    lines.append(f"{label} {_number(series.value)}")
+        return lines
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram("pbs_handler_seconds", "Handler latency.", ("handler",))
+HANDLER_ERRORS = REGISTRY.counter("pbs_handler_errors_total", "Handlers that raised.", ("handler",))
+STATE_SECONDS = REGISTRY.histogram(
+    "pbs_conversation_state_seconds", "Handler latency per conversation state.", ("conversation", "state")
+)
+SHEETS_SECONDS = REGISTRY.histogram("pbs_sheets_request_seconds", "Apps Script web app latency per action.", ("action",))
+SHEETS_ERRORS = REGISTRY.counter("pbs_sheets_errors_total", "Failed Apps Script web app calls per action.", ("action",))
+SHEETS_RETRIES = REGISTRY.counter("pbs_sheets_retries_total", "Apps Script web app calls sent again.", ("action",))
+SHEETS_HEDGES = REGISTRY.counter("pbs_sheets_hedges_total", "Hedged second requests for read actions.", ("action",))
+SHEETS_STALE = REGISTRY.counter("pbs_sheets_stale_responses_total", "Cached responses served while Apps Script failed.", ("action",))
+SHEETS_CIRCUIT_OPEN = REGISTRY.gauge("pbs_sheets_circuit_open", "1 while the Apps Script circuit breaker fails fast.").labels()
+SHEETS_IN_FLIGHT = REGISTRY.gauge("pbs_sheets_requests_in_flight", "Apps Script web app calls in progress.").labels()
+UPDATES_IN_FLIGHT = REGISTRY.gauge("pbs_updates_in_flight", "Updates accepted and not yet handled.").labels()
+UPDATES_RUNNING = REGISTRY.gauge("pbs_updates_running", "Updates whose handlers are running.").labels()
+
+
+def timed(
+    callback: Callable[..., Awaitable],
+    handler: HistogramSeries,
+    errors: CounterSeries,
+    state: Optional[HistogramSeries] = None,
+) -> Callable[..., Awaitable]:
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            handler.observe(elapsed)
+            if state is not None:
+                state.observe(elapsed)
+
+    return wrapper
+
+
+class MetricsServer:
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9464) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
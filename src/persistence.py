@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import pickle
+import threading
+from typing import Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from .db import connect
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[int, ...]
+ConversationDict = Dict[ConversationKey, object]
+ConversationRow = Tuple[str, str]
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, path: str, update_interval: float = 5.0) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS persist_user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS persist_conversations (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (name, key)
+            );
+            """
+        )
+        self._users: Dict[int, Optional[bytes]] = {}
+        self._conversations: Dict[ConversationRow, Optional[str]] = {}
+        self._writer: Optional[asyncio.Task] = None
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        rows = await asyncio.to_thread(self._select, "SELECT user_id, data FROM persist_user_data")
+        user_data: Dict[int, dict] = {}
+        for user_id, blob in rows:
+            try:
+                user_data[int(user_id)] = pickle.loads(blob)
+            except Exception:
+                logger.warning("Dropping unreadable user_data for user %s", user_id, exc_info=True)
+        logger.info("Restored user_data for %d user(s)", len(user_data))
+        return user_data
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        rows = await asyncio.to_thread(
+            self._select, "SELECT key, state FROM persist_conversations WHERE name = ?", (name,)
+        )
+        conversations = {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+        logger.info("Restored %d open %s conversation(s)", len(conversations), name)
+        return conversations
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._conversations[(name, json.dumps(list(key)))] = state
+        self._schedule()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._users[user_id] = pickle.dumps(dict(data), protocol=pickle.HIGHEST_PROTOCOL)
+        self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users[user_id] = None
+        self._schedule()
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._writer is not None:
+            await self._writer
+        await self._drain()
+        with self._lock:
+            self._conn.close()
+
+    def _select(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _schedule(self) -> None:
+        # PTB hands over every dirty user and conversation in one burst per update_interval;
+        # the writer task runs after that burst and commits it as a single transaction.
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while self._users or self._conversations:
+            users, self._users = self._users, {}
+            conversations, self._conversations = self._conversations, {}
+            try:
+                await asyncio.to_thread(self._write, users, conversations)
+            except Exception:
+                logger.exception("Persisting %d session(s) failed; retrying next cycle", len(users) + len(conversations))
+                for user_id, blob in users.items():
+                    self._users.setdefault(user_id, blob)
+                for row, state in conversations.items():
+                    self._conversations.setdefault(row, state)
+                return
+
+    def _write(self, users: Dict[int, Optional[bytes]], conversations: Dict[ConversationRow, Optional[str]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO persist_user_data (user_id, data) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                    [(user_id, blob) for user_id, blob in users.items() if blob is not None],
+                )
+                self._conn.executemany(
+                    "DELETE FROM persist_user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, blob in users.items() if blob is None],
+                )
+                self._conn.executemany(
+                    "INSERT INTO persist_conversations (name, key, state) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name, key) DO UPDATE SET state = excluded.state",
+                    [(name, key, state) for (name, key), state in conversations.items() if state is not None],
+                )
+                self._conn.executemany(
+                    "DELETE FROM persist_conversations WHERE name = ? AND key = ?",
+                    [(name, key) for (name, key), state in conversations.items() if state is None],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
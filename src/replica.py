@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .db import connect
+from .sheets import HEADER_ROW, RECORD_FIELDS, RECORD_PAGE_SIZE
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+SyncListener = Callable[[List[dict]], Awaitable[None]]
+
+
+class RecordReplica:
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        columns = ", ".join(f"{name} TEXT" for name in RECORD_FIELDS)
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS replica_records (row INTEGER PRIMARY KEY, {columns});
+            CREATE INDEX IF NOT EXISTS idx_replica_teknisi_1 ON replica_records (teknisi_1);
+            CREATE INDEX IF NOT EXISTS idx_replica_teknisi_2 ON replica_records (teknisi_2);
+            CREATE TABLE IF NOT EXISTS replica_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(replica_records)")}
+        for name in RECORD_FIELDS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE replica_records ADD COLUMN {name} TEXT")
+        self._insert_sql = (
+            f"INSERT OR IGNORE INTO replica_records (row, {', '.join(RECORD_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' for _ in RECORD_FIELDS)})"
+        )
+
+    def _meta(self, key: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM replica_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT INTO replica_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def last_row(self) -> int:
+        with self._lock:
+            return int(self._meta("last_row", str(HEADER_ROW)))
+
+    def synced_at(self) -> float:
+        with self._lock:
+            return float(self._meta("synced_at", "0"))
+
+    def apply(self, rows: List[Tuple[int, dict]], last_row: int) -> List[dict]:
+        inserted: List[dict] = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row_number, data in rows:
+                    values = [_cell(data.get(name)) for name in RECORD_FIELDS]
+                    cur = self._conn.execute(self._insert_sql, (row_number, *values))
+                    if cur.rowcount:
+                        inserted.append(dict(zip(RECORD_FIELDS, values)))
+                self._set_meta("last_row", str(last_row))
+                self._set_meta("synced_at", str(time.time()))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def records(self, tech_name: Optional[str] = None) -> List[dict]:
+        sql = f"SELECT {', '.join(RECORD_FIELDS)} FROM replica_records"
+        params: tuple = ()
+        if tech_name is not None:
+            sql += " WHERE teknisi_1 = ? OR teknisi_2 = ?"
+            params = (tech_name, tech_name)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY row", params).fetchall()
+        return [dict(zip(RECORD_FIELDS, row)) for row in rows]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM replica_records")
+            self._conn.execute("DELETE FROM replica_meta")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+class ReplicaSyncer:
+    def __init__(self, replica: RecordReplica, storage: StorageBackend, interval: float = 60.0, page_size: int = RECORD_PAGE_SIZE) -> None:
+        self.replica = replica
+        self.storage = storage
+        self.interval = interval
+        self.page_size = page_size
+        self.listeners: List[SyncListener] = []
+        self.caught_up = False
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def request_sync(self) -> None:
+        self._wake.set()
+
+    async def sync(self) -> int:
+        async with self._lock:
+            total = 0
+            while True:
+                after_row = await asyncio.to_thread(self.replica.last_row)
+                page = await self.storage.get_records_page(after_row, self.page_size)
+                cursor = page.rows[-1][0] if page.rows else max(after_row, page.last_row)
+                inserted = await asyncio.to_thread(self.replica.apply, page.rows, cursor)
+                total += len(inserted)
+                for listener in self.listeners:
+                    try:
+                        await listener(inserted)
+                    except Exception:
+                        logger.exception("Replica sync listener failed")
+                if page.next_cursor is None or not page.rows:
+                    self.caught_up = True
+                    return total
+
+    async def ensure_fresh(self, max_staleness: float) -> None:
+        synced_at = await asyncio.to_thread(self.replica.synced_at)
+        if time.time() - synced_at <= max_staleness:
+            return
+        try:
+            await self.sync()
+        except Exception:
+            logger.warning("Replica sync failed; serving data synced %.0fs ago", time.time() - synced_at, exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                added = await self.sync()
+                if added:
+                    logger.info("Replica synced %d new record(s)", added)
+            except Exception:
+                logger.exception("Replica sync failed")
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait((waiter,), timeout=self.interval)
+            finally:
+                waiter.cancel()
+            self._wake.clear()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set, Tuple
+
+if TYPE_CHECKING:
+    from .data_loader import OrderItem
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+SCORE_EXACT = 4.0
+SCORE_PREFIX = 3.0
+SCORE_WORD_START = 2.5
+SCORE_SUBSTRING = 2.0
+SCORE_TOKENS = 1.0
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _max_edits(token: str) -> int:
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 7:
+        return 1
+    return 2
+
+
+@lru_cache(maxsize=4096)
+def _deletes(token: str, max_edits: int) -> frozenset:
+    variants = {token}
+    for k in range(1, max_edits + 1):
+        if len(token) - k < 1:
+            break
+        for positions in combinations(range(len(token)), k):
+            variants.add("".join(c for i, c in enumerate(token) if i not in positions))
+    return frozenset(variants)
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class OrderSearchIndex:
+    def __init__(self, items: Iterable["OrderItem"]) -> None:
+        self.items: List["OrderItem"] = list(items)
+        self._names = [normalize(item.name) for item in self.items]
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        for idx, name in enumerate(self._names):
+            for gram in _trigrams(name):
+                self._grams[gram].add(idx)
+            for token in name.split():
+                self._postings[token].add(idx)
+        for token in self._postings:
+            for variant in _deletes(token, _max_edits(token)):
+                self._deletes[variant].add(token)
+        self._vocab = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def search(self, query: str, limit: int | None = None) -> Tuple[List["OrderItem"], int]:
+        text = normalize(query)
+        if not text:
+            return [], 0
+        scores: Dict[int, float] = {}
+        for idx in self._substring_candidates(text):
+            name = self._names[idx]
+            if name == text:
+                scores[idx] = SCORE_EXACT
+            elif name.startswith(text):
+                scores[idx] = SCORE_PREFIX
+            elif f" {text}" in f" {name}":
+                scores[idx] = SCORE_WORD_START
+            else:
+                scores[idx] = SCORE_SUBSTRING
+        for idx, score in self._token_matches(text.split()).items():
+            if idx not in scores:
+                scores[idx] = SCORE_TOKENS + score
+        ranked = sorted(
+            scores,
+            key=lambda i: (-scores[i], -self.items[i].weight, len(self._names[i]), self._names[i]),
+        )
+        total = len(ranked)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.items[i] for i in ranked], total
+
+    def contains(self, query: str, item: "OrderItem") -> bool:
+        text = normalize(query)
+        return bool(text) and text in normalize(item.name)
+
+    def _substring_candidates(self, text: str) -> Iterable[int]:
+        if len(text) < 3:
+            return [idx for idx, name in enumerate(self._names) if text in name]
+        grams = sorted((self._grams.get(g, set()) for g in _trigrams(text)), key=len)
+        candidates = set(grams[0])
+        for posting in grams[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return [idx for idx in candidates if text in self._names[idx]]
+
+    def _token_matches(self, tokens: List[str]) -> Dict[int, float]:
+        combined: Dict[int, float] | None = None
+        for token in tokens:
+            per_item: Dict[int, float] = {}
+            for vocab_token, score in self._token_variants(token):
+                for idx in self._postings[vocab_token]:
+                    if score > per_item.get(idx, 0.0):
+                        per_item[idx] = score
+            if combined is None:
+                combined = per_item
+            else:
+                combined = {idx: combined[idx] + s for idx, s in per_item.items() if idx in combined}
+            if not combined:
+                return {}
+        if not combined:
+            return {}
+        return {idx: score / len(tokens) for idx, score in combined.items()}
+
+    def _token_variants(self, token: str) -> Iterable[Tuple[str, float]]:
+        found = False
+        if token in self._postings:
+            found = True
+            yield token, 1.0
+        pos = bisect_left(self._vocab, token)
+        while pos < len(self._vocab) and self._vocab[pos].startswith(token):
+            if self._vocab[pos] != token:
+                found = True
+                yield self._vocab[pos], 0.8
+            pos += 1
+        limit = _max_edits(token)
+        if found or not limit:
+            return
+        seen: Set[str] = set()
+        for variant in _deletes(token, limit):
+            for vocab_token in self._deletes.get(variant, ()):
+                if vocab_token in seen or vocab_token == token:
+                    continue
+                seen.add(vocab_token)
+                distance = _edit_distance(token, vocab_token, limit)
+                if distance <= limit:
+                    yield vocab_token, 0.6 - 0.1 * distance
+
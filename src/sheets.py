@@ -1,12 +1,31 @@
 ﻿from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import httpx
 
 from .config import Config
+from .metrics import (
+    SHEETS_CIRCUIT_OPEN,
+    SHEETS_ERRORS,
+    SHEETS_HEDGES,
+    SHEETS_IN_FLIGHT,
+    SHEETS_RETRIES,
+    SHEETS_SECONDS,
+    SHEETS_STALE,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -26,40 +45,286 @@ class Record:
     teknisi_2: str
     workzone: str
     keterangan: str
+    tanggal_open_epoch: Optional[int] = None
+    tanggal_close_epoch: Optional[int] = None
+
+
+RECORD_FIELDS = tuple(f.name for f in fields(Record))
+
+HEADER_ROW = 1
+RECORD_PAGE_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class RecordPage:
+    rows: List[Tuple[int, dict]]
+    next_cursor: Optional[int]
+    last_row: int
+
+
+@dataclass(frozen=True)
+class AppendResult:
+    written: int
+    # record_id -> reason, for records the backend will never accept as sent.
+    rejected: Dict[str, str]
+
+
+READ_ACTIONS = frozenset({"get_user_mapping", "get_all_user_mappings", "get_all_records", "get_stats", "ping"})
+# append_records drops record_ids it already wrote and set_user_mapping is an upsert, so both
+# are safe to send again.
+IDEMPOTENT_ACTIONS = READ_ACTIONS | {"append_records", "set_user_mapping"}
+ACTION_TIMEOUTS = {
+    "ping": 10.0,
+    "get_user_mapping": 10.0,
+    "get_stats": 15.0,
+    "get_all_user_mappings": 20.0,
+    "set_user_mapping": 20.0,
+    "append_records": 45.0,
+    "get_all_records": 60.0,
+}
+DEFAULT_TIMEOUT = 20.0
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+# Small reads whose last answer is still useful while Apps Script is down.
+CACHED_ACTIONS = frozenset({"get_user_mapping", "get_all_user_mappings", "get_stats"})
+RESPONSE_CACHE_SIZE = 256
+
+
+class SheetsUnavailable(RuntimeError):
+    pass
+
+
+class AppendFailed(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        # After reset_timeout one call goes through as a probe; the rest keep failing fast.
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        SHEETS_CIRCUIT_OPEN.set(0)
+
+    def abandon(self) -> None:
+        self._probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.threshold and (self.opened_at is not None or self.failures >= self.threshold):
+            if self.opened_at is None:
+                logger.warning("Apps Script failed %d times in a row; failing fast for %gs", self.failures, self.reset_timeout)
+            self.opened_at = self.clock()
+            SHEETS_CIRCUIT_OPEN.set(1)
+
+
+class SheetsClient:
+    def __init__(self, config: Config, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self.config = config
+        # Apps Script answers every call with a 302 to a one-time script.googleusercontent.com
+        # URL, so the target cannot be cached; keeping connections to both hosts open across
+        # warm-up pings saves the TLS handshakes instead.
+        self.http = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=config.sheets_max_connections,
+                max_keepalive_connections=config.sheets_max_connections,
+                keepalive_expiry=max(60.0, config.sheets_warmup_interval + 30),
+            ),
+            transport=transport,
+        )
+        self.breaker = CircuitBreaker(config.sheets_breaker_threshold, config.sheets_breaker_reset)
+        self._responses: "OrderedDict[str, dict]" = OrderedDict()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
 
+    def cached(self, key: str) -> Optional[dict]:
+        result = self._responses.get(key)
+        if result is not None:
+            self._responses.move_to_end(key)
+        return result
 
-def _post(config: Config, payload: dict) -> dict:
-    with httpx.Client(timeout=20) as client:
-        resp = client.post(config.gs_webapp_url, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    def remember(self, key: str, result: dict) -> None:
+        self._responses[key] = result
+        self._responses.move_to_end(key)
+        while len(self._responses) > RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
 
 
-def append_record(config: Config, record: Record) -> None:
+class SheetsWarmer:
+    def __init__(self, client: SheetsClient, interval: float = 240.0) -> None:
+        self.client = client
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await ping(self.client)
+            except Exception as exc:
+                logger.info("Apps Script warm-up ping failed: %r", exc)
+            await asyncio.sleep(self.interval)
+
+
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUSES
+    # A quota error comes back as an HTML page with status 200, which fails to decode as JSON.
+    return isinstance(exc, (httpx.TransportError, ValueError))
+
+
+async def _send(client: SheetsClient, action: str, payload: dict) -> dict:
+    timeout = ACTION_TIMEOUTS.get(action, DEFAULT_TIMEOUT)
+    # httpx times each read and write separately; wait_for bounds the whole call, redirect included.
+    try:
+        resp = await asyncio.wait_for(client.http.post(client.config.gs_webapp_url, json=payload, timeout=timeout), timeout)
+    except asyncio.TimeoutError as exc:
+        raise httpx.TimeoutException(f"{action} took longer than {timeout:g}s") from exc
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _hedged(client: SheetsClient, action: str, payload: dict) -> dict:
+    tasks = {asyncio.create_task(_send(client, action, payload))}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=client.config.sheets_hedge_delay)
+        if not done:
+            SHEETS_HEDGES.labels(action).inc()
+            tasks.add(asyncio.create_task(_send(client, action, payload)))
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                task.exception()
+            else:
+                task.cancel()
+
+
+async def _send_with_retries(client: SheetsClient, action: str, payload: dict) -> dict:
+    attempts = 1 + (max(client.config.sheets_retries, 0) if action in IDEMPOTENT_ACTIONS else 0)
+    hedge = client.config.sheets_hedge_delay > 0 and action in READ_ACTIONS
+    for attempt in range(attempts):
+        try:
+            if hedge:
+                return await _hedged(client, action, payload)
+            return await _send(client, action, payload)
+        except Exception as exc:
+            if attempt + 1 >= attempts or not _retryable(exc):
+                raise
+            SHEETS_RETRIES.labels(action).inc()
+            await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+    raise AssertionError("unreachable")
+
+
+async def _post(client: SheetsClient, payload: dict) -> dict:
+    action = str(payload.get("action"))
+    key = json.dumps(payload, sort_keys=True) if action in CACHED_ACTIONS else None
+    if not client.breaker.allow():
+        SHEETS_ERRORS.labels(action).inc()
+        cached = client.cached(key) if key else None
+        if cached is not None:
+            SHEETS_STALE.labels(action).inc()
+            return cached
+        raise SheetsUnavailable(f"Apps Script is failing; {action} not sent")
+    SHEETS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        result = await _send_with_retries(client, action, payload)
+    except asyncio.CancelledError:
+        client.breaker.abandon()
+        raise
+    except Exception:
+        SHEETS_ERRORS.labels(action).inc()
+        client.breaker.failure()
+        cached = client.cached(key) if key else None
+        if cached is None:
+            raise
+        SHEETS_STALE.labels(action).inc()
+        logger.warning("%s failed; serving the last cached response", action)
+        return cached
+    finally:
+        SHEETS_IN_FLIGHT.dec()
+        SHEETS_SECONDS.labels(action).observe(time.perf_counter() - start)
+    client.breaker.success()
+    if not result.get("ok", True):
+        SHEETS_ERRORS.labels(action).inc()
+    elif key:
+        client.remember(key, result)
+    return result
+
+
+async def ping(client: SheetsClient) -> None:
+    result = await _post(client, {"action": "ping"})
+    if not result.get("ok"):
+        raise RuntimeError(f"ping failed: {result.get('error')}")
+
+
+async def append_records(client: SheetsClient, records: List[Tuple[str, Record]]) -> AppendResult:
     payload = {
-        "action": "append_record",
+        "action": "append_records",
         "data": {
-            "timestamp": record.timestamp,
-            "submitter_user_id": record.submitter_user_id,
-            "submitter_username": record.submitter_username,
-            "segment": record.segment,
-            "jenis_order": record.jenis_order,
-            "bobot": record.bobot,
-            "service_number": record.service_number,
-            "wo_number": record.wo_number,
-            "ticket_id": record.ticket_id,
-            "tanggal_open": record.tanggal_open,
-            "tanggal_close": record.tanggal_close,
-            "teknisi_1": record.teknisi_1,
-            "teknisi_2": record.teknisi_2,
-            "workzone": record.workzone,
-            "keterangan": record.keterangan,
+            "records": [{"record_id": record_id, **asdict(record)} for record_id, record in records],
         },
     }
-    _post(config, payload)
+    result = await _post(client, payload)
+    if not result.get("ok"):
+        # Apps Script answered but refused the whole batch, unlike a timeout or an outage.
+        raise AppendFailed(f"append_records failed: {result.get('error')}")
+    data = result.get("data") or {}
+    rejected = {str(item.get("record_id") or ""): str(item.get("error") or "") for item in data.get("rejected") or []}
+    return AppendResult(int(data.get("written", 0)), rejected)
 
 
-def set_user_mapping(config: Config, user_id: str, username: str, teknisi_name: str) -> None:
+async def set_user_mapping(client: SheetsClient, user_id: str, username: str, teknisi_name: str) -> None:
     payload = {
         "action": "set_user_mapping",
         "data": {
@@ -69,18 +334,57 @@ def set_user_mapping(config: Config, user_id: str, username: str, teknisi_name:
             "updated_at": datetime.utcnow().isoformat(),
         },
     }
-    _post(config, payload)
+    await _post(client, payload)
 
 
-def get_user_mapping(config: Config, user_id: str) -> Optional[str]:
+async def get_user_mapping(client: SheetsClient, user_id: str) -> Optional[str]:
     payload = {"action": "get_user_mapping", "data": {"user_id": user_id}}
-    result = _post(config, payload)
+    result = await _post(client, payload)
     if result.get("ok") and result.get("data"):
         return result["data"].get("teknisi_name") or None
     return None
 
 
-def get_all_records(config: Config) -> List[dict]:
-    payload = {"action": "get_all_records"}
-    result = _post(config, payload)
-    return result.get("data", [])
+async def get_all_user_mappings(client: SheetsClient) -> Dict[str, str]:
+    payload = {"action": "get_all_user_mappings"}
+    result = await _post(client, payload)
+    if not result.get("ok"):
+        raise RuntimeError(f"get_all_user_mappings failed: {result.get('error')}")
+    return {
+        str(item["user_id"]): item["teknisi_name"]
+        for item in result.get("data") or []
+        if item.get("user_id") and item.get("teknisi_name")
+    }
+
+
+def _decode_page(data: dict) -> RecordPage:
+    if data.get("encoding") == "gzip+base64":
+        data = json.loads(gzip.decompress(base64.b64decode(data["body"])))
+    headers = data["headers"]
+    first_row = int(data["first_row"])
+    rows = [(first_row + i, dict(zip(headers, values))) for i, values in enumerate(data["rows"])]
+    next_cursor = data.get("next_cursor")
+    return RecordPage(rows, None if next_cursor is None else int(next_cursor), int(data["last_row"]))
+
+
+async def get_records_page(client: SheetsClient, cursor: int, limit: int = RECORD_PAGE_SIZE, compress: bool = True) -> RecordPage:
+    payload = {"action": "get_all_records", "data": {"cursor": cursor, "limit": limit, "gzip": compress}}
+    result = await _post(client, payload)
+    if not result.get("ok"):
+        raise RuntimeError(f"get_all_records failed: {result.get('error')}")
+    data = result.get("data")
+    if not isinstance(data, dict):
+        raise RuntimeError("get_all_records returned the unpaginated format; redeploy Code.gs")
+    return _decode_page(data)
+
+
+async def get_stats(client: SheetsClient, tech_names: List[str], ranges: List[Tuple[int, int]]) -> List[Dict[str, Tuple[int, float]]]:
+    payload = {
+        "action": "get_stats",
+        "data": {"teknisi": list(tech_names), "ranges": [[start, end] for start, end in ranges]},
+    }
+    result = await _post(client, payload)
+    if not result.get("ok"):
+        raise RuntimeError(f"get_stats failed: {result.get('error')}")
+    totals = (result.get("data") or {}).get("totals") or []
+    return [{name: (int(count), float(points)) for name, (count, points) in range_totals.items()} for range_totals in totals]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from typing import Dict, Optional
+
+from . import data_loader, search
+from .data_loader import Catalog, load_catalog
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _code_fingerprint() -> str:
+    digest = hashlib.sha256()
+    for module in (data_loader, search):
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _csv_files(data_dir: str) -> Dict[str, str]:
+    return {
+        name: os.path.join(data_dir, name)
+        for name in sorted(os.listdir(data_dir))
+        if name.lower().endswith(".csv")
+    }
+
+
+def _file_manifest(data_dir: str) -> Dict[str, dict]:
+    manifest = {}
+    for name, path in _csv_files(data_dir).items():
+        st = os.stat(path)
+        manifest[name] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": _sha256(path)}
+    return manifest
+
+
+def _is_current(files: Dict[str, dict], data_dir: str) -> bool:
+    current = _csv_files(data_dir)
+    if set(current) != set(files):
+        return False
+    for name, path in current.items():
+        entry = files[name]
+        st = os.stat(path)
+        if st.st_size != entry["size"]:
+            return False
+        if st.st_mtime_ns != entry["mtime_ns"] and _sha256(path) != entry["sha256"]:
+            return False
+    return True
+
+
+def read_snapshot(path: str, data_dir: str) -> Optional[Catalog]:
+    try:
+        with open(path, "rb") as f:
+            blob = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Catalog snapshot %s is unreadable; rebuilding", path, exc_info=True)
+        return None
+    if (
+        not isinstance(blob, dict)
+        or blob.get("format") != SNAPSHOT_FORMAT
+        or blob.get("code") != _code_fingerprint()
+        or not _is_current(blob.get("files", {}), data_dir)
+    ):
+        return None
+    return blob["catalog"]
+
+
+def write_snapshot(path: str, data_dir: str, catalog: Catalog) -> None:
+    blob = {
+        "format": SNAPSHOT_FORMAT,
+        "code": _code_fingerprint(),
+        "files": _file_manifest(data_dir),
+        "catalog": catalog,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(blob, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_catalog_cached(data_dir: str, snapshot_path: str) -> Catalog:
+    catalog = read_snapshot(snapshot_path, data_dir)
+    if catalog is not None:
+        return catalog
+    logger.info("Catalog snapshot missing or stale; parsing CSV files in %s", data_dir)
+    catalog = load_catalog(data_dir)
+    try:
+        write_snapshot(snapshot_path, data_dir, catalog)
+    except OSError:
+        logger.warning("Could not write catalog snapshot to %s", snapshot_path, exc_info=True)
+    return catalog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile the data/ CSV files into a catalog snapshot.")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "data"))
+    parser.add_argument("--out", default=os.getenv("CATALOG_SNAPSHOT", "catalog.snapshot"))
+    args = parser.parse_args()
+    catalog = load_catalog(args.data_dir)
+    write_snapshot(args.out, args.data_dir, catalog)
+    print(
+        f"Wrote {args.out}: {sum(len(v) for v in catalog.orders.values())} jenis order, "
+        f"{len(catalog.techs)} teknisi, {os.path.getsize(args.out)} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
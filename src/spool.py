@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .db import connect
+from .sheets import AppendFailed, Record
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 300.0
+# Failed sends before a batch is split into single rows to find the one Apps Script refuses.
+MAX_ATTEMPTS = 5
+
+FlushListener = Callable[[List[Tuple[str, Record]]], Awaitable[None]]
+
+
+class RecordSpool:
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS spool_dead (
+                record_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL
+            );
+            """
+        )
+
+    def put(self, record: Record) -> str:
+        record_id = uuid.uuid4().hex
+        payload = json.dumps(asdict(record), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spool (record_id, payload, created_at) VALUES (?, ?, ?)",
+                (record_id, payload, time.time()),
+            )
+        return record_id
+
+    def put_many(self, records: List[Record]) -> List[str]:
+        now = time.time()
+        rows = [(uuid.uuid4().hex, json.dumps(asdict(record), ensure_ascii=False), now) for record in records]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT INTO spool (record_id, payload, created_at) VALUES (?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def peek(self, limit: int) -> List[Tuple[str, Record]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record_id, payload FROM spool ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(record_id, Record(**json.loads(payload))) for record_id, payload in rows]
+
+    def remove(self, record_ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE record_id = ?", [(i,) for i in record_ids])
+
+    def mark_attempt(self, record_ids: List[str]) -> Dict[str, int]:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE spool SET attempts = attempts + 1 WHERE record_id = ?", [(i,) for i in record_ids]
+            )
+            rows = self._conn.execute(
+                f"SELECT record_id, attempts FROM spool WHERE record_id IN ({', '.join('?' for _ in record_ids)})",
+                record_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def bury(self, errors: Dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for record_id, error in errors.items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO spool_dead (record_id, payload, attempts, error, created_at, failed_at) "
+                        "SELECT record_id, payload, attempts, ?, created_at, ? FROM spool WHERE record_id = ?",
+                        (error, now, record_id),
+                    )
+                    self._conn.execute("DELETE FROM spool WHERE record_id = ?", (record_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def dead(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool_dead").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindQueue:
+    def __init__(self, spool: RecordSpool, storage: StorageBackend, batch_size: int = 50, interval: float = 5.0) -> None:
+        self.spool = spool
+        self.storage = storage
+        self.batch_size = batch_size
+        self.interval = interval
+        self.listeners: List[FlushListener] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, record: Record) -> str:
+        record_id = await asyncio.to_thread(self.spool.put, record)
+        self._wake.set()
+        return record_id
+
+    async def submit_many(self, records: List[Record]) -> List[str]:
+        record_ids = await asyncio.to_thread(self.spool.put_many, records)
+        self._wake.set()
+        return record_ids
+
+    async def flush(self) -> int:
+        sent = 0
+        while True:
+            batch = await asyncio.to_thread(self.spool.peek, self.batch_size)
+            if not batch:
+                return sent
+            ids = [record_id for record_id, _ in batch]
+            try:
+                result = await self.storage.append_records(batch)
+            except AppendFailed:
+                attempts = await asyncio.to_thread(self.spool.mark_attempt, ids)
+                if len(batch) == 1 or max(attempts.values()) < MAX_ATTEMPTS:
+                    raise
+                sent += await self._isolate(batch, attempts)
+                continue
+            except Exception:
+                await asyncio.to_thread(self.spool.mark_attempt, ids)
+                raise
+            delivered = [(record_id, record) for record_id, record in batch if record_id not in result.rejected]
+            await self._settle(delivered, result.rejected)
+            sent += len(delivered)
+
+    async def _isolate(self, batch: List[Tuple[str, Record]], attempts: Dict[str, int]) -> int:
+        # Sent alone, a row that keeps failing while its neighbours go through is the bad one;
+        # when every row fails the problem is not the data, so nothing is set aside.
+        delivered: List[Tuple[str, Record]] = []
+        rejected: Dict[str, str] = {}
+        failing: Dict[str, str] = {}
+        try:
+            for record_id, record in batch:
+                try:
+                    result = await self.storage.append_records([(record_id, record)])
+                except AppendFailed as exc:
+                    failing[record_id] = str(exc)
+                    continue
+                rejected.update(result.rejected)
+                if record_id not in result.rejected:
+                    delivered.append((record_id, record))
+        finally:
+            if delivered:
+                rejected.update({i: error for i, error in failing.items() if attempts.get(i, 0) >= MAX_ATTEMPTS})
+            await self._settle(delivered, rejected)
+        left = len(batch) - len(delivered) - len(rejected)
+        if left:
+            raise AppendFailed(f"{left} record(s) still refused when sent one by one")
+        return len(delivered)
+
+    async def _settle(self, delivered: List[Tuple[str, Record]], rejected: Dict[str, str]) -> None:
+        if rejected:
+            await asyncio.to_thread(self.spool.bury, rejected)
+            logger.error("Moved %d refused record(s) to spool_dead: %s", len(rejected), rejected)
+        if not delivered:
+            return
+        await asyncio.to_thread(self.spool.remove, [record_id for record_id, _ in delivered])
+        for listener in self.listeners:
+            try:
+                await listener(delivered)
+            except Exception:
+                logger.exception("Flush listener failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.warning("Final flush failed; %d record(s) stay in spool", self.spool.pending())
+
+    async def _run(self) -> None:
+        delay = self.interval
+        while True:
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait((waiter,), timeout=delay)
+            finally:
+                waiter.cancel()
+            self._wake.clear()
+            try:
+                sent = await self.flush()
+            except Exception:
+                delay = min(delay * 2, MAX_BACKOFF)
+                logger.exception("Flushing record spool failed; retrying in %.1fs", delay)
+                continue
+            if sent:
+                logger.info("Flushed %d record(s) to storage", sent)
+            delay = self.interval
+
+
+class DirectWriter:
+    # STORAGE_BACKEND=sqlite: the store already is a local database, so a spool in front of it
+    # would only write every record twice. Same interface as WriteBehindQueue.
+    def __init__(self, storage: StorageBackend) -> None:
+        self.storage = storage
+        self.listeners: List[FlushListener] = []
+
+    async def submit(self, record: Record) -> str:
+        return (await self.submit_many([record]))[0]
+
+    async def submit_many(self, records: List[Record]) -> List[str]:
+        batch = [(uuid.uuid4().hex, record) for record in records]
+        await self.storage.append_records(batch)
+        for listener in self.listeners:
+            try:
+                await listener(batch)
+            except Exception:
+                logger.exception("Write listener failed")
+        return [record_id for record_id, _ in batch]
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
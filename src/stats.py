@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+from collections import defaultdict
+from datetime import date, datetime, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+DATE_FMT = "%d-%m-%Y %H:%M:%S"
+LEGACY_DATE_FMT = "%Y-%m-%d %H:%M:%S"
+
+# DATE_FMT, LEGACY_DATE_FMT, and the ISO-8601 UTC form Apps Script uses for cells Sheets coerced to Date.
+_DMY = re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4}) (\d{1,2}):(\d{1,2}):(\d{1,2})$")
+_YMD = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})[ T](\d{1,2}):(\d{1,2}):(\d{1,2})(?:\.\d+)?(Z)?$")
+
+Stats = Tuple[int, float, int, float]
+
+
+def parse_date(value: str) -> datetime | None:
+    text = value.strip()
+    for fmt in (DATE_FMT, LEGACY_DATE_FMT):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _parse_epoch(text: str, tz: tzinfo) -> Optional[int]:
+    match = _DMY.match(text)
+    if match:
+        day, month, year, hour, minute, second = map(int, match.groups())
+        zone = tz
+    else:
+        match = _YMD.match(text)
+        if not match:
+            return None
+        year, month, day, hour, minute, second = map(int, match.groups()[:6])
+        zone = timezone.utc if match.group(7) else tz
+    try:
+        return int(datetime(year, month, day, hour, minute, second, tzinfo=zone).timestamp())
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=131072)
+def _local_date(quarter_hour: int, tz: tzinfo) -> date:
+    return datetime.fromtimestamp(quarter_hour * 900, tz).date()
+
+
+def local_date(epoch: int, tz: tzinfo) -> date:
+    # Every UTC offset in use is a multiple of 15 minutes, so a quarter-hour bucket maps to one local day.
+    return _local_date(epoch // 900, tz)
+
+
+def to_epoch(value: str, tz: tzinfo) -> Optional[int]:
+    return _parse_epoch(value.strip(), tz)
+
+
+def record_epoch(record: Mapping, field: str, tz: tzinfo) -> Optional[int]:
+    stored = record.get(f"{field}_epoch")
+    if stored not in (None, ""):
+        try:
+            return int(float(stored))
+        except (TypeError, ValueError):
+            pass
+    return _parse_epoch(str(record.get(field) or "").strip(), tz)
+
+
+def compute_stats(records: List[dict], tech_name: str, now: datetime) -> Stats:
+    tz = now.tzinfo or timezone.utc
+    today = now.date()
+    month = now.month
+    year = now.year
+
+    today_count = 0
+    today_points = 0.0
+    month_count = 0
+    month_points = 0.0
+
+    for r in records:
+        tech1 = (r.get("teknisi_1") or "").strip()
+        tech2 = (r.get("teknisi_2") or "").strip()
+        if tech_name not in (tech1, tech2):
+            continue
+        epoch = record_epoch(r, "tanggal_close", tz)
+        if epoch is None:
+            continue
+        day = local_date(epoch, tz)
+        weight = float(r.get("bobot") or 0)
+        if day == today:
+            today_count += 1
+            today_points += weight
+        if day.year == year and day.month == month:
+            month_count += 1
+            month_points += weight
+
+    return today_count, today_points, month_count, month_points
+
+
+class StatsIndex:
+    def __init__(self, tz: tzinfo = timezone.utc) -> None:
+        self.tz = tz
+        self._daily: Dict[str, Dict[date, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        self._monthly: Dict[str, Dict[Tuple[int, int], List[float]]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        self.size = 0
+
+    @classmethod
+    def build(cls, records: Iterable[Mapping], tz: tzinfo = timezone.utc) -> "StatsIndex":
+        index = cls(tz)
+        for r in records:
+            index.add(r)
+        return index
+
+    def add(self, record: Mapping) -> None:
+        epoch = record_epoch(record, "tanggal_close", self.tz)
+        if epoch is None:
+            return
+        weight = float(record.get("bobot") or 0)
+        day = local_date(epoch, self.tz)
+        month = (day.year, day.month)
+        techs = {(record.get("teknisi_1") or "").strip(), (record.get("teknisi_2") or "").strip()}
+        techs.discard("")
+        for tech in techs:
+            daily = self._daily[tech][day]
+            daily[0] += 1
+            daily[1] += weight
+            monthly = self._monthly[tech][month]
+            monthly[0] += 1
+            monthly[1] += weight
+        self.size += 1
+
+    def stats(self, tech_name: str, now: datetime) -> Stats:
+        daily = self._daily.get(tech_name, {}).get(now.date(), (0, 0.0))
+        monthly = self._monthly.get(tech_name, {}).get((now.year, now.month), (0, 0.0))
+        return int(daily[0]), daily[1], int(monthly[0]), monthly[1]
+
+    def technicians(self) -> List[str]:
+        return sorted(self._daily)
+
+
+def check_consistency(index: StatsIndex, records: List[dict], now: datetime) -> List[Tuple[str, Stats, Stats]]:
+    by_tech: Dict[str, List[dict]] = defaultdict(list)
+    for r in records:
+        names = {(r.get("teknisi_1") or "").strip(), (r.get("teknisi_2") or "").strip()}
+        names.discard("")
+        for name in names:
+            by_tech[name].append(r)
+
+    mismatches = []
+    for tech in sorted(set(by_tech) | set(index.technicians())):
+        expected = compute_stats(by_tech.get(tech, []), tech, now)
+        actual = index.stats(tech, now)
+        if actual[0] != expected[0] or actual[2] != expected[2] or abs(actual[1] - expected[1]) > 1e-6 or abs(actual[3] - expected[3]) > 1e-6:
+            mismatches.append((tech, expected, actual))
+    return mismatches
+
+
+def server_mismatches(index: StatsIndex, totals: List[Dict[str, Tuple[int, float]]], now: datetime) -> List[Tuple[str, Stats, Stats]]:
+    today, month = totals
+    mismatches = []
+    for tech in sorted(set(index.technicians()) | set(today) | set(month)):
+        expected = (*today.get(tech, (0, 0.0)), *month.get(tech, (0, 0.0)))
+        actual = index.stats(tech, now)
+        if actual[0] != expected[0] or actual[2] != expected[2] or abs(actual[1] - expected[1]) > 1e-6 or abs(actual[3] - expected[3]) > 1e-6:
+            mismatches.append((tech, expected, actual))
+    return mismatches
+
+
+async def _check(resync: bool, server: bool) -> int:
+    from zoneinfo import ZoneInfo
+
+    from .analytics import period_bounds
+    from .config import load_config
+    from .replica import RecordReplica, ReplicaSyncer
+    from .sheets import SheetsClient
+    from .storage import open_storage
+
+    config = load_config()
+    replica = RecordReplica(config.db_path)
+    tz = ZoneInfo(config.tz)
+    now = datetime.now(tz)
+    totals = None
+    if resync or server:
+        sheets = SheetsClient(config)
+        storage = open_storage(config, sheets)
+        try:
+            if resync:
+                replica.reset()
+            await ReplicaSyncer(replica, storage).sync()
+            if server:
+                totals = await storage.get_stats([], [period_bounds(now, "hari"), period_bounds(now, "bulan")])
+        finally:
+            await storage.aclose()
+            await sheets.aclose()
+
+    records = replica.records()
+    index = StatsIndex.build(records, tz)
+    mismatches = check_consistency(index, records, now)
+    print(f"{len(records)} record(s), {len(index.technicians())} teknisi, {len(mismatches)} mismatch(es)")
+    for tech, expected, actual in mismatches:
+        print(f"  {tech}: expected {expected}, index {actual}")
+    if totals is not None:
+        server_diff = server_mismatches(index, totals, now)
+        print(f"get_stats: {len(server_diff)} mismatch(es) against the index")
+        for tech, expected, actual in server_diff:
+            print(f"  {tech}: server {expected}, index {actual}")
+        mismatches += server_diff
+    replica.close()
+    return 1 if mismatches else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the stats index from the local replica and compare it with compute_stats.")
+    parser.add_argument("--resync", action="store_true", help="drop the local replica and re-download it from the storage backend first")
+    parser.add_argument("--server", action="store_true", help="also compare against the totals the storage backend computes (get_stats)")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(_check(args.resync, args.server)))
+
+
+if __name__ == "__main__":
+    main()
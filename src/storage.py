@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, List, Optional, Protocol, Tuple
+from zoneinfo import ZoneInfo
+
+from .config import Config
+from .db import connect
+from .sheets import (
+    HEADER_ROW,
+    RECORD_FIELDS,
+    AppendResult,
+    Record,
+    RecordPage,
+    SheetsClient,
+    append_records,
+    get_all_user_mappings,
+    get_records_page,
+    get_stats,
+    get_user_mapping,
+    set_user_mapping,
+)
+from .stats import to_epoch
+
+StatsTotals = List[Dict[str, Tuple[int, float]]]
+
+STORAGE_BACKENDS = ("sheets", "sqlite")
+
+RECORD_COLUMN_TYPES = {"bobot": "REAL", "tanggal_open_epoch": "INTEGER", "tanggal_close_epoch": "INTEGER"}
+
+
+class StorageBackend(Protocol):
+    async def append_records(self, records: List[Tuple[str, Record]]) -> AppendResult: ...
+
+    async def get_records_page(self, cursor: int, limit: int) -> RecordPage: ...
+
+    async def get_stats(self, tech_names: List[str], ranges: List[Tuple[int, int]]) -> StatsTotals: ...
+
+    async def set_user_mapping(self, user_id: str, username: str, teknisi_name: str) -> None: ...
+
+    async def get_user_mapping(self, user_id: str) -> Optional[str]: ...
+
+    async def get_all_user_mappings(self) -> Dict[str, str]: ...
+
+    async def aclose(self) -> None: ...
+
+
+class SheetsBackend:
+    def __init__(self, client: SheetsClient) -> None:
+        self.client = client
+
+    async def append_records(self, records: List[Tuple[str, Record]]) -> AppendResult:
+        return await append_records(self.client, records)
+
+    async def get_records_page(self, cursor: int, limit: int) -> RecordPage:
+        return await get_records_page(self.client, cursor, limit)
+
+    async def get_stats(self, tech_names: List[str], ranges: List[Tuple[int, int]]) -> StatsTotals:
+        return await get_stats(self.client, tech_names, ranges)
+
+    async def set_user_mapping(self, user_id: str, username: str, teknisi_name: str) -> None:
+        await set_user_mapping(self.client, user_id, username, teknisi_name)
+
+    async def get_user_mapping(self, user_id: str) -> Optional[str]:
+        return await get_user_mapping(self.client, user_id)
+
+    async def get_all_user_mappings(self) -> Dict[str, str]:
+        return await get_all_user_mappings(self.client)
+
+    async def aclose(self) -> None:
+        # The SheetsClient is shared with the rest of the bot and closed by its owner.
+        pass
+
+
+class SQLiteBackend:
+    def __init__(self, path: str, tz: tzinfo = timezone.utc) -> None:
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        columns = ", ".join(f"{name} {RECORD_COLUMN_TYPES.get(name, 'TEXT')}" for name in RECORD_FIELDS)
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS store_records (row INTEGER PRIMARY KEY, record_id TEXT NOT NULL UNIQUE, {columns});
+            CREATE INDEX IF NOT EXISTS idx_store_teknisi_1 ON store_records (teknisi_1, tanggal_close_epoch);
+            CREATE INDEX IF NOT EXISTS idx_store_teknisi_2 ON store_records (teknisi_2, tanggal_close_epoch);
+            CREATE INDEX IF NOT EXISTS idx_store_tanggal_close ON store_records (tanggal_close_epoch);
+            CREATE INDEX IF NOT EXISTS idx_store_ticket_id ON store_records (ticket_id);
+            CREATE TABLE IF NOT EXISTS store_user_mappings (
+                user_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                teknisi_name TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                exported INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._insert_sql = (
+            f"INSERT OR IGNORE INTO store_records (row, record_id, {', '.join(RECORD_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in RECORD_FIELDS)})"
+        )
+        self._select_sql = f"SELECT row, record_id, {', '.join(RECORD_FIELDS)} FROM store_records"
+
+    async def append_records(self, records: List[Tuple[str, Record]]) -> AppendResult:
+        return AppendResult(await asyncio.to_thread(self.insert, records), {})
+
+    async def get_records_page(self, cursor: int, limit: int) -> RecordPage:
+        return await asyncio.to_thread(self.page, cursor, limit)
+
+    async def get_stats(self, tech_names: List[str], ranges: List[Tuple[int, int]]) -> StatsTotals:
+        return await asyncio.to_thread(self.stats, tech_names, ranges)
+
+    async def set_user_mapping(self, user_id: str, username: str, teknisi_name: str) -> None:
+        await asyncio.to_thread(self.put_mapping, user_id, username, teknisi_name, datetime.utcnow().isoformat())
+
+    async def get_user_mapping(self, user_id: str) -> Optional[str]:
+        row = await asyncio.to_thread(
+            self._select, "SELECT teknisi_name FROM store_user_mappings WHERE user_id = ?", (user_id,)
+        )
+        return row[0][0] if row else None
+
+    async def get_all_user_mappings(self) -> Dict[str, str]:
+        rows = await asyncio.to_thread(self._select, "SELECT user_id, teknisi_name FROM store_user_mappings")
+        return dict(rows)
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def _select(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _values(self, record: Record) -> list:
+        values = []
+        for name in RECORD_FIELDS:
+            value = getattr(record, name)
+            if name.endswith("_epoch") and value is None:
+                value = to_epoch(getattr(record, name[: -len("_epoch")]) or "", self.tz)
+            values.append(value)
+        return values
+
+    def insert(self, records: List[Tuple[str, Record]]) -> int:
+        written = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute("SELECT COALESCE(MAX(row), ?) FROM store_records", (HEADER_ROW,)).fetchone()[0]
+                for record_id, record in records:
+                    cur = self._conn.execute(self._insert_sql, (row + 1, record_id, *self._values(record)))
+                    if cur.rowcount:
+                        row += 1
+                        written += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return written
+
+    def last_row(self) -> int:
+        return int(self._select("SELECT COALESCE(MAX(row), ?) FROM store_records", (HEADER_ROW,))[0][0])
+
+    def page(self, cursor: int, limit: int) -> RecordPage:
+        rows = self._select(self._select_sql + " WHERE row > ? ORDER BY row LIMIT ?", (cursor, limit))
+        last_row = self.last_row()
+        page_rows = [(row[0], dict(zip(RECORD_FIELDS, row[2:]))) for row in rows]
+        end = page_rows[-1][0] if page_rows else cursor
+        return RecordPage(page_rows, end if end < last_row else None, last_row)
+
+    def records(self) -> List[dict]:
+        return [dict(zip(RECORD_FIELDS, row[2:])) for row in self._select(self._select_sql + " ORDER BY row")]
+
+    def stats(self, tech_names: List[str], ranges: List[Tuple[int, int]]) -> StatsTotals:
+        names = [name.strip() for name in tech_names if name.strip()]
+        where_1 = f" AND teknisi_1 IN ({', '.join('?' for _ in names)})" if names else ""
+        where_2 = f" AND teknisi_2 IN ({', '.join('?' for _ in names)})" if names else ""
+        sql = (
+            "SELECT name, COUNT(*), SUM(bobot) FROM ("
+            " SELECT teknisi_1 AS name, bobot FROM store_records"
+            f"  WHERE tanggal_close_epoch >= ? AND tanggal_close_epoch < ? AND teknisi_1 != ''{where_1}"
+            " UNION ALL"
+            " SELECT teknisi_2 AS name, bobot FROM store_records"
+            f"  WHERE tanggal_close_epoch >= ? AND tanggal_close_epoch < ? AND teknisi_2 != '' AND teknisi_2 != teknisi_1{where_2}"
+            ") GROUP BY name"
+        )
+        totals: StatsTotals = []
+        with self._lock:
+            for start, end in ranges:
+                rows = self._conn.execute(sql, (start, end, *names, start, end, *names)).fetchall()
+                totals.append({name: (int(count), float(points or 0)) for name, count, points in rows})
+        return totals
+
+    def put_mapping(self, user_id: str, username: str, teknisi_name: str, updated_at: str, exported: bool = False) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO store_user_mappings (user_id, username, teknisi_name, updated_at, exported) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, teknisi_name = excluded.teknisi_name, "
+                "updated_at = excluded.updated_at, exported = excluded.exported",
+                (user_id, username, teknisi_name, updated_at, int(exported)),
+            )
+
+    def exported_row(self) -> int:
+        rows = self._select("SELECT value FROM store_meta WHERE key = 'exported_row'")
+        return int(rows[0][0]) if rows else HEADER_ROW
+
+    def set_exported_row(self, row: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('exported_row', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(row),),
+            )
+
+    def unexported_records(self, limit: int) -> List[Tuple[int, str, Record]]:
+        rows = self._select(self._select_sql + " WHERE row > ? ORDER BY row LIMIT ?", (self.exported_row(), limit))
+        return [(row[0], row[1], _record(row[2:])) for row in rows]
+
+    def unexported_mappings(self) -> List[Tuple[str, str, str, str]]:
+        return self._select(
+            "SELECT user_id, username, teknisi_name, updated_at FROM store_user_mappings WHERE exported = 0"
+        )
+
+    def mark_mapping_exported(self, user_id: str, updated_at: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE store_user_mappings SET exported = 1 WHERE user_id = ? AND updated_at = ?", (user_id, updated_at)
+            )
+
+    def pending_export(self) -> int:
+        rows = self._select("SELECT COUNT(*) FROM store_records WHERE row > ?", (self.exported_row(),))
+        return int(rows[0][0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _record(values: tuple) -> Record:
+    data = dict(zip(RECORD_FIELDS, values))
+    for name, value in data.items():
+        if value is None and not name.endswith("_epoch"):
+            data[name] = 0.0 if name == "bobot" else ""
+    return Record(**data)
+
+
+def open_storage(config: Config, client: SheetsClient) -> StorageBackend:
+    if config.storage_backend == "sqlite":
+        return SQLiteBackend(config.db_path, ZoneInfo(config.tz))
+    return SheetsBackend(client)
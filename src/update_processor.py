@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Dict, List, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .metrics import UPDATES_IN_FLIGHT, UPDATES_RUNNING
+
+# PTB takes its own semaphore before do_process_update is called. It is sized to the backlog
+# rather than the concurrency limit, so updates that are only waiting for their user's turn
+# do not hold a slot that another user could run in.
+MAX_PENDING_UPDATES = 4096
+
+
+def update_keys(update: object) -> Tuple[str, ...]:
+    if not isinstance(update, Update):
+        return ()
+    keys = set()
+    if update.effective_chat is not None:
+        keys.add(f"chat:{update.effective_chat.id}")
+    if update.effective_user is not None:
+        keys.add(f"user:{update.effective_user.id}")
+    return tuple(sorted(keys))
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, max_pending: int = MAX_PENDING_UPDATES) -> None:
+        super().__init__(max(max_pending, max_concurrent_updates))
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    @property
+    def active_keys(self) -> int:
+        return len(self._locks)
+
+    def _checkout(self, key: str) -> asyncio.Lock:
+        lock, refs = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, refs + 1)
+        return lock
+
+    def _checkin(self, key: str) -> None:
+        lock, refs = self._locks[key]
+        if refs <= 1:
+            del self._locks[key]
+        else:
+            self._locks[key] = (lock, refs - 1)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        keys = update_keys(update)
+        locks: List[asyncio.Lock] = [self._checkout(key) for key in keys]
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            async with AsyncExitStack() as stack:
+                # Locks are taken in sorted key order, so two updates sharing a chat and a user
+                # cannot deadlock, and asyncio.Lock hands them out first come, first served.
+                for lock in locks:
+                    await stack.enter_async_context(lock)
+                async with self._slots:
+                    UPDATES_RUNNING.inc()
+                    try:
+                        await coroutine
+                    finally:
+                        UPDATES_RUNNING.dec()
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+            for key in keys:
+                self._checkin(key)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
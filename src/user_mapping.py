@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class UserMappingCache:
+    def __init__(self, storage: StorageBackend, ttl: float = 600.0) -> None:
+        self.storage = storage
+        self.ttl = ttl
+        self._names: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        # One dict per refresh in flight, collecting names learned after its fetch started.
+        self._since_fetch: List[Dict[str, str]] = []
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    async def refresh(self) -> int:
+        learned: Dict[str, str] = {}
+        self._since_fetch.append(learned)
+        try:
+            names = await self.storage.get_all_user_mappings()
+        finally:
+            self._since_fetch.remove(learned)
+        # A /setme that lands while the fetch is in flight is newer than the snapshot.
+        names.update(learned)
+        self._names = names
+        self._loaded_at = time.monotonic()
+        return len(self._names)
+
+    def _remember(self, user_id: str, name: str) -> None:
+        self._names[user_id] = name
+        for learned in self._since_fetch:
+            learned[user_id] = name
+
+    async def get(self, user_id: str) -> Optional[str]:
+        if self.is_stale():
+            self._refresh_in_background()
+        name = self._names.get(user_id)
+        if name is not None:
+            return name
+        name = await self.storage.get_user_mapping(user_id)
+        if name:
+            self._remember(user_id, name)
+        return name
+
+    async def set(self, user_id: str, username: str, teknisi_name: str) -> None:
+        await self.storage.set_user_mapping(user_id, username, teknisi_name)
+        self._remember(user_id, teknisi_name)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._refreshing):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._refreshing = None
+
+    def _refresh_in_background(self) -> None:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._safe_refresh())
+
+    async def _safe_refresh(self) -> None:
+        try:
+            count = await self.refresh()
+            logger.info("Loaded %d user mapping(s)", count)
+        except Exception:
+            logger.exception("Refreshing user mappings failed")
+
+    async def _run(self) -> None:
+        while True:
+            await self._safe_refresh()
+            await asyncio.sleep(self.ttl)
@@ -0,0 +1,262 @@
+"""Microbenchmarks for the catalog, search, date, stats and keyboard hot paths.
+
+    python -m tools.bench [--sizes 10000,100000,1000000] [--only stats.]
+    python -m tools.bench --save tools/bench_baseline.json
+    python -m tools.bench --compare tools/bench_baseline.json [--threshold 1.5]
+
+Runs fully offline: catalog benchmarks read the real data/*.csv plus a synthetic catalog
+written to a temporary directory, record benchmarks use synthetic Records-sheet histories
+(see tools.bench_analytics.synthetic_records). Each result is the best time per operation
+over several samples. --compare exits with status 1 when a benchmark is slower than
+baseline * threshold; regenerate the baseline with --save on the reference machine.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from src.analytics import RecordColumns, period_bounds
+from src.bot import _order_page_keyboard, _tech_keyboard, PAGE_SIZE
+from src.data_loader import build_catalog, load_catalog, load_orders
+from src.dedup import DuplicateIndex
+from src.stats import DATE_FMT, LEGACY_DATE_FMT, StatsIndex, _parse_epoch, compute_stats, parse_date, to_epoch
+
+from .bench_analytics import synthetic_records
+from .bench_search import make_queries
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+ORDER_HEADER = [
+    "jenis order", "bobot", "SERVICE_NUMBER", "WONUM", "TICKET_ID", "teknisi",
+    "JENIS_ORDER", "CREATED/REPORTED_DATE", "CLOSED_DATE", "WORKZONE",
+]
+SCHEMA_VALUES = ("required", "unrequired", "unavailable")
+MAX_QUERIES = 2000
+
+
+@dataclass(frozen=True)
+class Result:
+    name: str
+    seconds: float
+    ops: int
+
+
+def write_synthetic_catalog(directory: str, vocabulary: List[str], segments: int, items: int, techs: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    for s in range(segments):
+        with open(os.path.join(directory, f"Segment {s:02d}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(ORDER_HEADER)
+            for i in range(items // segments):
+                name = " ".join(rng.sample(vocabulary, rng.randint(2, 4))) + f" {i}"
+                weight = rng.choice(("0,67", "1", "2", "4", "5,3", "6.4"))
+                writer.writerow([name, weight, *(rng.choice(SCHEMA_VALUES) for _ in ORDER_HEADER[2:])])
+    with open(os.path.join(directory, "teknisi, labor dan unit.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["NAMA", "LABOR", "UNIT"])
+        for i in range(techs):
+            writer.writerow([f"TEKNISI {i:05d}", f"{90000000 + i}", f"UNIT {i % 12:02d}"])
+
+
+def synthetic_dates(count: int, now: datetime, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    dates = []
+    for i in range(count):
+        moment = now - timedelta(seconds=rng.randrange(365 * 86400))
+        dates.append(moment.strftime(LEGACY_DATE_FMT if i % 4 == 0 else DATE_FMT))
+    return dates
+
+
+def measure(name: str, fn: Callable[[], object], ops: int = 1, min_time: float = 0.2, repeat: int = 5) -> Result:
+    start = time.perf_counter()
+    fn()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / max(once, 1e-9)))
+    best = once
+    for _ in range(repeat if once < 1.0 else 2):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return Result(name, best / ops, ops)
+
+
+def _each(fn: Callable, args: List) -> Callable[[], None]:
+    def run() -> None:
+        for arg in args:
+            fn(arg)
+
+    return run
+
+
+def catalog_benchmarks(data_dir: str, synthetic_dir: str) -> List[tuple]:
+    orders = load_orders(data_dir)
+    catalog = load_catalog(data_dir)
+    synthetic = load_orders(synthetic_dir)
+    rng = random.Random(7)
+    benches = [
+        ("catalog.load_orders[real]", lambda: load_orders(data_dir), 1),
+        ("catalog.load_catalog[real]", lambda: load_catalog(data_dir), 1),
+        ("catalog.build_catalog[real]", lambda: build_catalog(orders, catalog.techs), 1),
+        ("catalog.load_orders[synthetic]", lambda: load_orders(synthetic_dir), 1),
+    ]
+    for label, source in (("real", catalog), ("synthetic", load_catalog(synthetic_dir))):
+        queries = [(segment, q) for segment in source.segments for q in make_queries(source.orders[segment], rng)]
+        queries = rng.sample(queries, min(len(queries), MAX_QUERIES))
+        index = source.search
+
+        def search(queries=queries, index=index) -> None:
+            for segment, q in queries:
+                index[segment].search(q, limit=PAGE_SIZE)
+
+        benches.append((f"search.order_query[{label}]", search, len(queries)))
+
+    largest = max(list(orders.values()) + list(synthetic.values()), key=len)
+    pages = list(range((len(largest) + PAGE_SIZE - 1) // PAGE_SIZE))
+    benches.append((
+        "keyboard._order_page_keyboard",
+        _each(lambda page: _order_page_keyboard(largest[0].segment, largest, page), pages),
+        len(pages),
+    ))
+    techs = catalog.techs
+    tech_pages = list(range((len(techs) + PAGE_SIZE - 1) // PAGE_SIZE))
+    benches.append(("keyboard._tech_keyboard", _each(lambda page: _tech_keyboard(techs, page, "k"), tech_pages), len(tech_pages)))
+    return benches
+
+
+def date_benchmarks(now: datetime) -> List[tuple]:
+    dates = synthetic_dates(10_000, now)
+    tz = now.tzinfo
+
+    def cold() -> None:
+        _parse_epoch.cache_clear()
+        for text in dates:
+            to_epoch(text, tz)
+
+    return [
+        ("dates.parse_date", _each(parse_date, dates), len(dates)),
+        ("dates.to_epoch[cold]", cold, len(dates)),
+        ("dates.to_epoch[warm]", _each(lambda text: to_epoch(text, tz), dates), len(dates)),
+    ]
+
+
+def record_benchmarks(size: int, tech_names: List[str], segments: List[str], now: datetime) -> List[tuple]:
+    tz = now.tzinfo
+    records = synthetic_records(size, tech_names, segments, now)
+    index = StatsIndex.build(records, tz)
+    columns = RecordColumns.build(records, tz)
+    month = period_bounds(now, "bulan")
+    tech = tech_names[0]
+    duplicates = DuplicateIndex.build(records)
+    probes = records[:: max(1, size // 1000)]
+    return [
+        (f"stats.compute_stats[{size}]", lambda: compute_stats(records, tech, now), 1),
+        (f"stats.StatsIndex.build[{size}]", lambda: StatsIndex.build(records, tz), 1),
+        (f"stats.StatsIndex.stats[{size}]", _each(lambda name: index.stats(name, now), tech_names), len(tech_names)),
+        (f"analytics.RecordColumns.build[{size}]", lambda: RecordColumns.build(records, tz), 1),
+        (f"analytics.leaderboard[{size}]", lambda: columns.leaderboard(*month, limit=None), 1),
+        (f"dedup.DuplicateIndex.build[{size}]", lambda: DuplicateIndex.build(records), 1),
+        (f"dedup.DuplicateIndex.seen[{size}]", _each(duplicates.seen, probes), len(probes)),
+    ]
+
+
+def _format(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:8.2f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.2f} ms"
+    return f"{seconds * 1e6:8.2f} us"
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'benchmark':<42} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<42} {'-':>11} {_format(seconds):>11} {'new':>7}")
+            continue
+        ratio = seconds / base
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(f"{name:<42} {_format(base):>11} {_format(seconds):>11} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--tz", default="Asia/Jakarta")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Records history sizes")
+    parser.add_argument("--catalog-items", type=int, default=20_000, help="order types in the synthetic catalog")
+    parser.add_argument("--only", default="", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline file")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a baseline file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="ratio above which a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    tz = ZoneInfo(args.tz)
+    # Fixed clock so every run (and the baseline) sees the same synthetic history.
+    now = datetime(2025, 6, 15, 12, 0, 0, tzinfo=tz)
+    catalog = load_catalog(args.data_dir)
+    tech_names = sorted({t.name for t in catalog.techs})
+    vocabulary = sorted({word for items in catalog.orders.values() for item in items for word in item.name.split()})
+
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        write_synthetic_catalog(synthetic_dir, vocabulary, 6, args.catalog_items, 2000)
+        groups: List[Callable[[], List[tuple]]] = [
+            lambda: catalog_benchmarks(args.data_dir, synthetic_dir),
+            lambda: date_benchmarks(now),
+        ]
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            groups.append(lambda size=size: record_benchmarks(size, tech_names, catalog.segments, now))
+        for group in groups:
+            for name, fn, ops in group():
+                if args.only not in name:
+                    continue
+                result = measure(name, fn, ops)
+                results[name] = result.seconds
+                per = f"/op ({ops} ops)" if ops > 1 else ""
+                print(f"{name:<42} {_format(result.seconds)}{per}", flush=True)
+
+    if args.save:
+        baseline = {
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created": datetime.now().isoformat(timespec="seconds"),
+            },
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"saved {len(results)} result(s) to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline_results: Optional[Dict[str, float]] = json.load(f).get("results")
+        regressions = compare(results, baseline_results or {}, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark the columnar analytics on synthetic records.
+
+    python -m tools.bench_analytics [--rows 1000000] [--data-dir data]
+
+Technician names and units come from the real technician CSV; dates spread over the last
+year, and a quarter of the rows only carry the legacy date string (no epoch).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from src.analytics import RecordColumns, period_bounds
+from src.data_loader import load_catalog
+from src.stats import DATE_FMT, LEGACY_DATE_FMT
+
+
+def synthetic_records(rows: int, tech_names: List[str], segments: List[str], now: datetime, seed: int = 7) -> List[dict]:
+    rng = random.Random(seed)
+    workzones = [f"WZ{i:02d}" for i in range(40)]
+    records = []
+    for i in range(rows):
+        closed = now - timedelta(seconds=rng.randrange(365 * 86400))
+        tech_1 = rng.choice(tech_names)
+        tech_2 = rng.choice(tech_names) if rng.random() < 0.3 else ""
+        record = {
+            "teknisi_1": tech_1,
+            "teknisi_2": tech_2,
+            "bobot": rng.choice((0.67, 1, 2, 4, 5.3, 6.4)),
+            "segment": rng.choice(segments),
+            "workzone": rng.choice(workzones),
+            "ticket_id": f"INC{i:08d}",
+            "wo_number": f"SC{i:08d}" if i % 3 else "",
+        }
+        if i % 4:
+            record["tanggal_close"] = closed.strftime(DATE_FMT)
+            record["tanggal_close_epoch"] = int(closed.timestamp())
+        else:
+            record["tanggal_close"] = closed.strftime(LEGACY_DATE_FMT)
+        records.append(record)
+    return records
+
+
+def _loop_leaderboard(records: List[dict], columns: RecordColumns, start: int, end: int) -> Dict[str, Tuple[int, float]]:
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    for record in records:
+        epoch = record.get("tanggal_close_epoch")
+        if epoch is None:
+            epoch = int(datetime.strptime(record["tanggal_close"], LEGACY_DATE_FMT).replace(tzinfo=columns.tz).timestamp())
+        if not start <= epoch < end:
+            continue
+        for name in {record["teknisi_1"], record["teknisi_2"]} - {""}:
+            totals[name][0] += 1
+            totals[name][1] += record["bobot"]
+    return {name: (int(c), p) for name, (c, p) in totals.items()}
+
+
+def _timed(label: str, fn, repeat: int = 5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<28} {best * 1e3:9.2f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--tz", default="Asia/Jakarta")
+    args = parser.parse_args()
+
+    tz = ZoneInfo(args.tz)
+    now = datetime.now(tz)
+    catalog = load_catalog(args.data_dir)
+    tech_units = {t.name: t.unit for t in catalog.techs}
+    records = synthetic_records(args.rows, sorted(tech_units), catalog.segments, now)
+
+    start = time.perf_counter()
+    columns = RecordColumns.build(records, tz)
+    print(f"built {columns.size} rows in {time.perf_counter() - start:.2f} s")
+
+    month = period_bounds(now, "bulan")
+    every = period_bounds(now, "semua")
+    board = _timed("leaderboard (bulan)", lambda: columns.leaderboard(*month, limit=None))
+    _timed("leaderboard (semua)", lambda: columns.leaderboard(*every, limit=None))
+    _timed("by_unit (bulan)", lambda: columns.by_unit(*month, tech_units))
+    _timed("by_segment (bulan)", lambda: columns.by_segment(*month))
+    _timed("by_workzone (bulan)", lambda: columns.by_workzone(*month))
+    expected = _timed("python loop leaderboard", lambda: _loop_leaderboard(records, columns, *month), repeat=1)
+
+    actual = {t.name: (t.count, t.points) for t in board}
+    mismatched = [
+        name for name in set(actual) | set(expected)
+        if actual.get(name, (0, 0.0))[0] != expected.get(name, (0, 0.0))[0]
+        or abs(actual.get(name, (0, 0.0))[1] - expected.get(name, (0, 0.0))[1]) > 1e-6
+    ]
+    print(f"leaderboard matches python loop: {not mismatched} ({len(actual)} teknisi)")
+
+
+if __name__ == "__main__":
+    main()
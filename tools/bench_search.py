@@ -0,0 +1,96 @@
+"""Benchmark order-type search over the real data/*.csv catalogs.
+
+    python -m tools.bench_search [--data-dir data] [--rounds 200]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from src.data_loader import OrderItem, build_catalog, load_orders
+from src.search import OrderSearchIndex
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def make_queries(items: List[OrderItem], rng: random.Random) -> List[str]:
+    queries: List[str] = []
+    for item in items:
+        words = item.name.split()
+        queries.append(item.name)
+        queries.append(item.name[: max(3, len(item.name) // 2)])
+        queries.append(rng.choice(words))
+        queries.append(" ".join(_typo(w, rng) for w in words))
+    return queries
+
+
+def _linear(items: List[OrderItem]) -> Callable[[str], list]:
+    def search(query: str) -> list:
+        text = query.strip().lower()
+        return [item for item in items if text in item.name.lower()]
+
+    return search
+
+
+def _indexed(index: OrderSearchIndex, limit: int) -> Callable[[str], list]:
+    def search(query: str) -> list:
+        return index.search(query, limit=limit)[0]
+
+    return search
+
+
+def _time(fn: Callable[[str], list], queries: List[str], rounds: int) -> Dict[str, float]:
+    samples = []
+    hits = 0
+    for _ in range(rounds):
+        for q in queries:
+            start = time.perf_counter()
+            found = fn(q)
+            samples.append(time.perf_counter() - start)
+            hits += bool(found)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+        "hit_rate": hits / len(samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    orders = load_orders(args.data_dir)
+    start = time.perf_counter()
+    indexes = build_catalog(orders, []).search
+    build_ms = (time.perf_counter() - start) * 1e3
+    print(f"built {len(indexes)} index(es) in {build_ms:.2f} ms")
+
+    for segment in sorted(orders):
+        items = orders[segment]
+        queries = make_queries(items, rng)
+        linear = _time(_linear(items), queries, args.rounds)
+        indexed = _time(_indexed(indexes[segment], args.limit), queries, args.rounds)
+        print(f"{segment} ({len(items)} items, {len(queries)} queries)")
+        for label, result in (("linear", linear), ("index", indexed)):
+            print(
+                f"  {label:<6} mean {result['mean_us']:7.1f} us  p50 {result['p50_us']:7.1f} us"
+                f"  p99 {result['p99_us']:7.1f} us  hit rate {result['hit_rate']:.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
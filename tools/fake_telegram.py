@@ -0,0 +1,158 @@
+"""Offline stand-in for the Telegram Bot API.
+
+Pass an instance to ``build_app(request=...)``: every outgoing call is recorded,
+sendMessage/edit*/sendDocument get plausible Message results, getUpdates is served from an
+in-memory queue so polling can run without Telegram, and files registered with add_file
+can be fetched through getFile and downloaded.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+_ids = itertools.count(1)
+
+
+def message_update(user_id: int, text: str) -> dict:
+    message = {
+        "message_id": next(_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_ids), "message": message}
+
+
+def document_update(user_id: int, file_id: str, file_name: str, file_size: int, caption: str = "") -> dict:
+    message = {
+        "message_id": next(_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        "document": {"file_id": file_id, "file_unique_id": file_id, "file_name": file_name, "file_size": file_size},
+    }
+    if caption:
+        message["caption"] = caption
+    return {"update_id": next(_ids), "message": message}
+
+
+def callback_update(user_id: int, data: str) -> dict:
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "message": {
+                "message_id": next(_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "-",
+            },
+        },
+    }
+
+
+class FakeBotApi(BaseRequest):
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls: List[Tuple[str, dict]] = []
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.files: Dict[str, bytes] = {}
+        self._message_ids = itertools.count(1000)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def add_file(self, data: bytes) -> str:
+        file_id = f"file{next(_ids)}"
+        self.files[file_id] = data
+        return file_id
+
+    def push_update(self, update: dict) -> None:
+        self.updates.put_nowait(update)
+
+    def last_inline_keyboard(self, chat_id: int) -> List[List[dict]]:
+        for _, params in reversed(self.calls):
+            if params.get("chat_id") != chat_id or "reply_markup" not in params:
+                continue
+            markup = params["reply_markup"]
+            markup = json.loads(markup) if isinstance(markup, str) else markup
+            if "inline_keyboard" in markup:
+                return markup["inline_keyboard"]
+        return []
+
+    async def _get_updates(self, params: dict) -> list:
+        timeout = min(float(params.get("timeout") or 0), 1.0)
+        try:
+            first = await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait()
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        updates = [first]
+        while not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if name in self.files:
+            return 200, self.files[name]
+        if name == "getUpdates":
+            result = await self._get_updates(params)
+            if result and self.latency:
+                await asyncio.sleep(self.latency)
+        else:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return 502, json.dumps({"ok": False, "error_code": 502, "description": "Bad Gateway"}).encode()
+            self.calls.append((name, params))
+            if name == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "PBS", "username": "pbs_bot"}
+            elif name == "getFile":
+                file_id = params["file_id"]
+                result = {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "file_size": len(self.files.get(file_id, b"")),
+                    "file_path": f"documents/{file_id}",
+                }
+            elif name in ("sendMessage", "sendDocument", "editMessageText", "editMessageReplyMarkup"):
+                result = {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                    "text": params.get("text", ""),
+                }
+            else:
+                result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
@@ -0,0 +1,198 @@
+"""In-memory stand-in for the Apps Script web app in Code.gs.
+
+Speaks the same JSON actions over an httpx MockTransport, so the bot can run offline:
+
+    build_app(sheets_transport=FakeWebApp().transport())
+
+It models what the bot relies on (row numbers, record_id idempotency, paging, stats), not
+how Code.gs talks to SpreadsheetApp; Code.gs stays the reference for the contract.
+
+Faults can be injected per request: fixed `latency`, a `slow_rate` share of calls that take
+`slow_latency` longer, a `cold_start` delay after `idle_timeout` seconds without calls,
+an `error_rate` share of 503 answers, a `lost_rate` share of calls that run but whose answer
+is lost (504), and `down = True` for a full outage. With
+`redirect=True` every POST is answered like the real web app, with a 302 to a one-time
+script.googleusercontent.com echo URL that serves the result.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import httpx
+
+from src.sheets import RECORD_FIELDS
+from src.stats import record_epoch
+
+RECORD_HEADERS = (*RECORD_FIELDS, "record_id")
+RECORD_REQUIRED_FIELDS = ("segment", "jenis_order", "bobot", "tanggal_close", "teknisi_1")
+
+ECHO_URL = "https://script.googleusercontent.com/macros/echo"
+
+
+class FakeWebApp:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        tz: tzinfo = ZoneInfo("Asia/Jakarta"),
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        cold_start: float = 0.0,
+        idle_timeout: float = 300.0,
+        redirect: bool = False,
+        lost_rate: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.cold_start = cold_start
+        self.idle_timeout = idle_timeout
+        self.redirect = redirect
+        self.lost_rate = lost_rate
+        self.down = False
+        self.requests = 0
+        self._last_call: Optional[float] = None
+        self._echo: Dict[str, dict] = {}
+        self.tz = tz
+        self.rng = random.Random(seed)
+        self.records: List[dict] = []
+        self.mappings: Dict[str, dict] = {}
+        self.record_ids: set = set()
+        self.calls: Counter = Counter()
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self._handle_request)
+
+    async def _handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET" and str(request.url).startswith(ECHO_URL):
+            result = self._echo.pop(request.url.params.get("user_content_key", ""), None)
+            if result is None:
+                return httpx.Response(404, text="Not found")
+            return httpx.Response(200, json=result)
+        self.requests += 1
+        delay = self.latency
+        if self.cold_start and (self._last_call is None or time.monotonic() - self._last_call > self.idle_timeout):
+            delay += self.cold_start
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            delay += self.slow_latency
+        if delay:
+            await asyncio.sleep(delay)
+        self._last_call = time.monotonic()
+        if self.down or (self.error_rate and self.rng.random() < self.error_rate):
+            return httpx.Response(503, text="Service unavailable")
+        result = self.handle(json.loads(request.content or b"{}"))
+        if self.lost_rate and self.rng.random() < self.lost_rate:
+            return httpx.Response(504, text="Gateway timeout")
+        if self.redirect:
+            key = uuid.uuid4().hex
+            self._echo[key] = result
+            return httpx.Response(302, headers={"Location": f"{ECHO_URL}?user_content_key={key}"})
+        return httpx.Response(200, json=result)
+
+    def handle(self, payload: dict) -> dict:
+        action = payload.get("action")
+        self.calls[action] += 1
+        try:
+            return self._dispatch(action, payload.get("data") or {})
+        except ValueError as exc:
+            return {"ok": False, "error": f"Error: {exc}"}
+
+    def _dispatch(self, action: Optional[str], data: dict) -> dict:
+        if action == "append_records":
+            return {"ok": True, "data": self._append(data.get("records") or [])}
+        if action == "set_user_mapping":
+            user_id = str(data.get("user_id") or "").strip()
+            teknisi_name = str(data.get("teknisi_name") or "").strip()
+            if not user_id or not teknisi_name:
+                raise ValueError("user_id and teknisi_name are required")
+            self.mappings[user_id] = {
+                "user_id": user_id,
+                "username": str(data.get("username") or "").strip(),
+                "teknisi_name": teknisi_name,
+                "updated_at": str(data.get("updated_at") or datetime.now(timezone.utc).isoformat()),
+            }
+            return {"ok": True}
+        if action == "get_user_mapping":
+            return {"ok": True, "data": self.mappings.get(str(data.get("user_id") or ""))}
+        if action == "get_all_user_mappings":
+            return {"ok": True, "data": list(self.mappings.values())}
+        if action == "get_all_records":
+            if data.get("limit"):
+                page = self._records_page(int(data.get("cursor") or 1), int(data["limit"]), bool(data.get("gzip")))
+                return {"ok": True, "data": page}
+            return {"ok": True, "data": [dict(r) for r in self.records]}
+        if action == "get_stats":
+            ranges = [(float(start), float(end)) for start, end in data.get("ranges") or []]
+            return {"ok": True, "data": self._stats(data.get("teknisi") or [], ranges)}
+        if action == "ping":
+            return {"ok": True, "data": {"time": int(time.time() * 1000)}}
+        return {"ok": False, "error": f"Unknown action: {action}"}
+
+    def _append(self, records: List[dict]) -> dict:
+        accepted: List[str] = []
+        rejected: List[dict] = []
+        written = 0
+        for record in records:
+            record_id = str(record.get("record_id") or "")
+            missing = next((key for key in RECORD_REQUIRED_FIELDS if str(record.get(key) if record.get(key) is not None else "").strip() == ""), None)
+            if missing is not None:
+                rejected.append({"record_id": record_id, "error": f"Missing required field: {missing}"})
+                continue
+            if record_id:
+                accepted.append(record_id)
+            if record_id and record_id in self.record_ids:
+                continue
+            if record_id:
+                self.record_ids.add(record_id)
+            self.records.append({key: "" if record.get(key) is None else record[key] for key in RECORD_HEADERS})
+            written += 1
+        return {"written": written, "accepted": accepted, "rejected": rejected}
+
+    def _stats(self, teknisi: List[str], ranges: List[Tuple[float, float]]) -> dict:
+        wanted = {str(name).strip() for name in teknisi} - {""}
+        totals: List[Dict[str, list]] = [{} for _ in ranges]
+        for record in self.records:
+            names = {str(record.get("teknisi_1") or "").strip(), str(record.get("teknisi_2") or "").strip()} - {""}
+            if wanted:
+                names &= wanted
+            if not names:
+                continue
+            epoch = record_epoch(record, "tanggal_close", self.tz)
+            if epoch is None:
+                continue
+            bobot = float(record.get("bobot") or 0)
+            for i, (start, end) in enumerate(ranges):
+                if start <= epoch < end:
+                    for name in names:
+                        total = totals[i].setdefault(name, [0, 0.0])
+                        total[0] += 1
+                        total[1] += bobot
+        return {"totals": totals, "rows": len(self.records)}
+
+    def _records_page(self, cursor: int, limit: int, compress: bool) -> dict:
+        last_row = len(self.records) + 1
+        start = max(cursor, 1) + 1
+        end = min(last_row, start + limit - 1)
+        page = {
+            "headers": list(RECORD_HEADERS),
+            "first_row": start,
+            "rows": [[self.records[row - 2][key] for key in RECORD_HEADERS] for row in range(start, end + 1)],
+            "next_cursor": end if end < last_row else None,
+            "last_row": last_row,
+        }
+        if not compress:
+            return page
+        body = gzip.compress(json.dumps(page).encode())
+        return {"encoding": "gzip+base64", "body": base64.b64encode(body).decode()}
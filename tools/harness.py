@@ -0,0 +1,58 @@
+"""Shared in-process setup for the tools that drive the bot offline.
+
+    with harness_app("interleave", "data", FakeBotApi(), webapp, update_concurrency=32) as app:
+        ...  # add handlers
+        async with running(app):
+            ...  # feed updates
+
+harness_app builds the Application from build_app against the fake Bot API and a fake web
+app, with its SQLite files in a temporary directory that is removed afterwards; keyword
+arguments override Config fields. running() does the initialize/post_init/start and the
+matching shutdown, the same steps run_polling/run_webhook take.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import tempfile
+from typing import AsyncIterator, Iterator
+
+from telegram.ext import Application
+
+from src.bot import build_app
+from src.config import Config
+from tools.fake_telegram import FakeBotApi
+from tools.fake_webapp import FakeWebApp
+
+FAKE_WEBAPP_URL = "https://fake-webapp.invalid/exec"
+
+
+@contextlib.contextmanager
+def harness_app(name: str, data_dir: str, api: FakeBotApi, webapp: FakeWebApp, **overrides: object) -> Iterator[Application]:
+    with tempfile.TemporaryDirectory(prefix=f"{name}-") as workdir:
+        config = Config(
+            bot_token=f"123456:{name}",
+            gs_webapp_url=FAKE_WEBAPP_URL,
+            tz="Asia/Jakarta",
+            data_dir=data_dir,
+            db_path=os.path.join(workdir, "bot.db"),
+            catalog_snapshot=os.path.join(workdir, "catalog.snapshot"),
+            catalog_reload_interval=0,
+            **overrides,
+        )
+        yield build_app(config, request=api, sheets_transport=webapp.transport())
+
+
+@contextlib.asynccontextmanager
+async def running(app: Application) -> AsyncIterator[Application]:
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    try:
+        yield app
+    finally:
+        if app.updater is not None and app.updater.running:
+            await app.updater.stop()
+        await app.stop()
+        await app.post_shutdown(app)
+        await app.shutdown()
@@ -0,0 +1,217 @@
+"""Check /import end to end with generated CSV, XLSX and pasted batches.
+
+    python -m tools.import_check [--rows 2000] [--bad-rate 0.1] [--webapp-latency 0.3] [--seed 7]
+
+Builds rows from the real catalog, breaks a share of them on purpose (unknown segment,
+order type or technician, bad date, missing required field, duplicate of an earlier row),
+and sends them to the bot in-process (fake Bot API + fake web app) as a CSV upload, an
+XLSX upload (skipped without openpyxl) and a pasted message. Checks that exactly the valid
+rows reach the fake sheet, that the reply counts every broken row, and that importing the
+CSV again rejects every row as a duplicate. Prints rows/minute for validation and for the
+batched appends. Exits non-zero when a check fails.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import random
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.bulk_import import IMPORT_COLUMNS
+from src.data_loader import REQUIRED, UNAVAILABLE, Catalog, load_catalog
+from tools.fake_telegram import FakeBotApi, document_update, message_update
+from tools.fake_webapp import FakeWebApp
+from tools.harness import harness_app, running
+from tools.replay_updates import FIELD_SAMPLES
+
+ADMIN = 4242
+# Telegram messages are capped at 4096 characters, so a pasted block stays small.
+PASTE_ROWS = 25
+SUMMARY = re.compile(r"Import selesai: (\d+) dari (\d+) baris disimpan, (\d+) ditolak")
+FAULTS = ("segment", "order", "tech", "date", "required", "duplicate")
+
+
+def _valid_row(catalog: Catalog, prefix: str, i: int, rng: random.Random) -> dict:
+    segment = rng.choice(catalog.segments)
+    item = rng.choice(catalog.orders[segment])
+    tech_1, tech_2 = rng.sample(catalog.techs, 2)
+    row = {"segment": segment, "jenis_order": item.name, "bobot": f"{item.weight:g}"}
+    samples = {
+        **FIELD_SAMPLES,
+        "service_number": f"13{ord(prefix)}{i:08d}",
+        "wo_number": f"SC{prefix}{i}",
+        "ticket_id": f"INC{prefix}{i}",
+    }
+    for field in ("service_number", "wo_number", "ticket_id", "tanggal_open", "tanggal_close", "workzone"):
+        row[field] = samples[field] if item.requirement(field) != UNAVAILABLE else ""
+    row["teknisi_1"] = tech_1.name
+    row["teknisi_2"] = tech_2.name if rng.random() < 0.3 else ""
+    row["keterangan"] = f"import {prefix} {i}"
+    return row
+
+
+def _break(catalog: Catalog, row: dict, previous: Optional[dict], rng: random.Random) -> dict:
+    fault = rng.choice(FAULTS)
+    item = next(i for i in catalog.orders[row["segment"]] if i.name == row["jenis_order"])
+    required = [f for f in ("ticket_id", "tanggal_close", "tanggal_open") if item.requirement(f) == REQUIRED]
+    if fault == "duplicate" and previous is not None:
+        return dict(previous)
+    if fault == "required" and required:
+        return {**row, required[0]: ""}
+    if fault == "segment":
+        return {**row, "segment": "Segment Tidak Ada"}
+    if fault == "order":
+        return {**row, "jenis_order": "Jenis Order Tidak Ada"}
+    if fault == "date":
+        return {**row, "tanggal_close": "31-02-2026 25:00:00"}
+    return {**row, "teknisi_1": "TEKNISI TIDAK ADA"}
+
+
+def make_rows(catalog: Catalog, count: int, bad_rate: float, prefix: str, rng: random.Random) -> Tuple[List[dict], int]:
+    rows: List[dict] = []
+    bad = 0
+    previous = None
+    for i in range(count):
+        row = _valid_row(catalog, prefix, i, rng)
+        if rng.random() < bad_rate:
+            row = _break(catalog, row, previous, rng)
+            bad += 1
+        else:
+            previous = row
+        rows.append(row)
+    return rows, bad
+
+
+def to_csv(rows: List[dict]) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=IMPORT_COLUMNS, delimiter=";")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8-sig")
+
+
+def to_xlsx(rows: List[dict]) -> Optional[bytes]:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return None
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(IMPORT_COLUMNS))
+    for row in rows:
+        # Numbers typed into Excel come back as numbers, not text.
+        sheet.append([int(row[c]) if c == "service_number" and row.get(c) else row.get(c, "") for c in IMPORT_COLUMNS])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def to_paste(rows: List[dict]) -> str:
+    return "\n".join(" | ".join(row.get(c, "") for c in IMPORT_COLUMNS) for row in rows)
+
+
+def _last_reply(api: FakeBotApi, chat_id: int) -> str:
+    for name, params in reversed(api.calls):
+        if name in ("sendMessage", "sendDocument") and params.get("chat_id") == chat_id:
+            return params.get("text") or params.get("caption") or ""
+    return ""
+
+
+async def _send(app: Application, api: FakeBotApi, update: dict) -> Tuple[str, float]:
+    start = time.perf_counter()
+    await app.process_update(Update.de_json(update, app.bot))
+    return _last_reply(api, update["message"]["chat"]["id"]), time.perf_counter() - start
+
+
+async def _drain(app: Application) -> float:
+    spool = app.bot_data["record_queue"].spool
+    start = time.perf_counter()
+    while await asyncio.to_thread(spool.pending):
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> List[str]:
+    catalog = load_catalog(args.data_dir)
+    rng = random.Random(args.seed)
+    api = FakeBotApi()
+    webapp = FakeWebApp(latency=args.webapp_latency, seed=args.seed)
+
+    failures: List[str] = []
+    batches: List[Tuple[str, dict, int, int]] = []
+    csv_rows, bad = make_rows(catalog, args.rows, args.bad_rate, "C", rng)
+    csv_data = to_csv(csv_rows)
+    batches.append(("csv", document_update(ADMIN, api.add_file(csv_data), "import.csv", len(csv_data), "/import"), len(csv_rows), bad))
+    xlsx_rows, bad = make_rows(catalog, args.rows, args.bad_rate, "X", rng)
+    xlsx_data = to_xlsx(xlsx_rows)
+    if xlsx_data is None:
+        print("xlsx: openpyxl is not installed, skipped")
+    else:
+        batches.append(("xlsx", document_update(ADMIN, api.add_file(xlsx_data), "import.xlsx", len(xlsx_data), "/import"), len(xlsx_rows), bad))
+    paste_rows, bad = make_rows(catalog, PASTE_ROWS, args.bad_rate, "P", rng)
+    batches.append(("paste", message_update(ADMIN, "/import\n" + to_paste(paste_rows)), len(paste_rows), bad))
+
+    with harness_app(
+        "import-check", args.data_dir, api, webapp,
+        flush_interval=0.05, admin_user_ids=(ADMIN,), import_max_rows=max(args.rows, 5000),
+    ) as app:
+        async with running(app):
+            expected_records = 0
+            for label, update, rows, bad in batches:
+                reply, handled = await _send(app, api, update)
+                drained = await _drain(app)
+                match = SUMMARY.search(reply)
+                if match is None:
+                    failures.append(f"{label}: unexpected reply {reply[:200]!r}")
+                    continue
+                saved, total, rejected = map(int, match.groups())
+                expected_records += rows - bad
+                print(
+                    f"{label:<6} {total} rows, {saved} saved, {rejected} rejected ({bad} broken on purpose); "
+                    f"validated in {handled:.2f}s ({total / handled * 60:,.0f} rows/min), "
+                    f"appended in {drained:.2f}s ({saved / max(drained, 1e-9) * 60:,.0f} rows/min)"
+                )
+                if (saved, total, rejected) != (rows - bad, rows, bad):
+                    failures.append(f"{label}: expected {rows - bad} saved and {bad} rejected, got {saved} and {rejected}")
+            if len(webapp.records) != expected_records:
+                failures.append(f"{len(webapp.records)} rows in the fake sheet, expected {expected_records}")
+
+            reply, _ = await _send(app, api, document_update(ADMIN, api.add_file(csv_data), "again.csv", len(csv_data), "/import"))
+            match = SUMMARY.search(reply)
+            print(f"again  {reply.splitlines()[0] if reply else '-'}")
+            if match is None or int(match.group(1)) != 0:
+                failures.append(f"re-import: expected every row to be rejected, got {reply[:200]!r}")
+
+            reply, _ = await _send(app, api, message_update(ADMIN + 1, "/import\n" + to_paste(paste_rows[:1])))
+            if "admin" not in reply:
+                failures.append(f"non-admin: expected a refusal, got {reply[:200]!r}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per uploaded file")
+    parser.add_argument("--bad-rate", type=float, default=0.1, help="share of rows broken on purpose")
+    parser.add_argument("--webapp-latency", type=float, default=0.3, help="simulated Apps Script latency (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Drive many simulated users through /start at once and check per-user ordering.
+
+    python -m tools.interleave_check [--users 200] [--concurrency 32] [--api-latency 0.02] [--storage sqlite]
+
+Each user's scripted session is shuffled into one stream (keeping every user's own order),
+fed to the bot in-process (fake Bot API + fake web app), and then checked:
+every update of a user is handled in the order it was sent, no handler fails, and each
+user ends up with exactly one saved record carrying their own order and technician
+(with --storage sqlite, after the shutdown export to the fake web app).
+Exits non-zero on any violation.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from src.data_loader import Catalog, load_catalog
+from tools.fake_telegram import FakeBotApi
+from tools.fake_webapp import FakeWebApp
+from tools.harness import harness_app, running
+from tools.replay_updates import scripted_session
+
+
+def interleave(sessions: Dict[int, List[dict]], rng: random.Random) -> List[dict]:
+    cursors = {user: 0 for user in sessions}
+    stream: List[dict] = []
+    while cursors:
+        user = rng.choice(list(cursors))
+        stream.append(sessions[user][cursors[user]])
+        cursors[user] += 1
+        if cursors[user] == len(sessions[user]):
+            del cursors[user]
+    return stream
+
+
+def _update_user(update: dict) -> int:
+    body = update.get("message") or update.get("callback_query")
+    return body["from"]["id"]
+
+
+def _expected(catalog: Catalog, session: List[dict]) -> Dict[str, str]:
+    expected = {}
+    for update in session:
+        data = (update.get("callback_query") or {}).get("data", "")
+        if data.startswith("ORDSEL|"):
+            expected["jenis_order"] = catalog.orders_by_id[data.rsplit("|", 1)[1]].name
+        elif data.startswith("TECHSEL|t1|"):
+            expected["teknisi_1"] = catalog.techs_by_id[data.rsplit("|", 1)[1]].name
+    return expected
+
+
+async def run(args: argparse.Namespace) -> List[str]:
+    catalog = load_catalog(args.data_dir)
+    rng = random.Random(args.seed)
+    sessions = {900000 + i: scripted_session(catalog, 900000 + i, rng) for i in range(args.users)}
+    stream = interleave(sessions, rng)
+
+    webapp = FakeWebApp(latency=args.webapp_latency)
+    handled: Dict[int, List[int]] = defaultdict(list)
+    errors: List[str] = []
+    in_flight = 0
+    peak = 0
+
+    async def _enter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+
+    async def _leave(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        nonlocal in_flight
+        in_flight -= 1
+        handled[update.effective_user.id].append(update.update_id)
+
+    async def _error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        errors.append(f"handler error on {getattr(update, 'update_id', '?')}: {context.error!r}")
+
+    api = FakeBotApi(latency=args.api_latency)
+    with harness_app(
+        "interleave", args.data_dir, api, webapp, update_concurrency=args.concurrency, storage_backend=args.storage
+    ) as app:
+        app.add_handler(TypeHandler(Update, _enter), group=-1)
+        app.add_handler(TypeHandler(Update, _leave), group=99)
+        app.add_error_handler(_error)
+        async with running(app):
+            start = time.perf_counter()
+            for update in stream:
+                await app.update_queue.put(Update.de_json(update, app.bot))
+            await app.update_queue.join()
+            elapsed = time.perf_counter() - start
+
+    failures = list(errors)
+    for user, session in sessions.items():
+        sent = [u["update_id"] for u in session]
+        if handled[user] != sent:
+            failures.append(f"user {user}: handled {handled[user]} but sent {sent}")
+    saved = defaultdict(list)
+    for record in webapp.records:
+        saved[int(record["submitter_user_id"])].append(record)
+    for user, session in sessions.items():
+        records = saved.get(user, [])
+        if len(records) != 1:
+            failures.append(f"user {user}: expected 1 saved record, got {len(records)}")
+            continue
+        for field, value in _expected(catalog, session).items():
+            if records[0][field] != value:
+                failures.append(f"user {user}: {field} is {records[0][field]!r}, expected {value!r}")
+
+    print(
+        f"{args.users} users, {len(stream)} updates in {elapsed:.2f}s "
+        f"({len(stream) / elapsed:.0f} updates/s), peak {peak} concurrent, "
+        f"{len(webapp.records)} records saved"
+    )
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="simulated Bot API round trip (seconds)")
+    parser.add_argument("--webapp-latency", type=float, default=0.0, help="simulated Apps Script latency (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--storage", choices=("sheets", "sqlite"), default="sheets")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures[:50]:
+        print(f"FAIL {failure}")
+    if failures:
+        print(f"{len(failures)} failure(s)")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
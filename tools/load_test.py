@@ -0,0 +1,188 @@
+"""Load-test the /start conversation with many simulated users at once.
+
+    python -m tools.load_test [--users 200] [--concurrency 32] [--api-latency 0.05]
+        [--api-error-rate 0.0] [--webapp-latency 0.5] [--webapp-error-rate 0.0]
+        [--think-time 0.0] [--ramp-up 0.0] [--storage sheets]
+
+Drives the Application from build_app in-process, backed by the fake Bot API
+(tools/fake_telegram.py) and the fake web app (tools/fake_webapp.py). Every user runs a
+scripted session (segment, order search, order pick, field entries, Teknisi 1/2,
+workzone, keterangan, SAVE) and sends each step only after the previous one was handled.
+Reports p50/p95/p99 latency per step, handler errors, and overall throughput.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from src.bot import BTN_SKIP, FIELD_PROMPTS, FIELD_STEPS, PAGE_SIZE, WORKZONE
+from src.data_loader import UNAVAILABLE, Catalog, load_catalog
+from tools.fake_telegram import FakeBotApi, callback_update, message_update
+from tools.fake_webapp import FakeWebApp
+from tools.harness import harness_app, running
+from tools.replay_updates import FIELD_SAMPLES, field_value
+
+Step = Tuple[str, dict]
+
+
+def conversation(catalog: Catalog, user_id: int, rng: random.Random, second_tech_rate: float) -> List[Step]:
+    segment = rng.choice(catalog.segments)
+    item = rng.choice(catalog.orders[segment])
+    query = item.name.split()[0]
+    index = catalog.search[segment]
+    matches, total = index.search(query, limit=PAGE_SIZE)
+    picked = total == 1 and index.contains(query, matches[0])
+    if not picked:
+        item = rng.choice(matches)
+    else:
+        item = matches[0]
+    techs = [t for t in catalog.techs if t.unit]
+    tech_1, tech_2 = rng.sample(techs, 2)
+
+    steps: List[Step] = [
+        ("start", message_update(user_id, "/start")),
+        ("segment", callback_update(user_id, f"SEG|{segment}")),
+        ("order_search", message_update(user_id, query)),
+    ]
+    if not picked:
+        steps.append(("order_pick", callback_update(user_id, f"ORDSEL|{segment}|{item.id}")))
+    for state in FIELD_STEPS:
+        field, _ = FIELD_PROMPTS[state]
+        if item.requirement(field) != UNAVAILABLE:
+            steps.append((field, message_update(user_id, field_value(field, user_id))))
+    steps += [
+        ("tech1_unit", callback_update(user_id, f"UNITSEL|t1|{tech_1.unit}")),
+        ("tech1_name", callback_update(user_id, f"TECHSEL|t1|{tech_1.id}")),
+    ]
+    if rng.random() < second_tech_rate:
+        steps += [
+            ("tech2_decide", callback_update(user_id, "T2PICK")),
+            ("tech2_unit", callback_update(user_id, f"UNITSEL|t2|{tech_2.unit}")),
+            ("tech2_name", callback_update(user_id, f"TECHSEL|t2|{tech_2.id}")),
+        ]
+    else:
+        steps.append(("tech2_decide", callback_update(user_id, "T2NONE")))
+    if item.requirement(FIELD_PROMPTS[WORKZONE][0]) != UNAVAILABLE:
+        steps.append(("workzone", message_update(user_id, FIELD_SAMPLES["workzone"])))
+    steps += [("keterangan", message_update(user_id, BTN_SKIP)), ("save", callback_update(user_id, "SAVE"))]
+    return steps
+
+
+def _percentiles(samples: List[float]) -> Tuple[float, float, float, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1e3
+    return pick(0.5), pick(0.95), pick(0.99), ordered[-1] * 1e3
+
+
+async def run(args: argparse.Namespace) -> None:
+    catalog = load_catalog(args.data_dir)
+    rng = random.Random(args.seed)
+    sessions = {
+        900000 + i: conversation(catalog, 900000 + i, rng, args.second_tech_rate) for i in range(args.users)
+    }
+
+    api = FakeBotApi(latency=args.api_latency, error_rate=args.api_error_rate, seed=args.seed)
+    webapp = FakeWebApp(latency=args.webapp_latency, error_rate=args.webapp_error_rate, seed=args.seed)
+
+    pending: Dict[int, asyncio.Future] = {}
+    labels: Dict[int, str] = {}
+    errors: Dict[str, int] = defaultdict(int)
+    samples: Dict[str, List[float]] = defaultdict(list)
+
+    async def _done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        future = pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        errors[labels.get(getattr(update, "update_id", None), "?")] += 1
+
+    async def _user(index: int, steps: List[Step]) -> None:
+        user_rng = random.Random(args.seed + index)
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up * index / args.users)
+        for label, update in steps:
+            if args.think_time:
+                await asyncio.sleep(user_rng.expovariate(1 / args.think_time))
+            labels[update["update_id"]] = label
+            future = asyncio.get_running_loop().create_future()
+            pending[update["update_id"]] = future
+            start = time.perf_counter()
+            await app.update_queue.put(Update.de_json(update, app.bot))
+            samples[label].append(await asyncio.wait_for(future, args.step_timeout) - start)
+
+    with harness_app(
+        "load-test", args.data_dir, api, webapp, update_concurrency=args.concurrency, storage_backend=args.storage
+    ) as app:
+        app.add_handler(TypeHandler(Update, _done), group=99)
+        app.add_error_handler(_error)
+        async with running(app):
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(_user(i, steps) for i, steps in enumerate(sessions.values())), return_exceptions=True
+            )
+            elapsed = time.perf_counter() - start
+
+    order: List[str] = []
+    for steps in sessions.values():
+        previous = -1
+        for label, _ in steps:
+            if label not in order:
+                order.insert(previous + 1, label)
+            previous = order.index(label)
+    print(f"{'step':<16} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    everything: List[float] = []
+    for label in order:
+        if not samples[label]:
+            continue
+        everything += samples[label]
+        p50, p95, p99, worst = _percentiles(samples[label])
+        print(f"{label:<16} {len(samples[label]):>6} {p50:9.2f} {p95:9.2f} {p99:9.2f} {worst:9.2f} {errors.get(label, 0):>7}")
+    if everything:
+        p50, p95, p99, worst = _percentiles(everything)
+        print(f"{'all':<16} {len(everything):>6} {p50:9.2f} {p95:9.2f} {p99:9.2f} {worst:9.2f} {sum(errors.values()):>7}")
+
+    stalled = sum(1 for r in results if isinstance(r, BaseException))
+    completed = len(results) - stalled
+    print(
+        f"\n{args.users} users, {len(everything)} updates in {elapsed:.2f}s: "
+        f"{len(everything) / elapsed:.1f} updates/s, {completed / elapsed:.2f} conversations/s"
+        f" (mean step {statistics.fmean(everything) * 1e3 if everything else 0:.2f} ms)"
+    )
+    print(
+        f"{completed} session(s) sent every step, {stalled} timed out; {len(webapp.records)} record(s) in the fake sheet; "
+        f"web app calls: {dict(webapp.calls)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="UPDATE_CONCURRENCY of the bot")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="simulated Bot API round trip (seconds)")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="share of Bot API calls answered with 502")
+    parser.add_argument("--webapp-latency", type=float, default=0.5, help="simulated Apps Script latency (seconds)")
+    parser.add_argument("--webapp-error-rate", type=float, default=0.0, help="share of web app calls answered with 503")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's steps (seconds)")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="spread user start times over this many seconds")
+    parser.add_argument("--second-tech-rate", type=float, default=0.3, help="share of sessions that pick a Teknisi 2")
+    parser.add_argument("--step-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--storage", choices=("sheets", "sqlite"), default="sheets")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
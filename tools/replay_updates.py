@@ -0,0 +1,192 @@
+"""Replay recorded Telegram updates and measure per-update latency.
+
+Compare webhook and polling ingestion in-process (fake Bot API + fake web app):
+
+    python -m tools.replay_updates [--sessions 20] [--api-latency 0.05]
+
+Post recorded updates (JSON lines) to a running bot in webhook mode:
+
+    python -m tools.replay_updates --url https://host/hook --secret S --updates updates.jsonl
+
+Use --record FILE to save the generated sessions for later replays.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from src.bot import BTN_SKIP, FIELD_PROMPTS, FIELD_STEPS, WORKZONE
+from src.data_loader import UNAVAILABLE, Catalog, load_catalog
+from tools.fake_telegram import FakeBotApi, callback_update, message_update
+from tools.fake_webapp import FakeWebApp
+from tools.harness import harness_app, running
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+FIELD_SAMPLES = {
+    "service_number": "131234567890",
+    "wo_number": "SC1000123",
+    "ticket_id": "INC1000123",
+    "tanggal_open": "01-10-2026 08:00:00",
+    "tanggal_close": "01-10-2026 10:30:00",
+    "workzone": "KDI",
+}
+
+
+def field_value(field: str, user_id: int) -> str:
+    # Every user gets its own ticket/WO/service number so sessions are not duplicates of each other.
+    if field in ("wo_number", "ticket_id"):
+        return f"{FIELD_SAMPLES[field][:3]}{user_id}"
+    if field == "service_number":
+        return f"13{user_id:010d}"
+    return FIELD_SAMPLES[field]
+
+
+def scripted_session(catalog: Catalog, user_id: int, rng: random.Random) -> List[dict]:
+    segment = rng.choice(catalog.segments)
+    item = rng.choice(catalog.orders[segment])
+    tech = rng.choice([t for t in catalog.techs if t.unit])
+    updates = [
+        message_update(user_id, "/start"),
+        callback_update(user_id, f"SEG|{segment}"),
+        callback_update(user_id, f"ORDSEL|{segment}|{item.id}"),
+    ]
+    for state in FIELD_STEPS:
+        field, _ = FIELD_PROMPTS[state]
+        if item.requirement(field) != UNAVAILABLE:
+            updates.append(message_update(user_id, field_value(field, user_id)))
+    updates += [
+        callback_update(user_id, f"UNITSEL|t1|{tech.unit}"),
+        callback_update(user_id, f"TECHSEL|t1|{tech.id}"),
+        callback_update(user_id, "T2NONE"),
+    ]
+    if item.requirement(FIELD_PROMPTS[WORKZONE][0]) != UNAVAILABLE:
+        updates.append(message_update(user_id, FIELD_SAMPLES["workzone"]))
+    updates += [message_update(user_id, BTN_SKIP), callback_update(user_id, "SAVE")]
+    return updates
+
+
+def _summary(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1e3
+    return (
+        f"n={len(ordered)} mean {statistics.fmean(ordered) * 1e3:7.2f} ms  p50 {pick(0.5):7.2f} ms"
+        f"  p95 {pick(0.95):7.2f} ms  p99 {pick(0.99):7.2f} ms  max {ordered[-1] * 1e3:7.2f} ms"
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_in_process(mode: str, updates: List[dict], data_dir: str, api_latency: float) -> List[float]:
+    secret = "replay-secret"
+    port = _free_port()
+    webhook_url = f"http://127.0.0.1:{port}/hook"
+    api = FakeBotApi(latency=api_latency)
+    pending: Dict[int, asyncio.Future] = {}
+
+    async def _done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        future = pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    samples: List[float] = []
+    with harness_app(
+        f"replay-{mode}", data_dir, api, FakeWebApp(), bot_mode=mode, webhook_url=webhook_url, webhook_secret=secret
+    ) as app:
+        app.add_handler(TypeHandler(Update, _done), group=99)
+        async with running(app):
+            if mode == "webhook":
+                await app.updater.start_webhook(
+                    listen="127.0.0.1", port=port, url_path="hook", webhook_url=webhook_url, secret_token=secret
+                )
+            else:
+                await app.updater.start_polling(poll_interval=0.0, timeout=10)
+            async with httpx.AsyncClient() as http:
+                if mode == "webhook":
+                    rejected = await http.post(webhook_url, json=updates[0])
+                    if rejected.status_code != 403:
+                        raise RuntimeError(f"Webhook accepted an update without the secret ({rejected.status_code})")
+                for update in updates:
+                    future = asyncio.get_running_loop().create_future()
+                    pending[update["update_id"]] = future
+                    start = time.perf_counter()
+                    if mode == "webhook":
+                        resp = await http.post(webhook_url, json=update, headers={SECRET_HEADER: secret})
+                        resp.raise_for_status()
+                    else:
+                        api.push_update(update)
+                    samples.append(await asyncio.wait_for(future, 30) - start)
+    return samples
+
+
+async def _post_to_url(url: str, secret: str, updates: List[dict], concurrency: int) -> None:
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _post(http: httpx.AsyncClient, update: dict) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await http.post(url, json=update, headers={SECRET_HEADER: secret})
+            samples.append(time.perf_counter() - start)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    async with httpx.AsyncClient(timeout=30) as http:
+        await asyncio.gather(*(_post(http, update) for update in updates))
+    print(f"ack latency  {_summary(samples)}")
+    print("status codes " + ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="simulated Bot API round trip (seconds)")
+    parser.add_argument("--modes", default="webhook,polling")
+    parser.add_argument("--updates", help="JSON lines file of recorded updates to replay")
+    parser.add_argument("--record", help="write the generated sessions to this JSON lines file")
+    parser.add_argument("--url", help="post updates to a running webhook instead of an in-process bot")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.updates:
+        with open(args.updates, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        catalog = load_catalog(args.data_dir)
+        rng = random.Random(args.seed)
+        updates = [u for user in range(args.sessions) for u in scripted_session(catalog, 900000 + user, rng)]
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(u) + "\n" for u in updates)
+        print(f"Recorded {len(updates)} updates to {args.record}")
+
+    if args.url:
+        asyncio.run(_post_to_url(args.url, args.secret, updates, args.concurrency))
+        return
+    for mode in args.modes.split(","):
+        samples = asyncio.run(_run_in_process(mode.strip(), updates, args.data_dir, args.api_latency))
+        print(f"{mode:<8} {_summary(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Check the Sheets client's retries, hedging, circuit breaker and warm-up against injected faults.
+
+    python -m tools.sheets_faults [--calls 200] [--seed 7]
+
+Every scenario runs SheetsClient against tools/fake_webapp.py with one kind of fault
+(503s, lost answers, slow tails, per-action timeouts, an outage, cold starts, Apps Script's
+302 redirect) and compares the result with the same calls made without the protection.
+Retry backoff and timeouts are scaled down so the whole run takes a few seconds.
+Exits non-zero when a check fails.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from dataclasses import replace
+from typing import Awaitable, Callable, List, Tuple
+
+from src import sheets
+from src.config import Config
+from src.sheets import Record, SheetsClient, SheetsUnavailable, SheetsWarmer
+from tools.fake_webapp import FakeWebApp
+
+BASE = Config(
+    bot_token="123456:faults",
+    gs_webapp_url="https://fake-webapp.invalid/exec",
+    tz="Asia/Jakarta",
+    data_dir="data",
+    sheets_warmup_interval=0,
+)
+
+
+def _record(i: int) -> Record:
+    return Record(
+        timestamp="01-10-2026 10:30:00", submitter_user_id=str(900000 + i), submitter_username="",
+        segment="Assurance B2C", jenis_order="Infracare", bobot=2.0, service_number="", wo_number="",
+        ticket_id=f"INC{i}", tanggal_open="01-10-2026 08:00:00", tanggal_close="01-10-2026 10:30:00",
+        teknisi_1="TEKNISI", teknisi_2="", workzone="KDI", keterangan="",
+    )
+
+
+def _p(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+async def _run(client: SheetsClient, calls: int, fn: Callable[[SheetsClient, int], Awaitable]) -> Tuple[int, List[float]]:
+    ok = 0
+    samples: List[float] = []
+
+    async def one(i: int) -> None:
+        nonlocal ok
+        start = time.perf_counter()
+        try:
+            await fn(client, i)
+            ok += 1
+        except Exception:
+            pass
+        samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return ok, samples
+
+
+async def retries(calls: int, seed: int) -> List[str]:
+    failures = []
+    for retry_count in (0, 3):
+        webapp = FakeWebApp(error_rate=0.3, seed=seed)
+        client = SheetsClient(replace(BASE, sheets_retries=retry_count, sheets_breaker_threshold=0), webapp.transport())
+        ok, _ = await _run(client, calls, lambda c, i: sheets.get_user_mapping(c, str(i)))
+        await client.aclose()
+        print(f"  503 on 30% of calls, retries={retry_count}: {ok}/{calls} succeeded")
+        if retry_count and ok < calls * 0.97:
+            failures.append(f"retries: only {ok}/{calls} reads succeeded with retries")
+    return failures
+
+
+async def lost_answers(calls: int, seed: int) -> List[str]:
+    webapp = FakeWebApp(lost_rate=0.2, seed=seed)
+    client = SheetsClient(replace(BASE, sheets_breaker_threshold=0), webapp.transport())
+    ok, _ = await _run(client, calls, lambda c, i: sheets.append_records(c, [(uuid.uuid4().hex, _record(i))]))
+    await client.aclose()
+    rows = len(webapp.records)
+    print(f"  20% of answers lost after the write: {ok}/{calls} batches acknowledged, {rows} rows in the sheet")
+    if rows != calls or ok < calls * 0.95:
+        return [f"lost answers: {ok} acknowledged, {rows} rows for {calls} records (expected no loss, no duplicates)"]
+    return []
+
+
+async def hedging(calls: int, seed: int) -> List[str]:
+    slow = {}
+    for delay in (0.0, 0.15):
+        webapp = FakeWebApp(latency=0.05, slow_rate=0.05, slow_latency=1.5, seed=seed)
+        client = SheetsClient(replace(BASE, sheets_hedge_delay=delay), webapp.transport())
+        _, samples = await _run(client, calls, lambda c, i: sheets.get_stats(c, ["TEKNISI"], [(0, 1)]))
+        await client.aclose()
+        # A hedged call is only slow when both requests hit the tail, so count those instead of
+        # relying on p99 alone.
+        slow[delay] = sum(1 for s in samples if s > 1.0)
+        print(
+            f"  5% of calls 1.5 s slower, hedge delay {delay:.2f}s: p50 {_p(samples, 0.5) * 1e3:.0f} ms, "
+            f"p99 {_p(samples, 0.99) * 1e3:.0f} ms, {slow[delay]} call(s) over 1 s, {webapp.requests} requests"
+        )
+    if slow[0.15] * 4 > slow[0.0]:
+        return [f"hedging: {slow[0.15]} slow calls with hedging vs {slow[0.0]} without"]
+    return []
+
+
+async def timeouts(calls: int, seed: int) -> List[str]:
+    webapp = FakeWebApp(slow_rate=0.3, slow_latency=2.0, seed=seed)
+    client = SheetsClient(replace(BASE, sheets_breaker_threshold=0), webapp.transport())
+    saved = sheets.ACTION_TIMEOUTS["ping"]
+    sheets.ACTION_TIMEOUTS["ping"] = 0.2
+    try:
+        ok, samples = await _run(client, calls, lambda c, i: sheets.ping(c))
+    finally:
+        sheets.ACTION_TIMEOUTS["ping"] = saved
+        await client.aclose()
+    print(f"  30% of pings hang for 2 s, ping timeout 0.2 s: {ok}/{calls} succeeded, max {max(samples):.2f} s")
+    if ok < calls * 0.97 or max(samples) >= 2.0:
+        return [f"timeouts: {ok}/{calls} pings succeeded, slowest {max(samples):.2f}s"]
+    return []
+
+
+async def breaker(calls: int, seed: int) -> List[str]:
+    failures = []
+    webapp = FakeWebApp(seed=seed)
+    client = SheetsClient(replace(BASE, sheets_retries=0, sheets_breaker_threshold=3, sheets_breaker_reset=0.5), webapp.transport())
+    await sheets.set_user_mapping(client, "1", "", "TEKNISI A")
+    cached_before = await sheets.get_user_mapping(client, "1")
+    webapp.down = True
+    for _ in range(3):
+        try:
+            await sheets.get_user_mapping(client, "2")
+        except Exception:
+            pass
+    sent = webapp.requests
+    start = time.perf_counter()
+    fast_failures = 0
+    for _ in range(calls):
+        try:
+            await sheets.get_user_mapping(client, "2")
+        except SheetsUnavailable:
+            fast_failures += 1
+    elapsed = time.perf_counter() - start
+    cached = await sheets.get_user_mapping(client, "1")
+    print(
+        f"  outage: breaker {client.breaker.state} after 3 failures, {fast_failures}/{calls} calls failed fast "
+        f"in {elapsed * 1e3:.1f} ms, cached mapping served: {cached!r}"
+    )
+    if client.breaker.state != "open" or fast_failures != calls or webapp.requests != sent:
+        failures.append("breaker: calls were still sent while the circuit was open")
+    if cached != cached_before:
+        failures.append(f"breaker: expected the cached mapping {cached_before!r}, got {cached!r}")
+    webapp.down = False
+    await asyncio.sleep(0.6)
+    recovered = await sheets.get_user_mapping(client, "1")
+    print(f"  after the outage: breaker {client.breaker.state}, mapping {recovered!r}")
+    if client.breaker.state != "closed":
+        failures.append("breaker: did not close after a successful probe")
+    await client.aclose()
+    return failures
+
+
+async def warm_up(calls: int, seed: int) -> List[str]:
+    results = {}
+    for interval in (0.0, 0.2):
+        webapp = FakeWebApp(latency=0.02, cold_start=1.0, idle_timeout=0.5, seed=seed)
+        client = SheetsClient(BASE, webapp.transport())
+        warmer = SheetsWarmer(client, interval) if interval else None
+        await sheets.ping(client)
+        if warmer:
+            warmer.start()
+        await asyncio.sleep(0.8)
+        start = time.perf_counter()
+        await sheets.get_user_mapping(client, "1")
+        results[interval] = time.perf_counter() - start
+        if warmer:
+            await warmer.stop()
+        await client.aclose()
+        print(f"  1 s cold start after 0.5 s idle, warm-up every {interval:.1f}s: call after 0.8 s idle took {results[interval] * 1e3:.0f} ms")
+    if results[0.2] > 0.5:
+        return [f"warm-up: call still took {results[0.2]:.2f}s with the warmer running"]
+    return []
+
+
+async def redirect(calls: int, seed: int) -> List[str]:
+    webapp = FakeWebApp(redirect=True, seed=seed)
+    client = SheetsClient(BASE, webapp.transport())
+    ok, _ = await _run(client, calls, lambda c, i: sheets.set_user_mapping(c, str(i), "", f"TEKNISI {i}"))
+    mappings = await sheets.get_all_user_mappings(client)
+    await client.aclose()
+    print(f"  302 to the echo URL on every call: {ok}/{calls} writes, {len(mappings)} mappings read back")
+    if ok != calls or len(mappings) != calls:
+        return [f"redirect: {ok} writes and {len(mappings)} mappings for {calls} users"]
+    return []
+
+
+SCENARIOS = (retries, lost_answers, hedging, timeouts, breaker, warm_up, redirect)
+
+
+async def run(args: argparse.Namespace) -> List[str]:
+    sheets.RETRY_BASE_DELAY = 0.02
+    sheets.RETRY_MAX_DELAY = 0.2
+    failures: List[str] = []
+    for scenario in SCENARIOS:
+        print(scenario.__name__)
+        failures += await scenario(args.calls, args.seed)
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()